@@ -1,21 +1,56 @@
+from backup import FORMATS, backup_path, dump_collection, restore_collection
+from bson import json_util
 from bson.objectid import ObjectId
-from datetime import date
+from circuit_breaker import CircuitBreaker, PageSnapshots
+from concurrent.futures import ThreadPoolExecutor
+from content_cache import WriteTracker, ContentVersions, ContentCache, VersionWatcher
+from contextvars import copy_context
+from datetime import date, datetime, timedelta, timezone
 from flask import (
     Flask, flash, render_template,
-    redirect, request, session, url_for, Markup, send_from_directory, jsonify, make_response)
+    redirect, request, session, url_for, Markup, send_from_directory, jsonify, make_response, escape,
+    get_flashed_messages)
 from flask_breadcrumbs import Breadcrumbs, register_breadcrumb
 from flask_mail import Mail, Message
 from flask_pymongo import PyMongo
+from profiler import SamplingProfiler, collapsed_text, cooperative, flame_graph, hottest_frames
+from pymongo import ReadPreference
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, PyMongoError
 from forms import *
+from fragment_cache import FragmentCache, FragmentCacheExtension
 from functools import wraps
-from html5lib_truncation import truncate_html
+from html import unescape
+from images import describe_image
+from importlib.util import find_spec
+from jinja2 import FileSystemBytecodeCache, TemplateError
+from rate_limit import MemoryRateLimiter, MongoRateLimiter, ConcurrencyLimiter
+from render import render_content, image_size, tech_tag, tech_tags
+from truncate import truncate_html
+from s3_gc import collect_garbage
+from scaling import CommandCounter, generate, clear, measure, real_collections
+from slow_queries import SlowQueryLog
+from static_export import export_site
+from tenants import (
+    DEFAULT_TENANT, Tenant, TenantRegistry, TenantProxy, current_tenant, normalize_host, s3_prefix, serving_request,
+    valid_s3_prefix)
+from urllib.parse import urlsplit
+from werkzeug.security import check_password_hash, generate_password_hash
+import base64
 import boto3
+import click
+import hashlib
 import json
+import math
 import pydf
 import pymongo
 import re
+import requests
 import os
 import secure
+import statistics
+import tempfile
+import threading
+import time
 
 if os.path.exists('env.py'):
     import env
@@ -31,7 +66,71 @@ config = {
     'RECAPTCHA_PUBLIC_KEY': os.environ.get('RC_SITE_KEY'),
     'RECAPTCHA_PRIVATE_KEY': os.environ.get('RC_SECRET_KEY'),
     'DB_COLLECTIONS': ["blogs", "testimonials", "links",
-                                "settings", "experience", "education", "projects", "skills"],
+                                "settings", "experience", "education", "projects", "skills", "rate_limits", "slow_queries", "images"],
+    'SEARCH_PER_PAGE': int(os.environ.get('SEARCH_PER_PAGE', 10)),
+    # Deepest search page served, each page ranks every match before it
+    'SEARCH_MAX_PAGES': int(os.environ.get('SEARCH_MAX_PAGES', 20)),
+    'SEARCH_SNIPPET_LENGTH': 200,
+    'UPLOAD_EXTENSIONS': {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif'},
+    'UPLOAD_MAX_SIZE': 1024 * 1024,
+    # Photos read for their dimensions and placeholder (photos added by url may be larger than uploads)
+    'IMAGE_MAX_SIZE': int(os.environ.get('IMAGE_MAX_SIZE', 10 * 1024 * 1024)),
+    'ORDER_GAP': 1024,
+    'STATIC_EXPORT_DIR': os.environ.get('STATIC_EXPORT_DIR'),
+    'STATIC_EXPORT_URL': os.environ.get('STATIC_EXPORT_URL', 'http://localhost/'),
+    # Seconds between an admin write and the background export, the writes made meanwhile are exported together
+    'STATIC_EXPORT_DELAY': float(os.environ.get('STATIC_EXPORT_DELAY', 5)),
+    # Canonical scheme and host of the site, used by the cached sitemap and feed (tenants use their own host)
+    'SITE_URL': os.environ.get('SITE_URL'),
+    'CACHE_POLL_INTERVAL': int(os.environ.get('CACHE_POLL_INTERVAL', 5)),
+    'MONGO_MAX_POOL_SIZE': int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+    'MONGO_MIN_POOL_SIZE': int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+    'MONGO_COMPRESSORS': os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib'),
+    # Timeouts of the cli commands, index builds and background threads
+    'MONGO_CONNECT_TIMEOUT_MS': int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'MONGO_SOCKET_TIMEOUT_MS': int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 20000)),
+    # Tight timeouts of the requests: a stalled database fails them quickly, which opens the circuit breaker
+    'MONGO_REQUEST_CONNECT_TIMEOUT_MS': int(os.environ.get('MONGO_REQUEST_CONNECT_TIMEOUT_MS', 2000)),
+    'MONGO_REQUEST_SERVER_SELECTION_TIMEOUT_MS': int(os.environ.get('MONGO_REQUEST_SERVER_SELECTION_TIMEOUT_MS', 2000)),
+    'MONGO_REQUEST_SOCKET_TIMEOUT_MS': int(os.environ.get('MONGO_REQUEST_SOCKET_TIMEOUT_MS', 5000)),
+    'MONGO_PUBLIC_READ_PREFERENCE': os.environ.get('MONGO_PUBLIC_READ_PREFERENCE', 'secondaryPreferred'),
+    # Shared by all requests, so by default as large as the connection pool
+    'CONTENT_LOADER_WORKERS': int(os.environ.get('CONTENT_LOADER_WORKERS', os.environ.get('MONGO_MAX_POOL_SIZE', 100))),
+    'ASYNC_MAX_CONNECTIONS': int(os.environ.get('ASYNC_MAX_CONNECTIONS', 1000)),
+    # Public form posts: token bucket per client ip and route (memory: per process, mongo: shared)
+    'RATE_LIMIT_BACKEND': os.environ.get('RATE_LIMIT_BACKEND', 'memory'),
+    'RATE_LIMIT_PER_MINUTE': float(os.environ.get('RATE_LIMIT_PER_MINUTE', 2)),
+    'RATE_LIMIT_BURST': int(os.environ.get('RATE_LIMIT_BURST', 5)),
+    # Number of trusted proxies adding X-Forwarded-For (e.g. 1 on Heroku)
+    'RATE_LIMIT_PROXIES': int(os.environ.get('RATE_LIMIT_PROXIES', 0)),
+    # Form posts in progress per worker process
+    'MAX_CONCURRENT_POSTS': int(os.environ.get('MAX_CONCURRENT_POSTS', 20)),
+    # Compiled templates shared by the workers of a machine
+    'JINJA_CACHE_DIR': os.environ.get('JINJA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'devpi-jinja-cache')),
+    'WARM_UP': os.environ.get('WARM_UP', 'true').lower() != 'false',
+    'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'INFO'),
+    # Sampling profiler of live requests, switched on from the admin panel
+    'PROFILER_DIR': os.environ.get('PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'devpi-profiles')),
+    'PROFILER_INTERVAL_MS': float(os.environ.get('PROFILER_INTERVAL_MS', 5)),
+    'PROFILER_MAX_PROFILES': int(os.environ.get('PROFILER_MAX_PROFILES', 200)),
+    # Database commands slower than this are logged with their query plan (0 turns the log off)
+    'SLOW_QUERY_MS': float(os.environ.get('SLOW_QUERY_MS', 100)),
+    'SLOW_QUERY_EXPLAIN_MINUTES': int(os.environ.get('SLOW_QUERY_EXPLAIN_MINUTES', 10)),
+    # Database of the tenants collection mapping hosts to sites, a single site is served without it
+    'TENANTS_DBNAME': os.environ.get('TENANTS_DBNAME'),
+    # Tenant of the cli commands
+    'TENANT': os.environ.get('TENANT'),
+    # Memory budgets of the content and fragment caches of each worker, shared by its tenants (0: no limit)
+    'CONTENT_CACHE_MB': float(os.environ.get('CONTENT_CACHE_MB', 16)),
+    'FRAGMENT_CACHE_MB': float(os.environ.get('FRAGMENT_CACHE_MB', 16)),
+    # Database circuit breaker: failures within the window opening it, seconds before probing the database again
+    'CIRCUIT_FAILURES': int(os.environ.get('CIRCUIT_FAILURES', 3)),
+    'CIRCUIT_WINDOW_SECONDS': int(os.environ.get('CIRCUIT_WINDOW_SECONDS', 30)),
+    'CIRCUIT_RESET_SECONDS': int(os.environ.get('CIRCUIT_RESET_SECONDS', 15)),
+    # Last good copy of the public pages, served while the circuit is open
+    'STALE_DIR': os.environ.get('STALE_DIR', os.path.join(tempfile.gettempdir(), 'devpi-stale')),
+    'STALE_SNAPSHOT_SECONDS': int(os.environ.get('STALE_SNAPSHOT_SECONDS', 60)),
 
 }
 app.config.update(config)
@@ -46,27 +145,361 @@ mail_settings = {
 }
 app.config.update(mail_settings)
 
+# Wire compression libraries are optional (zlib is part of python)
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST
+}
+
+
+def mongo_client_options(requests=False):
+    """Builds the MongoClient options from the app config
+
+    Args:
+        requests (bool, optional): options of the client serving the requests (tight timeouts). Defaults to False.
+
+    Returns:
+        dict: MongoClient keyword arguments
+    """
+
+    prefix = 'MONGO_REQUEST_' if requests else 'MONGO_'
+
+    compressors = [name.strip() for name in app.config.get('MONGO_COMPRESSORS').split(',')
+                   if name.strip() in COMPRESSOR_MODULES and find_spec(COMPRESSOR_MODULES[name.strip()])]
+
+    options = {
+        'maxPoolSize': app.config.get('MONGO_MAX_POOL_SIZE'),
+        'minPoolSize': app.config.get('MONGO_MIN_POOL_SIZE'),
+        'connectTimeoutMS': app.config.get(prefix + 'CONNECT_TIMEOUT_MS'),
+        'serverSelectionTimeoutMS': app.config.get(prefix + 'SERVER_SELECTION_TIMEOUT_MS'),
+        'socketTimeoutMS': app.config.get(prefix + 'SOCKET_TIMEOUT_MS')
+    }
+    if compressors:
+        options['compressors'] = ','.join(compressors)
+
+    return options
+
+
 # Initializations / Global vars
+app.logger.setLevel(app.config.get('LOG_LEVEL'))
+os.makedirs(app.config.get('JINJA_CACHE_DIR'), exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config.get('JINJA_CACHE_DIR'))
 Breadcrumbs(app=app)
-mongo = PyMongo(app)
+# Collections written by each request are tracked to keep the caches of every worker in sync
+write_tracker = WriteTracker(ignored={'rate_limits', 'slow_queries', 'tenants'})
+# Database commands per request, reported by flask scale-report
+command_counter = CommandCounter()
+slow_query_log = SlowQueryLog(app.config.get('SLOW_QUERY_MS'),
+                              app.config.get('SLOW_QUERY_EXPLAIN_MINUTES') * 60, app.logger)
+mongo = PyMongo(app, event_listeners=[write_tracker, command_counter, slow_query_log], **mongo_client_options())
+slow_query_log.attach(mongo.db)
+# Database of the default tenant, mongo.db follows the tenant of each request (see below)
+main_db = mongo.db
+# Requests have their own client with tight timeouts, cli commands and index builds keep the longer ones
+request_client = pymongo.MongoClient(app.config.get('MONGO_URI'),
+                                     event_listeners=[write_tracker, command_counter, slow_query_log],
+                                     **mongo_client_options(requests=True))
+request_main_db = request_client[main_db.name]
 mail = Mail(app)
 secure_headers = secure.Secure()
-settings = mongo.db.settings.find_one(
-    {'_id': "1"})
+# S3_ENDPOINT_URL allows pointing to any S3 compatible server (e.g. a local stand-in)
+s3 = boto3.client('s3', endpoint_url=os.environ.get('S3_ENDPOINT_URL'))
+# Runs the independent reads of a page in parallel, each one on its own pooled connection
+loader_pool = ThreadPoolExecutor(max_workers=app.config.get('CONTENT_LOADER_WORKERS'))
+# Downloads new photos in background to record their dimensions and placeholder
+image_pool = ThreadPoolExecutor(max_workers=2)
+# Buckets are keyed by route and client ip, the limits are shared by the tenants
+if app.config.get('RATE_LIMIT_BACKEND') == 'mongo':
+    rate_limiter = MongoRateLimiter(
+        request_main_db.rate_limits, app.config.get('RATE_LIMIT_PER_MINUTE') / 60, app.config.get('RATE_LIMIT_BURST'))
+else:
+    rate_limiter = MemoryRateLimiter(
+        app.config.get('RATE_LIMIT_PER_MINUTE') / 60, app.config.get('RATE_LIMIT_BURST'))
+post_limiter = ConcurrencyLimiter(app.config.get('MAX_CONCURRENT_POSTS'))
+breaker = CircuitBreaker(app.config.get('CIRCUIT_FAILURES'), app.config.get('CIRCUIT_WINDOW_SECONDS'),
+                         app.config.get('CIRCUIT_RESET_SECONDS'))
+snapshots = PageSnapshots(app.config.get('STALE_DIR'), app.config.get('STALE_SNAPSHOT_SECONDS'))
+# One thread per worker follows the collection versions of every tenant database
+version_watcher = VersionWatcher(mongo.cx if app.config.get('TENANTS_DBNAME') else main_db,
+                                 app.config.get('CACHE_POLL_INTERVAL'))
+# Content and fragment caches of the process, shared by the tenants within one memory budget
+content_memory = ContentCache(int(app.config.get('CONTENT_CACHE_MB') * 1024 * 1024))
+fragment_memory = FragmentCache(int(app.config.get('FRAGMENT_CACHE_MB') * 1024 * 1024))
+# {% cache %} template tag, fragments are kept until the versions of their collections change
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.add_template_filter(tech_tag)
+
+
+def tenant_database(name):
+    """Database name of a tenant
+
+    Args:
+        name (string): tenant name
+
+    Returns:
+        string: the main database for the default tenant, the main database name suffixed by the tenant name otherwise
+    """
+
+    return main_db.name if name == DEFAULT_TENANT else f"{main_db.name}_{name}"
+
+
+def build_tenant(name):
+    """Builds the database handles and cache partitions of a tenant and prepares its database
+
+    Args:
+        name (string): tenant name
+
+    Returns:
+        obj: Tenant
+    """
+
+    db = main_db if name == DEFAULT_TENANT else mongo.cx[tenant_database(name)]
+    request_db = request_client[db.name]
+    # Read only public routes may be served by secondaries, admin reads and all writes go to the primary.
+    # Cached values and fragments are read from the primary too: a lagging secondary would be cached until
+    # the next write, the versions of the write are already current when it is replicated
+    public = READ_PREFERENCES[app.config.get('MONGO_PUBLIC_READ_PREFERENCE')]
+    versions = ContentVersions(db, write_tracker, version_watcher)
+    tenant = Tenant(
+        name, db, db.with_options(read_preference=public),
+        versions,
+        content_memory.partition(name, versions),
+        fragment_memory.partition(name, versions.get),
+        request_db, request_db.with_options(read_preference=public))
+
+    # Index builds may take longer than the request timeouts, even on the first request of a tenant
+    token, serving = current_tenant.set(tenant), serving_request.set(False)
+    try:
+        create_indexes()
+        seed_order_counters()
+        tag_projects()
+    finally:
+        current_tenant.reset(token)
+        serving_request.reset(serving)
+
+    return tenant
+
+
+if app.config.get('TENANTS_DBNAME'):
+    tenants_collection = request_client[app.config.get('TENANTS_DBNAME')].tenants
+    tenants_collection.create_index('hosts', unique=True)
+else:
+    tenants_collection = None
+tenants = TenantRegistry(build_tenant, tenants_collection, app.config.get('TENANT'), breaker=breaker)
+# Module level handles of the current tenant (the tenant of the request, the default one outside requests)
+mongo.db = TenantProxy(tenants, 'db')
+public_db = TenantProxy(tenants, 'public_db')
+content_versions = TenantProxy(tenants, 'versions')
+content_cache = TenantProxy(tenants, 'cache')
+app.jinja_env.fragment_cache = TenantProxy(tenants, 'fragments')
+
+
+def create_indexes():
+    """Creates the database indexes used by the app (create_index is a no-op if the index already exists)"""
+
+    mongo.db.blogs.create_index(
+        [('title', pymongo.TEXT), ('body', pymongo.TEXT)],
+        weights={'title': 10, 'body': 1},
+        name='blogs_text')
+    mongo.db.projects.create_index(
+        [('title', pymongo.TEXT), ('brief', pymongo.TEXT),
+         ('description', pymongo.TEXT), ('tech', pymongo.TEXT)],
+        weights={'title': 10, 'tech': 5, 'brief': 3, 'description': 1},
+        name='projects_text')
+    # Keyset pagination of the admin testimonials lists
+    mongo.db.testimonials.create_index(
+        [('approved', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)])
+    for collection in ORDERED_COLLECTIONS:
+        mongo.db[collection].create_index(
+            [('order', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)])
+    # Portfolio filter by technology (multikey index over the tags array)
+    mongo.db.projects.create_index('tech_tags')
+    # Featured first keyset pagination of the admin projects list
+    mongo.db.projects.create_index(
+        [('featured', pymongo.DESCENDING), ('year', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)])
+    # Rate limit buckets are removed once full again
+    mongo.db.rate_limits.create_index('expires', expireAfterSeconds=0)
+
+
+# Collections sorted by the order field (gap based ranks)
+ORDERED_COLLECTIONS = ['education', 'experience']
+
+
+def seed_order_counters():
+    """Makes sure the order counters (kept in the settings document) are not lower than the highest order in use"""
+
+    for collection in ORDERED_COLLECTIONS:
+        last = mongo.db[collection].find_one(
+            {}, {'order': 1}, sort=[('order', pymongo.DESCENDING)])
+        if last:
+            mongo.db.settings.update_one(
+                {'_id': "1"}, {'$max': {f"order_counters.{collection}": last['order']}})
+
+
+def tag_projects():
+    """Adds the technology tags to the projects saved before they existed, and counts the tags if needed"""
+
+    tagged = 0
+    for project in mongo.db.projects.find({'tech_tags': {'$exists': False}}, {'tech': 1}):
+        mongo.db.projects.update_one(
+            {'_id': project['_id']}, {'$set': {'tech_tags': tech_tags(project.get('tech'))}})
+        tagged += 1
+    if tagged or not mongo.db.tech_counts.find_one():
+        count_tech_tags()
+
+
+def count_tech_tags():
+    """Counts the projects of every technology tag from scratch (tech_counts collection), e.g. after a restore.
+    The project routes then keep the counts up to date."""
+
+    mongo.db.projects.aggregate([{'$unwind': '$tech_tags'},
+                                 {'$group': {'_id': '$tech_tags', 'count': {'$sum': 1}}},
+                                 {'$out': 'tech_counts'}])
+
+
+def update_tech_counts(removed, added):
+    """Keeps the projects count of the technology tags up to date after a project save or delete
+
+    Args:
+        removed (list): tags of the project before the change
+        added (list): tags of the project after the change
+    """
+
+    changes = {tag: 1 for tag in set(added or []) - set(removed or [])}
+    changes.update({tag: -1 for tag in set(removed or []) - set(added or [])})
+    if not changes:
+        return
+
+    mongo.db.tech_counts.bulk_write([pymongo.UpdateOne({'_id': tag}, {'$inc': {'count': change}}, upsert=True)
+                                     for tag, change in changes.items()], ordered=False)
+    if -1 in changes.values():
+        mongo.db.tech_counts.delete_many({'count': {'$lte': 0}})
+
+
+# The default tenant (or the cli one) is prepared at import, the other tenants on their first request
+tenants.prepare()
+
+profiler = SamplingProfiler(app.config.get('PROFILER_DIR'), app.config.get('PROFILER_INTERVAL_MS') / 1000,
+                            app.config.get('PROFILER_MAX_PROFILES'))
+
+
+@app.before_request
+def start_profiler():
+    """Profiles the request if the profiler is switched on and the request is drawn"""
+
+    if request.endpoint and request.endpoint != 'static' and profiler.should_profile(request.endpoint):
+        profiler.start()
+
+
+@app.after_request
+def stop_profiler(response):
+    """Saves the profile of a profiled request (registered first, so it runs after the other handlers)"""
+
+    profiler.stop({'method': request.method, 'host': request.host, 'path': request.full_path.rstrip('?'),
+                   'endpoint': request.endpoint, 'status': response.status_code})
+    return response
+
+
+@app.teardown_request
+def stop_serving(exception):
+    """Gives the cli client back to the thread (e.g. cli commands sending test requests)"""
+
+    serving_request.set(False)
+
+
+@app.teardown_request
+def save_failed_profile(exception):
+    """Saves the profile of a profiled request that raised an exception"""
+
+    if exception:
+        profiler.stop({'method': request.method, 'host': request.host, 'path': request.full_path.rstrip('?'),
+                       'endpoint': request.endpoint, 'status': 500})
+
+
+# Routes answered without the database
+DATABASE_FREE_ENDPOINTS = {'static', 'sendfile', 'metrics'}
+
+
+@app.before_request
+def select_tenant():
+    """Serves the request with the tenant of its Host header
+
+    Returns:
+        obj: 404 response if the host is not served by this deployment, 503 if its tenant cannot be read
+    """
+
+    # A failed lookup must not leave the tenant of the previous request of the thread
+    current_tenant.set(None)
+    serving_request.set(True)
+    if request.endpoint in DATABASE_FREE_ENDPOINTS:
+        return
+
+    try:
+        tenant = tenants.resolve(request.host)
+    except PyMongoError:
+        # Already counted by the circuit breaker
+        return unavailable_response()
+    current_tenant.set(tenant)
+    if tenant is None:
+        return make_response('Unknown site', 404)
+
+    # Every host signs its session with the same key, a login is only valid on its own site
+    if session.get('user') and session.get('tenant', DEFAULT_TENANT) != tenant.name:
+        session.pop('user')
+
+
+@app.before_request
+def check_circuit():
+    """Answers without the database while the circuit breaker is open (probing it once the reset time is over)
+
+    Returns:
+        obj: stale page or 503 response if the circuit is open
+    """
+
+    if request.endpoint in DATABASE_FREE_ENDPOINTS:
+        return
+
+    if breaker.probe():
+        # Any error keeps the circuit open, the probe must always report its result
+        try:
+            request_main_db.command('ping')
+        except Exception as e:
+            breaker.failure()
+            app.logger.warning(f"Database probe failed: {e}")
+        else:
+            breaker.success()
+            app.logger.info('Database is available again, circuit closed')
+
+    if breaker.is_open:
+        return unavailable_response()
+
+
+# Tenants whose collections were checked by this worker
+installed_tenants = set()
 
 
 @app.before_request
 def check_installed():
-    """Checks if collections are created and calls the install function if not
+    """Checks if collections are created and calls the install function if not (once per tenant and worker)
 
     Returns:
         function: redirects to settings page after installation
     """
 
+    tenant = tenants.current()
+    if request.endpoint in DATABASE_FREE_ENDPOINTS or tenant.name in installed_tenants:
+        return
+
+    # Other collections may share the database (e.g. tenants, when TENANTS_DBNAME is the main database)
     created = mongo.db.list_collection_names()
-    if set(created) != set(app.config.get('DB_COLLECTIONS')) or not mongo.db.settings.find_one({'_id': "1"}):
+    if not set(app.config.get('DB_COLLECTIONS')) <= set(created) or not mongo.db.settings.find_one({'_id': "1"}):
         install_app()
         return redirect(url_for('get_settings'))
+    installed_tenants.add(tenant.name)
 
 
 def install_app():
@@ -75,7 +508,7 @@ def install_app():
     # List of existing collections
     created = mongo.db.list_collection_names()
 
-    if set(created) != set(app.config.get('DB_COLLECTIONS')):
+    if not set(app.config.get('DB_COLLECTIONS')) <= set(created):
         # Iterate through required collections that are not created
         expr = (coll for coll in app.config.get(
             'DB_COLLECTIONS') if coll not in created)
@@ -106,6 +539,7 @@ def install_app():
              'meta_desc': "",
              'meta_keys': ""})
         flash("Settings document created!")
+        seed_order_counters()
 
 
 @app.after_request
@@ -116,19 +550,218 @@ def set_secure_headers(response):
     return response
 
 
+def unavailable_response():
+    """Answers a request the database cannot serve: the last good copy of a public page, marked stale,
+    or 503 for admin routes, posts and pages never saved
+
+    Returns:
+        obj: response
+    """
+
+    tenant = current_tenant.get()
+    if tenant and request.method == 'GET' and not request.path.startswith('/admin'):
+        snapshot = snapshots.load(tenant.name, request.path)
+        if snapshot:
+            body, headers, saved = snapshot
+            response = make_response(body, 200, headers)
+            response.headers['Warning'] = '110 - "Response is Stale"'
+            response.headers['Age'] = str(int(max(time.time() - saved, 0)))
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+
+    return make_response('Database unavailable, please try again later.', 503,
+                         {'Retry-After': str(math.ceil(breaker.retry_after() or app.config.get('CIRCUIT_RESET_SECONDS')))})
+
+
+@app.errorhandler(ConnectionFailure)
+def database_unavailable(e):
+    """Error handler of the database connection errors and timeouts, counted by the circuit breaker
+
+    Args:
+        e (obj): error obj
+
+    Returns:
+        obj: stale page or 503 response
+    """
+
+    breaker.failure()
+    app.logger.warning(f"Database unavailable ({breaker.state} circuit): {e}")
+
+    return unavailable_response()
+
+
+@app.after_request
+def save_snapshot(response):
+    """Keeps the last good copy of the public pages, served while the database is unavailable.
+    Pages with a query string, shown to the admin or showing flash messages are not kept."""
+
+    tenant = current_tenant.get()
+    if tenant and request.method == 'GET' and response.status_code == 200 and not request.query_string \
+            and request.endpoint not in DATABASE_FREE_ENDPOINTS and not request.path.startswith('/admin') \
+            and not session.get('user') and 'Warning' not in response.headers and not response.is_streamed \
+            and '_flashes' not in session and not get_flashed_messages():
+        try:
+            snapshots.save(tenant.name, request.path, response)
+        except OSError as e:
+            app.logger.warning(f"Page snapshot failed: {e}")
+
+    return response
+
+
+def run_static_export(force=False):
+    """Exports the public pages of the current tenant to STATIC_EXPORT_DIR (one export at a time)
+
+    Args:
+        force (bool, optional): render every page, not only the changed ones. Defaults to False.
+
+    Returns:
+        dict: export report
+    """
+
+    output = app.config.get('STATIC_EXPORT_DIR')
+    base_url = app.config.get('STATIC_EXPORT_URL')
+    tenant = tenants.current()
+    if tenants.enabled:
+        # Each site is exported into its own directory, its pages are requested with its canonical host
+        output = os.path.join(output, tenant.name)
+        if tenant.host:
+            base_url = urlsplit(base_url)._replace(netloc=tenant.host).geturl()
+
+    return export_site(app, mongo.db, output, base_url=base_url, force=force)
+
+
+# Tenants whose background export waits to start, the writes made meanwhile are exported by the same run
+queued_exports = set()
+queued_exports_lock = threading.Lock()
+
+
+def queue_static_export():
+    """Exports the changed pages of the current tenant in background, STATIC_EXPORT_DELAY seconds after the
+    first of a series of writes. A run waits for the previous one, so at most one run per tenant is queued."""
+
+    name = tenants.current().name
+    with queued_exports_lock:
+        if name in queued_exports:
+            return
+        queued_exports.add(name)
+
+    def export():
+        with queued_exports_lock:
+            queued_exports.discard(name)
+        try:
+            run_static_export()
+        except Exception:
+            app.logger.exception('Static export failed')
+
+    timer = threading.Timer(app.config.get('STATIC_EXPORT_DELAY'), copy_context().run, args=(export,))
+    timer.daemon = True
+    timer.start()
+
+
+@app.after_request
+def update_static_export(response):
+    """Regenerates the changed exported pages in background after any admin write"""
+
+    is_write = request.method in ('POST', 'PUT') or (
+        request.endpoint or '').startswith('delete_')
+    if app.config.get('STATIC_EXPORT_DIR') and session.get('user') and is_write and \
+            request.path.startswith('/admin') and response.status_code < 400:
+        queue_static_export()
+
+    return response
+
+
+def get_site_settings():
+    """Settings document, cached until any worker updates the settings collection
+
+    Returns:
+        dict: settings document
+    """
+
+    return content_cache.get('settings', lambda: mongo.db.settings.find_one({'_id': "1"}), ['settings'])
+
+
+def get_site_links():
+    """Links, cached until any worker updates the links collection
+
+    Returns:
+        list: links documents
+    """
+
+    return content_cache.get('links', lambda: list(mongo.db.links.find()), ['links'])
+
+
+@app.before_request
+def start_content_versions():
+    """Starts following the collection versions in the worker process that serves the request"""
+
+    if request.endpoint not in DATABASE_FREE_ENDPOINTS:
+        content_versions.start()
+
+
+@app.teardown_appcontext
+def flush_content_versions(exception):
+    """Publishes the collections written by the request (or cli command) to every worker"""
+
+    content_versions.flush()
+
+
+def get_images():
+    """Dimensions and placeholders of the photos, cached until any worker updates the images collection
+
+    Returns:
+        dict: photo url: image document
+    """
+
+    return content_cache.get(
+        'images', lambda: {image['_id']: image for image in mongo.db.images.find({}, {'updated_on': 0})}, ['images'])
+
+
+@app.template_global()
+def photo_attributes(url):
+    """Img attributes reserving the space of a photo and showing its placeholder until it loads
+
+    Args:
+        url (string): photo url
+
+    Returns:
+        Markup: width, height, data-photo and style attributes, empty if the photo was not described yet
+    """
+
+    image = get_images().get(url)
+    if not image:
+        return ''
+
+    attributes = f'width="{image["width"]}" height="{image["height"]}" data-photo'
+    if image.get('placeholder'):
+        attributes += f' style="background-image: url({image["placeholder"]})"'
+
+    return Markup(attributes)
+
+
+@app.template_global()
+def photo_placeholder(url):
+    """Placeholder data uri of a photo, for css backgrounds
+
+    Args:
+        url (string): photo url
+
+    Returns:
+        string: data uri, empty if there is none
+    """
+
+    return (get_images().get(url) or {}).get('placeholder') or ''
+
+
 @app.context_processor
 def context_processor():
     """Inject settings and links variables to all templates
 
     Returns:
-        dict: settings and links db collections
+        dict: settings and links db collections, current tenant
     """
 
-    global settings
-    settings = mongo.db.settings.find_one({'_id': "1"})
-
-    links = list(mongo.db.links.find())
-    return dict(settings=settings, links=links)
+    return dict(settings=get_site_settings(), links=get_site_links(), tenant=tenants.current())
 
 
 @app.errorhandler(404)
@@ -149,6 +782,31 @@ def page_not_found(e):
     return redirect(url_for('home'))
 
 
+@app.route('/metrics')
+def metrics():
+    """Metrics of the worker process serving the request, in the Prometheus text format"""
+
+    circuit = breaker.metrics()
+    lines = [
+        '# HELP devpi_database_circuit_state Database circuit breaker state (0 closed, 1 half open, 2 open).',
+        '# TYPE devpi_database_circuit_state gauge',
+        f"devpi_database_circuit_state {circuit['code']}",
+        '# HELP devpi_database_failures_total Database connection errors and timeouts.',
+        '# TYPE devpi_database_failures_total counter',
+        f"devpi_database_failures_total {circuit['failures']}",
+        '# HELP devpi_database_circuit_opened_total Times the database circuit breaker opened.',
+        '# TYPE devpi_database_circuit_opened_total counter',
+        f"devpi_database_circuit_opened_total {circuit['opened']}",
+        '# HELP devpi_stale_responses_total Page snapshots served while the database was unavailable.',
+        '# TYPE devpi_stale_responses_total counter',
+        f"devpi_stale_responses_total {snapshots.served}"
+    ]
+    response = make_response('\n'.join(lines) + '\n')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+
+    return response
+
+
 @app.route('/browserconfig.xml')
 def sendfile():
     """Route to access browserconfig.xml file from static folder"""
@@ -156,41 +814,191 @@ def sendfile():
     return send_from_directory('static', 'browserconfig.xml')
 
 
+def last_modified(doc):
+    """Last modification time of a blog or project
+
+    Args:
+        doc (dict): document with an optional updated_on field
+
+    Returns:
+        datetime: updated_on or, for documents never edited since it exists, the _id timestamp (UTC)
+    """
+
+    if doc.get('updated_on'):
+        return doc['updated_on'].replace(tzinfo=timezone.utc)
+
+    return doc['_id'].generation_time
+
+
+def site_url():
+    """Canonical base url of the current tenant: SITE_URL, with the tenant host when hosts are mapped to tenants
+
+    Returns:
+        string: scheme and host without trailing slash, None if the site has no canonical url
+    """
+
+    base = app.config.get('SITE_URL')
+    tenant = tenants.current()
+    if tenants.enabled and tenant.host:
+        base = urlsplit(base or 'https://')._replace(netloc=tenant.host).geturl()
+
+    return base.rstrip('/') if base else None
+
+
+def content_entries(base_url):
+    """Lists the blogs and projects with their public url and last modification time, newest first
+
+    Args:
+        base_url (string): scheme and host of the urls
+
+    Returns:
+        list: dicts of kind, title, url, summary and updated
+    """
+
+    entries = []
+    sources = [('blogs', 'get_post', 'post'), ('projects', 'get_project', 'project')]
+    for collection, endpoint, arg in sources:
+        for doc in mongo.db[collection].find({}, {'title': 1, 'slug': 1, 'brief': 1, 'updated_on': 1}):
+            entries.append({
+                'kind': collection,
+                'title': doc.get('title'),
+                'url': base_url + url_for(endpoint, **{arg: doc['slug']}),
+                'summary': doc.get('brief'),
+                'updated': last_modified(doc)
+            })
+
+    return sorted(entries, key=lambda entry: entry['updated'], reverse=True)
+
+
+# Base url of the xml documents cached without canonical site url, replaced by the request host
+HOST_PLACEHOLDER = 'https://host.invalid'
+
+
+def cached_xml(template, collections):
+    """Renders an xml document once, until any of its collections is written, and answers it with an ETag
+
+    Args:
+        template (string): template name
+        collections (list): collections the document is built from
+
+    Returns:
+        obj: response (304 if the client copy is still current)
+    """
+
+    def render(base_url):
+        xml = render_template(template, entries=content_entries(base_url), base_url=base_url,
+                              now=datetime.now(timezone.utc))
+        return xml, hashlib.sha1(xml.encode()).hexdigest()
+
+    base_url = site_url()
+    xml, etag = content_cache.get(template, lambda: render(base_url or HOST_PLACEHOLDER), collections)
+    if not base_url:
+        # The Host header is only put into the answer, a forged one is never cached for everyone
+        host = str(escape(request.host_url.rstrip('/')))
+        xml = xml.replace(HOST_PLACEHOLDER, host)
+        etag = hashlib.sha1(f"{etag}{host}".encode()).hexdigest()
+    response = make_response(xml)
+    response.headers['Content-Type'] = 'application/atom+xml' if template.startswith(
+        'feed') else 'application/xml'
+    response.set_etag(etag)
+
+    return response.make_conditional(request)
+
+
+@app.route('/sitemap.xml')
+def sitemap():
+    """Sitemap of the public pages, blogs and projects"""
+
+    return cached_xml('sitemap.xml', ['blogs', 'projects'])
+
+
+@app.route('/feed.atom')
+def feed():
+    """Atom feed of the blogs and projects"""
+
+    return cached_xml('feed.xml', ['blogs', 'projects', 'settings'])
+
+
+def load_content(queries):
+    """Runs independent queries concurrently, so a page waits for the slowest one instead of all of them
+
+    Args:
+        queries (dict): name: function returning the query result
+
+    Returns:
+        dict: name: query result
+    """
+
+    # Queries run in the context of the request, which holds its tenant
+    futures = {name: loader_pool.submit(copy_context().run, query) for name, query in queries.items()}
+
+    return {name: future.result() for name, future in futures.items()}
+
+
+def cv_queries():
+    """Queries of the cv page
+
+    Returns:
+        dict: template variable: query function
+    """
+
+    return {
+        'jobs': lambda: list(public_db.experience.find().sort('order', 1)),
+        'schools': lambda: list(public_db.education.find().sort('order', 1)),
+        'skills': lambda: list(public_db.skills.find().sort('percentage', -1)),
+        'projects': lambda: list(public_db.projects.aggregate(
+            [
+                {"$project": {
+                    "title": 1,
+                    "year": 1,
+                    "tech": 1,
+                    "brief": 1,
+                    "repo": 1,
+                    "live_url": 1,
+                    "photos": 1,
+                    "featured": 1,
+                    "tech_length": {"$strLenCP": "$tech"}
+                }},
+                {"$sort": {
+                    "featured": -1,
+                    "year": -1,
+                    "tech_length": -1
+                }},
+                {'$limit': 5},
+                {"$project": {"tech_length": 0}}
+            ]
+        )),
+        'testimonials': lambda: list(public_db.testimonials.find(
+            {'approved': True}).limit(5))
+    }
+
+
+def home_queries():
+    """Queries of the landing page (the lists shown by cached fragments are cached with them)
+
+    Returns:
+        dict: template variable: query function
+    """
+
+    return {
+        'skills': lambda: content_cache.get('home_skills', lambda: list(mongo.db.skills.find().sort(
+            [('percentage', pymongo.DESCENDING), ('name', pymongo.ASCENDING)])), ['skills']),
+        'education': lambda: content_cache.get(
+            'home_education', lambda: list(mongo.db.education.find().sort('order', 1)), ['education']),
+        'experience': lambda: content_cache.get(
+            'home_experience', lambda: list(mongo.db.experience.find().sort('order', 1)), ['experience']),
+        'testimonials': lambda: list(public_db.testimonials.find({'approved': True}))
+    }
+
+
 @app.route('/cv')
 def get_cv():
     """Route that generates pdf file from html jinja template"""
 
     root = request.url_root
-    jobs = list(mongo.db.experience.find().sort('order', 1))
-    schools = list(mongo.db.education.find().sort('order', 1))
-    skills = list(mongo.db.skills.find().sort('percentage', -1))
-    projects = list(mongo.db.projects.aggregate(
-        [
-            {"$project": {
-                "title": 1,
-                "year": 1,
-                "tech": 1,
-                "brief": 1,
-                "repo": 1,
-                "live_url": 1,
-                "photos": 1,
-                "featured": 1,
-                "tech_length": {"$strLenCP": "$tech"}
-            }},
-            {"$sort": {
-                "featured": -1,
-                "year": -1,
-                "tech_length": -1
-            }},
-            {'$limit': 5},
-            {"$project": {"tech_length": 0}}
-        ]
-    ))
-    testimonials = list(mongo.db.testimonials.find(
-        {'approved': True}).limit(5))
-    html = render_template('cv.html', jobs=jobs,
-                           schools=schools, skills=skills, projects=projects, testimonials=testimonials, root=root)
-    filename = settings['name'].replace(' ', '-').lower()
+    content = load_content(cv_queries())
+    html = render_template('cv.html', root=root, **content)
+    filename = get_site_settings()['name'].replace(' ', '-').lower()
     pdf = pydf.generate_pdf(html, page_size='A4', margin_bottom='0.75in',
                             margin_top='0.75in', margin_left='0.5in', margin_right='0.5in', image_dpi='300')
     response = make_response(pdf)
@@ -207,17 +1015,59 @@ def get_cv():
 def home():
     """Landing page route"""
 
-    skills = list(mongo.db.skills.find().sort(
-        [('percentage', pymongo.DESCENDING), ('name', pymongo.ASCENDING)]))
-    education = list(mongo.db.education.find().sort('order', 1))
-    experience = list(mongo.db.experience.find().sort('order', 1))
-    testimonials = list(mongo.db.testimonials.find({'approved': True}))
+    content = load_content(home_queries())
+
+    return render_template('landing.html', **content)
+
+
+def client_ip():
+    """Address of the client, as seen by the first trusted proxy if any
+
+    Returns:
+        string: ip address
+    """
+
+    proxies = app.config.get('RATE_LIMIT_PROXIES')
+    route = request.access_route
+    if proxies and len(route) >= proxies:
+        return route[-proxies]
+
+    return request.remote_addr
 
-    return render_template('landing.html', skills=skills, education=education, experience=experience, testimonials=testimonials)
+
+def rate_limited(f):
+    """Function decorator that limits the POST requests of public forms, before the form is validated.
+    Answers 503 when too many posts are in progress and 429 when the client ran out of tokens.
+
+    Args:
+        f (function): Decorated function
+
+    Returns:
+        function: Function after being decorated
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method != 'POST':
+            return f(*args, **kwargs)
+
+        if not post_limiter.acquire():
+            return make_response('Server busy, please try again later.', 503, {'Retry-After': '5'})
+        try:
+            allowed, retry_after = rate_limiter.allow(f"{request.endpoint}:{client_ip()}")
+            if not allowed:
+                return make_response('Too many requests, please try again later.', 429,
+                                     {'Retry-After': str(math.ceil(retry_after))})
+            return f(*args, **kwargs)
+        finally:
+            post_limiter.release()
+
+    return decorated_function
 
 
 @app.route('/write-testimonial', methods=['GET', 'POST'])
 @register_breadcrumb(app, '.write-testimonial', 'Write Testimonial')
+@rate_limited
 def add_testimonial():
     """Write testimonial page route"""
 
@@ -241,42 +1091,237 @@ def add_testimonial():
     return render_template('write-testimonial.html', form=form)
 
 
+def get_tech_facets():
+    """Projects count per technology tag, kept up to date by the project routes (tech_counts collection)
+    and cached until any worker updates the projects
+
+    Returns:
+        dict: total (projects count) and tags (list of tag and count, most used first)
+    """
+
+    def load():
+        tags = mongo.db.tech_counts.find({'count': {'$gt': 0}}).sort(
+            [('count', pymongo.DESCENDING), ('_id', pymongo.ASCENDING)])
+        return {'total': mongo.db.projects.count_documents({}),
+                'tags': [{'tag': tag['_id'], 'count': tag['count']} for tag in tags]}
+
+    return content_cache.get('tech_facets', load, ['projects', 'tech_counts'])
+
+
 @app.route('/portfolio')
 @register_breadcrumb(app, '.portfolio', 'Portfolio')
 def portfolio():
-    """Portfolio page route"""
-
-    projects = list(mongo.db.projects.aggregate(
-        [
-            {"$project": {
-                "title": 1,
-                "slug": 1,
-                "year": 1,
-                "tech": 1,
-                "brief": 1,
-                "repo": 1,
-                "live_url": 1,
-                "photos": 1,
-                "featured": 1,
-                "tech_length": {"$strLenCP": "$tech"}
-            }},
-            {"$sort": {
-                "featured": -1,
-                "year": -1,
-                "tech_length": -1
-            }},
-            {"$project": {"tech_length": 0}}
-        ]
-    ))
-
-    return render_template('portfolio.html', projects=projects)
+    """Portfolio page route, optionally filtered by technology (query string: tech)"""
+
+    tech = tech_tag(request.args.get('tech', ''))
+    # The filter is an index lookup on the tags array
+    match = [{"$match": {"tech_tags": tech}}] if tech else []
+
+    def load():
+        return list(mongo.db.projects.aggregate(
+            match + [
+                {"$project": {
+                    "title": 1,
+                    "slug": 1,
+                    "year": 1,
+                    "tech": 1,
+                    "brief": 1,
+                    "repo": 1,
+                    "live_url": 1,
+                    "photos": 1,
+                    "featured": 1,
+                    "tech_length": {"$strLenCP": "$tech"}
+                }},
+                {"$sort": {
+                    "featured": -1,
+                    "year": -1,
+                    "tech_length": -1
+                }},
+                {"$project": {"tech_length": 0}}
+            ]
+        ))
+
+    facets = get_tech_facets()
+    # Shown by the project cards fragment, so cached with it (one list per tag in use)
+    if tech and tech not in {tag['tag'] for tag in facets['tags']}:
+        projects = []
+    else:
+        projects = content_cache.get(f"portfolio:{tech}", load, ['projects'])
+
+    return render_template('portfolio.html', projects=projects, selected_tech=tech, facets=facets)
+
+
+def fetch_image_size(src):
+    """Reads the dimensions of a remote image from its first 64KB
+
+    Args:
+        src (string): image url
+
+    Returns:
+        tuple: (width, height) or None if the image can not be read
+    """
+
+    if not src.startswith(('http://', 'https://')):
+        return None
+    try:
+        response = requests.get(
+            src, headers={'Range': 'bytes=0-65535'}, timeout=3, stream=True)
+        data = response.raw.read(65536)
+    except Exception:
+        return None
+
+    return image_size(data)
+
+
+def fetch_image(src):
+    """Downloads a photo, up to IMAGE_MAX_SIZE
+
+    Args:
+        src (string): image url
+
+    Returns:
+        bytes: image file, None if it can not be downloaded or is too large
+    """
+
+    max_size = app.config.get('IMAGE_MAX_SIZE')
+    try:
+        response = requests.get(src, timeout=10, stream=True)
+        response.raise_for_status()
+        data = response.raw.read(max_size + 1, decode_content=True)
+    except Exception:
+        return None
+
+    return data if len(data) <= max_size else None
+
+
+def describe_photos(urls, force=False):
+    """Records the dimensions, byte size and placeholder of photos into the images collection
+
+    Args:
+        urls (list): photo urls
+        force (bool, optional): describe again the photos already described. Defaults to False.
+
+    Returns:
+        int: photos described
+    """
+
+    urls = [url for url in dict.fromkeys(urls) if url and url.startswith(('http://', 'https://'))]
+    if not force:
+        described = {image['_id'] for image in mongo.db.images.find({'_id': {'$in': urls}}, {'_id': 1})}
+        urls = [url for url in urls if url not in described]
+
+    count = 0
+    for url in urls:
+        data = fetch_image(url)
+        image = describe_image(data) if data else None
+        if image:
+            image['updated_on'] = datetime.utcnow()
+            mongo.db.images.update_one({'_id': url}, {'$set': image}, upsert=True)
+            count += 1
+
+    return count
+
+
+def queue_photo_descriptions(urls):
+    """Describes new photos in background, then publishes the images change to every worker
+
+    Args:
+        urls (list): photo urls
+    """
+
+    def describe():
+        try:
+            describe_photos(urls)
+        except Exception:
+            app.logger.exception('Photo description failed')
+        content_versions.flush()
+
+    if urls:
+        image_pool.submit(copy_context().run, describe)
+
+
+# Characters of the blog excerpts
+EXCERPT_CHARS = 200
+
+
+def render_fields(html, field):
+    """Renders a rich text field at save time (sanitized html, table of contents and reading time)
+
+    Args:
+        html (string): raw html from the rich text editor
+        field (string): name of the raw field (body or description)
+
+    Returns:
+        dict: fields to be stored alongside the raw field
+    """
+
+    rendered = render_content(html, fetch_image_size)
+    fields = {
+        f"{field}_html": rendered['html'],
+        'toc': rendered['toc'],
+        'reading_time': rendered['reading_time']
+    }
+    # Blog lists show the start of the sanitized body
+    if field == 'body':
+        fields['excerpt'] = truncate_html(rendered['html'], EXCERPT_CHARS, end=' ...', break_words=True)
+
+    return fields
+
+
+def find_rendered(collection, slug, field):
+    """Finds a document by slug without its raw rich text field.
+    Documents saved before the render stage existed are rendered and updated once.
+
+    Args:
+        collection (string): blogs or projects
+        slug (string): document slug
+        field (string): name of the raw field (body or description)
+
+    Returns:
+        dict: document or None
+    """
+
+    doc = public_db[collection].find_one({'slug': slug}, {field: 0})
+
+    if doc and f"{field}_html" not in doc:
+        raw = public_db[collection].find_one({'_id': doc['_id']}, {field: 1})
+        rendered = render_fields(raw.get(field), field)
+        mongo.db[collection].update_one({'_id': doc['_id']}, {'$set': rendered})
+        doc.update(rendered)
+
+    return doc
+
+
+# Fields of the blogs page cards: the excerpt stands for the body
+BLOG_LIST_PROJECTION = {'title': 1, 'slug': 1, 'added_on': 1, 'photos': {'$slice': 1}, 'excerpt': 1}
+
+
+def add_excerpts(blogs):
+    """Adds the excerpt to blogs listed without one.
+    Blogs saved before excerpts were stored are rendered and updated once.
+
+    Args:
+        blogs (list): blog documents
+
+    Returns:
+        list: same blogs
+    """
+
+    for blog in blogs:
+        if 'excerpt' not in blog:
+            raw = mongo.db.blogs.find_one({'_id': blog['_id']}, {'body': 1})
+            rendered = render_fields(raw.get('body') if raw else None, 'body')
+            mongo.db.blogs.update_one({'_id': blog['_id']}, {'$set': rendered})
+            blog['excerpt'] = rendered['excerpt']
+
+    return blogs
 
 
 def view_project_dlc(*args, **kwargs):
     """Get project details from requested url args"""
 
     slug = request.view_args['project']
-    project = mongo.db.projects.find_one({'slug': slug})
+    project = public_db.projects.find_one({'slug': slug})
 
     if project and project['title']:
         return [{'text': project['title']}]
@@ -289,7 +1334,7 @@ def view_project_dlc(*args, **kwargs):
 def get_project(project):
     """Project page route"""
 
-    project = mongo.db.projects.find_one({'slug': project})
+    project = find_rendered('projects', project, 'description')
 
     return render_template('project.html', project=project)
 
@@ -299,12 +1344,7 @@ def get_project(project):
 def blog():
     """Blogs page route"""
 
-    blogs = list(mongo.db.blogs.find())
-
-    for i, blog in enumerate(blogs):
-        blog['body'] = truncate_html(
-            blog['body'], 200, end=' ...', break_words=True)
-        blogs[i] = blog
+    blogs = add_excerpts(list(public_db.blogs.find({}, BLOG_LIST_PROJECTION)))
 
     return render_template('blog.html', blogs=blogs)
 
@@ -317,7 +1357,7 @@ def view_blog_dlc(*args, **kwargs):
     """
 
     slug = request.view_args['post']
-    post = mongo.db.blogs.find_one({'slug': slug})
+    post = public_db.blogs.find_one({'slug': slug})
 
     if post and post['title']:
         return [{'text': post['title']}]
@@ -330,13 +1370,14 @@ def view_blog_dlc(*args, **kwargs):
 def get_post(post):
     """Blog post page route"""
 
-    post = mongo.db.blogs.find_one({'slug': post})
+    post = find_rendered('blogs', post, 'body')
 
     return render_template('blog-post.html', post=post)
 
 
 @app.route('/contact', methods=['GET', 'POST'])
 @register_breadcrumb(app, '.contact', 'Contact')
+@rate_limited
 def contact():
     """Conact page route"""
 
@@ -356,15 +1397,126 @@ def contact():
                 flash(
                     'Error sending email!', 'danger')
             else:
-                flash(
-                    'Thank you for your message! I will get back to you shortly.', 'success')
-            return redirect(url_for('contact'))
-        else:
-            for fieldName, errorMessages in form.errors.items():
-                for err in errorMessages:
-                    flash(err, 'danger')
+                flash(
+                    'Thank you for your message! I will get back to you shortly.', 'success')
+            return redirect(url_for('contact'))
+        else:
+            for fieldName, errorMessages in form.errors.items():
+                for err in errorMessages:
+                    flash(err, 'danger')
+
+    return render_template('contact.html', form=form)
+
+
+def strip_html(html):
+    """Converts html markup to plain text
+
+    Args:
+        html (string): html markup
+
+    Returns:
+        string: text content with collapsed whitespace
+    """
+
+    return ' '.join(unescape(re.sub(r'<[^>]+>', ' ', html or '')).split())
+
+
+def highlight_snippet(text, terms, length):
+    """Cuts a snippet around the first matched term and highlights every term occurrence
+
+    Args:
+        text (string): plain text to cut the snippet from
+        terms (list): search terms to be highlighted
+        length (int): maximum snippet length
+
+    Returns:
+        Markup: escaped snippet with matches wrapped into <mark> tags
+    """
+
+    lower = text.lower()
+    positions = [lower.find(term) for term in terms if term in lower]
+    start = max(min(positions) - length // 4, 0) if positions else 0
+    snippet = text[start:start + length]
+
+    if terms:
+        pattern = re.compile(
+            '(' + '|'.join(re.escape(term) for term in terms) + ')', re.IGNORECASE)
+        parts = pattern.split(snippet)
+    else:
+        parts = [snippet]
+
+    # Odd indexes of the split result are the captured matches
+    highlighted = ''.join(
+        f"<mark>{escape(part)}</mark>" if i % 2 else str(escape(part))
+        for i, part in enumerate(parts))
+
+    return Markup(('... ' if start > 0 else '') + highlighted +
+                  (' ...' if start + length < len(text) else ''))
+
+
+@app.route('/search')
+@register_breadcrumb(app, '.search', 'Search')
+def search():
+    """Search page route (blogs and projects ranked by text index score)"""
+
+    query = request.args.get('q', '').strip()
+    max_pages = app.config.get('SEARCH_MAX_PAGES')
+    page = min(max(request.args.get('page', 1, type=int), 1), max_pages)
+    per_page = app.config.get('SEARCH_PER_PAGE')
+    results = []
+    total = 0
+
+    if query:
+        text_filter = {'$text': {'$search': query}}
+        score = {'score': {'$meta': 'textScore'}}
+        # Each collection ranks its best matches up to the end of the requested page, by id and score only
+        limit = page * per_page
+        fields = {
+            'blog': {'title': 1, 'slug': 1, 'body': 1, 'added_on': 1, 'photos': {'$slice': 1}},
+            'project': {'title': 1, 'slug': 1, 'brief': 1, 'description': 1, 'tech': 1, 'year': 1,
+                        'photos': {'$slice': 1}}
+        }
+        collections = {'blog': mongo.db.blogs, 'project': mongo.db.projects}
+
+        ranked = []
+        for kind, collection in collections.items():
+            # A $meta projection alone keeps every field, _id makes it an inclusion projection
+            matches = list(collection.find(text_filter, {'_id': 1, **score}).sort(
+                [('score', {'$meta': 'textScore'})]).limit(limit))
+            # A collection ranked whole needs no count
+            total += len(matches) if len(matches) < limit else collection.count_documents(text_filter)
+            ranked += [(match['score'], kind, match['_id']) for match in matches]
+        ranked.sort(key=lambda match: match[0], reverse=True)
+        ranked = ranked[(page - 1) * per_page:limit]
+
+        # The text fields are read for the returned page only
+        docs = {}
+        for kind, collection in collections.items():
+            ids = [doc_id for match_score, match_kind, doc_id in ranked if match_kind == kind]
+            if ids:
+                docs.update({(kind, doc['_id']): doc
+                             for doc in collection.find({'_id': {'$in': ids}}, fields[kind])})
+        # Documents deleted since they were ranked are left out
+        results = [{'type': kind, 'doc': docs[(kind, doc_id)]} for match_score, kind, doc_id in ranked
+                   if (kind, doc_id) in docs]
+
+        # Highlighting is done only for the returned page
+        terms = [term.lower() for term in re.findall(r'\w+', query)]
+        for result in results:
+            doc = result['doc']
+            if result['type'] == 'blog':
+                result['url'] = url_for('get_post', post=doc['slug'])
+                text = strip_html(doc.get('body'))
+            else:
+                result['url'] = url_for('get_project', project=doc['slug'])
+                text = ' '.join(
+                    [doc.get('brief') or '', strip_html(doc.get('description'))])
+            result['snippet'] = highlight_snippet(
+                text, terms, app.config.get('SEARCH_SNIPPET_LENGTH'))
 
-    return render_template('contact.html', form=form)
+    pages = min(-(-total // per_page), max_pages)
+
+    return render_template('search.html', query=query, results=results, total=total, page=page, pages=pages)
 
 
 # ADMIN PANEL
@@ -398,116 +1550,756 @@ def login_required(flash_message=False):
     return inner_function
 
 
-@app.route('/admin/add_photo', methods=["PUT"])
-@login_required()
-def add_photo():
-    """Route to be called (API call with PUT method) for adding photo to database"""
+def default_tenant_required(f):
+    """Function decorator restricting a route to the default tenant (tools showing the whole machine)
 
-    collection = request.args.get('coll')
-    document_id = request.args.get('docid')
-    photo = request.args.get('photo')
+    Args:
+        f (function): Decorated function
 
-    if collection == "settings":
-        id = "1"
-    else:
-        id = ObjectId(document_id)
+    Returns:
+        function: Function after being decorated
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not tenants.current().is_default:
+            flash('This section is only available on the main site.', 'danger')
+            return redirect(url_for('admin'))
+
+        return f(*args, **kwargs)
+
+    return decorated_function
 
-    try:
-        mongo.db[collection].update(
-            {'_id': id},
-            {'$push': {'photos': photo}}
-        )
-    except:
-        return make_response(jsonify({'message': 'Error updating database'}), 500)
-    else:
-        return make_response(jsonify({'message': 'Photo was successfully added to database'}), 200)
 
+# Collections with a photos array that can be updated through the photos API
+PHOTO_COLLECTIONS = ['settings', 'blogs', 'projects']
 
-@app.route('/admin/delete_photo')
+
+@app.route('/admin/photos', methods=["PUT"])
 @login_required()
-def delete_photo():
-    """Route to be called (API call) for removing photo from database"""
+def update_photos():
+    """Route to be called (API call with PUT method) for adding, removing and reordering photos of one document
+
+    JSON body: coll, docid, add (list of urls), position (optional index for add),
+    remove (list of urls) and order (optional full list of urls in the new order).
+    All operations are applied as a single atomic update of the document.
+    """
 
-    collection = request.args.get('coll')
-    document_id = request.args.get('docid')
-    photo = request.args.get('photo')
+    data = request.get_json(silent=True) or {}
+    collection = data.get('coll')
+    document_id = data.get('docid')
+    add = [photo for photo in data.get('add') or [] if photo]
+    remove = [photo for photo in data.get('remove') or [] if photo]
+    order = data.get('order')
+    position = data.get('position')
 
+    if collection not in PHOTO_COLLECTIONS:
+        return make_response(jsonify({'message': 'Invalid collection'}), 400)
     if collection == "settings":
         id = "1"
-    else:
+    elif ObjectId.is_valid(document_id):
         id = ObjectId(document_id)
+    else:
+        return make_response(jsonify({'message': 'Invalid document id'}), 400)
+    if position is not None and (not isinstance(position, int) or position < 0):
+        return make_response(jsonify({'message': 'Invalid position'}), 400)
+    if order is not None and (add or remove):
+        return make_response(jsonify({'message': 'Order can not be combined with add or remove'}), 400)
+
+    query = {'_id': id}
+    if order is not None:
+        # Only reorder if the document still holds exactly the same photos
+        query['photos'] = {'$size': len(order), '$all': order}
+        update = {'$set': {'photos': order}}
+    elif add and remove:
+        # $push and $pull can not target the same field in one update, so a pipeline update is used
+        kept = {'$filter': {'input': {'$ifNull': ['$photos', []]},
+                            'cond': {'$not': [{'$in': ['$$this', remove]}]}}}
+        if position is None:
+            photos = {'$concatArrays': [kept, add]}
+        elif position == 0:
+            # $slice only takes a positive count after a position
+            photos = {'$concatArrays': [add, kept]}
+        else:
+            photos = {'$concatArrays': [{'$slice': [kept, position]}, add,
+                                        {'$slice': [kept, position, 2 ** 31 - 1]}]}
+        update = [{'$set': {'photos': photos}}]
+    elif add:
+        push = {'$each': add}
+        if position is not None:
+            push['$position'] = position
+        update = {'$push': {'photos': push}}
+    elif remove:
+        update = {'$pull': {'photos': {'$in': remove}}}
+    else:
+        return make_response(jsonify({'message': 'Nothing to update'}), 400)
 
     try:
-        mongo.db[collection].update(
-            {'_id': id},
-            {'$pull': {'photos': photo}}
-        )
+        document = mongo.db[collection].find_one_and_update(
+            query, update, projection={'photos': 1},
+            return_document=pymongo.ReturnDocument.AFTER)
     except:
         return make_response(jsonify({'message': 'Error updating database'}), 500)
-    else:
-        return make_response(jsonify({'message': 'Photo was successfully removed from database'}), 200)
 
+    if not document:
+        return make_response(jsonify({'message': 'Photos have changed, please reload the page'}), 409)
+    queue_photo_descriptions(add)
 
-@app.route('/admin/sign_s3')
-@login_required()
-def sign_s3():
-    """Route to be called (API call) for getting a signed S3 post"""
+    return make_response(jsonify({'message': 'Photos were successfully updated', 'photos': document['photos']}), 200)
 
-    S3_BUCKET = os.environ.get('S3_BUCKET_NAME')
-    file_name = request.args.get('file_name')
-    file_type = request.args.get('file_type')
-    s3 = boto3.client('s3')
 
+def sign_s3_file(file):
+    """Validates a file to be uploaded and generates its signed S3 post
+
+    Args:
+        file (dict): file_name, file_type and file_size of the file
+
+    Returns:
+        dict: signed post data and file url, or error message if the file is not allowed
+    """
+
+    S3_BUCKET = os.environ.get('S3_BUCKET_NAME')
+    file_name = str(file.get('file_name') or '')
+    file_type = file.get('file_type')
+    max_size = app.config.get('UPLOAD_MAX_SIZE')
+    extension = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+
+    if not re.match(r'^[\w\-.]+$', file_name):
+        return {'file_name': file_name, 'error': 'Invalid file name'}
+    if app.config.get('UPLOAD_EXTENSIONS').get(extension) != file_type:
+        return {'file_name': file_name, 'error': f"File type ({extension}) is not allowed"}
+    if not isinstance(file.get('file_size'), int) or not 0 < file['file_size'] <= max_size:
+        return {'file_name': file_name, 'error': 'File is too large'}
+
+    # Each tenant uploads under its own key prefix
+    key = tenants.current().s3_prefix + file_name
     presigned_post = s3.generate_presigned_post(
         Bucket=S3_BUCKET,
-        Key=file_name,
+        Key=key,
         Fields={"acl": "public-read", "Content-Type": file_type},
         Conditions=[
             {"acl": "public-read"},
-            {"Content-Type": file_type}
+            {"Content-Type": file_type},
+            ["content-length-range", 1, max_size]
         ],
         ExpiresIn=3600
     )
 
-    return json.dumps({
+    return {
+        'file_name': file_name,
         'data': presigned_post,
-        'url': 'https://%s.s3.amazonaws.com/%s' % (S3_BUCKET, file_name)
-    })
+        'url': 'https://%s.s3.amazonaws.com/%s' % (S3_BUCKET, key)
+    }
+
+
+@app.route('/admin/sign_s3', methods=["POST"])
+@login_required()
+def sign_s3():
+    """Route to be called (API call with POST method) for getting signed S3 posts of a list of files
+
+    JSON body: files (list of dicts with file_name, file_type and file_size)
+    """
+
+    data = request.get_json(silent=True) or {}
+    files = data.get('files')
+
+    if not isinstance(files, list) or not files:
+        return make_response(jsonify({'message': 'No files to sign'}), 400)
+
+    return jsonify({'files': [sign_s3_file(file) for file in files if isinstance(file, dict)]})
 
 
 def s3_delete_call(file_name):
     """Function to delete file from S3
 
     Args:
-        file_name (string): Name of file to be deleted
+        file_name (string): Name of file to be deleted (without the key prefix of the tenant)
 
     Returns:
         obj: Response in json format
     """
 
     S3_BUCKET = os.environ.get('S3_BUCKET_NAME')
-    s3 = boto3.client('s3')
+    key = tenants.current().s3_prefix + file_name
 
     response = s3.delete_object(
         Bucket=S3_BUCKET,
-        Key=file_name
+        Key=key
     )
+    mongo.db.images.delete_one({'_id': 'https://%s.s3.amazonaws.com/%s' % (S3_BUCKET, key)})
 
     return json.dumps({
         'data': response
     })
 
 
+@app.cli.command('describe-photos')
+@click.option('--force', is_flag=True, help='Describe again the photos already described.')
+def describe_all_photos(force):
+    """Records the dimensions, size and placeholder of every photo of settings, blogs and projects"""
+
+    urls = [photo for collection in PHOTO_COLLECTIONS
+            for doc in mongo.db[collection].find({}, {'photos': 1}) for photo in doc.get('photos') or []]
+    click.echo(f"{describe_photos(urls, force)} photos described")
+
+
+@app.cli.command('render-content')
+def render_all_content():
+    """Renders again the body of every blog and the description of every project"""
+
+    for collection, field in [('blogs', 'body'), ('projects', 'description')]:
+        for doc in mongo.db[collection].find({}, {field: 1}):
+            mongo.db[collection].update_one(
+                {'_id': doc['_id']}, {'$set': render_fields(doc.get(field), field)})
+        click.echo(f"{collection} rendered")
+
+
+@app.cli.command('bench-loader')
+@click.option('--runs', default=50, show_default=True, help='Page loads measured per mode.')
+def bench_loader(runs):
+    """Compares the sequential and the concurrent loading of the landing and cv pages queries"""
+
+    def measure(load):
+        timings = []
+        for i in range(runs):
+            start = time.perf_counter()
+            load()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return statistics.mean(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+    for page, queries in [('home', home_queries), ('cv', cv_queries)]:
+        # Warm up the connection pool
+        load_content(queries())
+        sequential = measure(lambda: {name: query() for name, query in queries().items()})
+        concurrent = measure(lambda: load_content(queries()))
+        for mode, (mean, median, p95) in [('sequential', sequential), ('concurrent', concurrent)]:
+            click.echo(f"{page:5} {mode:11} mean {mean:7.2f} ms  median {median:7.2f} ms  p95 {p95:7.2f} ms")
+        click.echo(f"{page:5} speedup {sequential[1] / concurrent[1]:.2f}x (median)")
+
+
+@app.cli.command('bench-server')
+@click.argument('base_url')
+@click.option('--clients', default=200, show_default=True, help='Concurrent clients.')
+@click.option('--requests-count', 'count', default=2000, show_default=True, help='Total requests.')
+@click.option('--path', 'paths', multiple=True, default=['/', '/portfolio', '/blog'], show_default=True,
+              help='Public pages requested in turn.')
+def bench_server(base_url, clients, count, paths):
+    """Load tests a running server (e.g. python app.py vs python serve_async.py) with many concurrent clients"""
+
+    def fetch(i):
+        start = time.perf_counter()
+        try:
+            ok = requests.get(base_url.rstrip('/') + paths[i % len(paths)], timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        return ok, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(fetch, range(count)))
+    elapsed = time.perf_counter() - start
+
+    timings = sorted(timing for ok, timing in results if ok)
+    errors = count - len(timings)
+    click.echo(f"{count} requests, {clients} clients, {elapsed:.2f} s, {count / elapsed:.1f} req/s, {errors} errors")
+    if timings:
+        click.echo(f"latency median {timings[len(timings) // 2]:.1f} ms  "
+                   f"p95 {timings[int(len(timings) * 0.95)]:.1f} ms  max {timings[-1]:.1f} ms")
+
+
+@app.cli.command('bench-truncate')
+@click.option('--size', default=200000, show_default=True, help='Characters of the benchmarked post.')
+@click.option('--runs', default=20, show_default=True, help='Truncations per engine.')
+def bench_truncate(size, runs):
+    """Checks the html truncator against html5lib_truncation on a corpus, then compares their speed"""
+
+    # The reference truncator is a development dependency, not needed to serve the app
+    try:
+        from truncate_check import check_corpus, benchmark
+    except ImportError:
+        raise click.ClickException('html5lib_truncation is not installed (pip install html5lib_truncation==0.1.0)')
+
+    failures = check_corpus()
+    for name, options, expected, actual in failures:
+        click.echo(f"Mismatch: {name} {options}\n  html5lib:  {expected}\n  streaming: {actual}", err=True)
+    if failures:
+        raise click.ClickException(f"{len(failures)} corpus mismatches")
+    click.echo('Corpus: all cases match')
+
+    results = benchmark(size, runs)
+    for engine, mean in results.items():
+        click.echo(f"{engine:9} {mean:9.3f} ms per post")
+    click.echo(f"speedup {results['html5lib'] / results['streaming']:.0f}x")
+
+
+@app.cli.command('check-render')
+def check_render():
+    """Checks the save time html renderer against its correctness cases"""
+
+    from render_check import check_cases
+
+    failures = check_cases()
+    for name, expected, actual in failures:
+        click.echo(f"Mismatch: {name}\n  expected: {expected}\n  rendered: {actual}", err=True)
+    if failures:
+        raise click.ClickException(f"{len(failures)} render mismatches")
+    click.echo('Renderer: all cases match')
+
+
+# Routes measured by flask scale-report (synthetic slugs are numbered from 0)
+SCALE_REPORT_ROUTES = ['/', '/portfolio', '/portfolio/synthetic-project-0', '/blog', '/blog/synthetic-blog-0',
+                       '/cv', '/search?q=lorem', '/sitemap.xml', '/admin', '/admin/blogs', '/admin/projects',
+                       '/admin/testimonials', '/admin/api/blogs', '/admin/api/projects']
+
+
+def generate_synthetic(scale, seed):
+    """Inserts synthetic content and updates what depends on the collections
+
+    Args:
+        scale (float): multiplier of the base volumes
+        seed (int): random seed
+
+    Returns:
+        dict: collection: inserted documents
+    """
+
+    counts = generate(mongo.db, scale, os.environ.get('S3_BUCKET_NAME'), app.config['ORDER_GAP'], seed)
+    seed_order_counters()
+    count_tech_tags()
+    content_versions.flush()
+
+    return counts
+
+
+@app.cli.command('synthetic')
+@click.option('--scale', default=1.0, show_default=True, help='Multiplier of a typical portfolio volume.')
+@click.option('--seed', default=0, show_default=True, help='Random seed.')
+@click.option('--clear', 'clear_only', is_flag=True, help='Only remove the synthetic documents.')
+def synthetic(scale, seed, clear_only):
+    """Fills every content collection with realistic synthetic documents (or removes them)"""
+
+    removed = clear(mongo.db)
+    count_tech_tags()
+    content_versions.flush()
+    click.echo(f"{removed} synthetic documents removed")
+    if clear_only:
+        return
+
+    for collection, count in generate_synthetic(scale, seed).items():
+        click.echo(f"{collection}: {count} documents")
+
+
+@app.cli.command('scale-report')
+@click.option('--scales', default='1,10,100', show_default=True, help='Comma separated content volumes.')
+@click.option('--runs', default=20, show_default=True, help='Requests per route and volume.')
+@click.option('--route', 'routes', multiple=True, help='Route to measure (default: the main public and admin ones).')
+@click.option('--json', 'as_json', is_flag=True, help='Print the results as json.')
+@click.option('--force', is_flag=True, help='Also run against a database holding real content.')
+def scale_report(scales, runs, routes, as_json, force):
+    """Measures latency, memory and database commands per request of each route at growing content volumes"""
+
+    # Synthetic documents are inserted into the database, and shown by the site while it is measured
+    collections = real_collections(mongo.db)
+    if collections and not force:
+        raise click.ClickException(f"{mongo.db.name} holds content ({', '.join(collections)}), run the report "
+                                   f"against an empty database or pass --force")
+
+    scales = [float(scale) for scale in scales.split(',')]
+    client = app.test_client()
+    # Requests are sent to the host of the current tenant
+    tenant = tenants.current()
+    base_url = f"http://{tenant.host}/" if tenant.host else 'http://localhost/'
+    with client.session_transaction(base_url=base_url) as client_session:
+        client_session['user'] = 'scale-report'
+        client_session['tenant'] = tenant.name
+
+    results = {}
+    try:
+        for scale in scales:
+            clear(mongo.db)
+            generate_synthetic(scale, 0)
+            click.echo(f"Measuring scale {scale:g}...", err=True)
+            for route in routes or SCALE_REPORT_ROUTES:
+                results.setdefault(route, {})[scale] = measure(
+                    client, base_url.rstrip('/') + route, runs, command_counter)
+    finally:
+        clear(mongo.db)
+        count_tech_tags()
+        content_versions.flush()
+
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+        return
+
+    for route, by_scale in results.items():
+        click.echo(route)
+        for scale, result in by_scale.items():
+            click.echo(f"  x{scale:<6g} {result['status']}  median {result['median']:8.2f} ms  "
+                       f"p95 {result['p95']:8.2f} ms  memory {result['memory']:9.1f} KB  "
+                       f"queries {result['queries']:g}")
+        first, last = by_scale[scales[0]], by_scale[scales[-1]]
+        if len(scales) > 1 and first['median']:
+            click.echo(f"  x{scales[-1] / scales[0]:g} content: {last['median'] / first['median']:.1f}x latency, "
+                       f"{last['memory'] / (first['memory'] or 1):.1f}x memory")
+
+
+def echo_progress(collection, documents, size, seconds, final):
+    """Prints the progress of a backup or restore
+
+    Args:
+        collection (string): collection name
+        documents (int): processed documents
+        size (int): processed bytes (uncompressed)
+        seconds (float): elapsed time
+        final (bool): last report of the collection
+    """
+
+    rate = documents / seconds if seconds else 0
+    click.echo(f"{collection}: {documents} documents, {size / 1024 / 1024:.1f} MB, {rate:.0f} docs/s"
+               f"{' - done' if final else ''}")
+
+
+# Content collections saved by a backup (rate limit buckets, diagnostics and derived data are not content)
+BACKUP_COLLECTIONS = ['blogs', 'testimonials', 'links', 'settings', 'experience', 'education', 'projects', 'skills']
+# Settings fields kept by the app itself: the versions of the live caches and the order counters
+SETTINGS_STATE = ('versions', 'order_counters')
+
+
+@app.cli.command('backup')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='ndjson', show_default=True)
+@click.option('--batch-size', default=1000, show_default=True, help='Documents per cursor batch.')
+@click.option('--collection', 'collections', multiple=True, help='Collection to back up (default: all).')
+def backup(directory, fmt, batch_size, collections):
+    """Streams the content collections to gzip compressed files in DIRECTORY"""
+
+    os.makedirs(directory, exist_ok=True)
+    for collection in collections or BACKUP_COLLECTIONS:
+        dump_collection(mongo.db[collection], backup_path(directory, collection, fmt), batch_size, echo_progress,
+                        ignored=SETTINGS_STATE if collection == 'settings' else ())
+
+
+@app.cli.command('restore')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help='Documents per insert.')
+@click.option('--collection', 'collections', multiple=True, help='Collection to restore (default: all).')
+@click.option('--drop', is_flag=True, help='Empty each restored collection first.')
+def restore(directory, batch_size, collections, drop):
+    """Inserts the backup files of DIRECTORY (ndjson or bson), skipping documents that already exist
+    (the settings document is updated)"""
+
+    for collection in collections or BACKUP_COLLECTIONS:
+        paths = [backup_path(directory, collection, fmt) for fmt in FORMATS]
+        path = next((path for path in paths if os.path.exists(path)), None)
+        if not path:
+            click.echo(f"{collection}: no backup file, skipped", err=True)
+            continue
+        if drop:
+            mongo.db[collection].delete_many({})
+        # The settings document created on startup is replaced by the backed up one
+        is_settings = collection == 'settings'
+        inserted, skipped = restore_collection(mongo.db[collection], path, batch_size, echo_progress,
+                                               overwrite=is_settings, ignored=SETTINGS_STATE if is_settings else ())
+        if skipped:
+            click.echo(f"{collection}: {skipped} documents already existed")
+        if collection == 'projects':
+            count_tech_tags()
+    seed_order_counters()
+
+
+@app.cli.command('export')
+@click.option('--force', is_flag=True, help='Render every page, not only the changed ones.')
+def export(force):
+    """Exports the public pages as static files into STATIC_EXPORT_DIR"""
+
+    if not app.config.get('STATIC_EXPORT_DIR'):
+        raise click.UsageError('STATIC_EXPORT_DIR is not set')
+
+    report = run_static_export(force)
+
+    for path in report['written']:
+        click.echo(f"Written: {path}")
+    for path in report['removed']:
+        click.echo(f"Removed: {path}")
+    for path in report['failed']:
+        click.echo(f"Failed: {path}", err=True)
+    click.echo(f"{len(report['written'])} written, {report['skipped']} unchanged, "
+               f"{len(report['removed'])} removed")
+
+
+@app.cli.command('s3-gc')
+@click.option('--grace-hours', default=24, show_default=True, help='Minimum age of deleted objects.')
+@click.option('--dry-run/--delete', default=True, show_default=True, help='Only report orphaned objects.')
+def s3_gc(grace_hours, dry_run):
+    """Deletes S3 photos of the tenant that are not referenced by its settings, blogs or projects"""
+
+    tenant = tenants.current()
+    # A prefix without a trailing slash would also match the photos of other tenants
+    if not valid_s3_prefix(tenant.name, tenant.s3_prefix):
+        raise click.ClickException(f"Invalid S3 prefix of {tenant.name}: '{tenant.s3_prefix}'")
+
+    report = collect_garbage(s3, mongo.db, os.environ.get('S3_BUCKET_NAME'), prefix=tenant.s3_prefix,
+                             grace=timedelta(hours=grace_hours), dry_run=dry_run)
+
+    for key in report['keys']:
+        click.echo(f"Orphaned: {key}")
+    for error in report['errors']:
+        click.echo(f"Error: {error}", err=True)
+    click.echo(f"Referenced: {report['referenced']}, orphaned: {report['orphaned']} "
+               f"({report['bytes']} bytes), deleted: {report['deleted']}")
+
+
+# Tenant names are part of their database name
+TENANT_NAME = re.compile(r'^[a-z0-9][a-z0-9-]{0,31}$')
+
+
+def tenants_required():
+    """Stops a tenants cli command if the deployment serves a single site"""
+
+    if not tenants.enabled:
+        raise click.UsageError('TENANTS_DBNAME is not set')
+
+
+@app.cli.command('tenant-add')
+@click.argument('name')
+@click.argument('hosts', nargs=-1, required=True)
+@click.option('--s3-prefix', 'prefix', help='Key prefix of the uploaded photos, unique and ending with a slash (default: NAME/).')
+@click.option('--admin-username', help='Admin login of the site (the default site may use ADMIN_USERNAME).')
+@click.option('--admin-password', help='Admin password of the site (asked if not given).')
+def tenant_add(name, hosts, prefix, admin_username, admin_password):
+    """Serves the site NAME (its own database) for HOSTS, or updates it"""
+
+    tenants_required()
+    if not TENANT_NAME.match(name):
+        raise click.BadParameter('lower case letters, digits and dashes only', param_hint='NAME')
+
+    # Kept explicitly, so the prefixes can be compared without the naming rule
+    current = tenants_collection.find_one({'_id': name}) or {}
+    prefix = s3_prefix(name, current) if prefix is None else prefix
+    if not valid_s3_prefix(name, prefix):
+        raise click.BadParameter('folders ending with a slash, e.g. NAME/', param_hint='--s3-prefix')
+    for doc in tenants_collection.find({'_id': {'$ne': name}}):
+        if s3_prefix(doc['_id'], doc) == prefix:
+            raise click.BadParameter(f"already used by {doc['_id']}", param_hint='--s3-prefix')
+
+    update = {'hosts': [normalize_host(host) for host in hosts], 's3_prefix': prefix}
+    if admin_username:
+        if not admin_password:
+            admin_password = click.prompt('Admin password', hide_input=True, confirmation_prompt=True)
+        update['admin_username'] = admin_username
+        update['admin_password'] = generate_password_hash(admin_password)
+
+    try:
+        tenants_collection.update_one({'_id': name}, {'$set': update}, upsert=True)
+    except DuplicateKeyError:
+        raise click.ClickException('A host is already served by another tenant')
+    click.echo(f"{name}: {', '.join(update['hosts'])} (database {tenant_database(name)})")
+    if name != DEFAULT_TENANT and not (admin_username or current.get('admin_username')):
+        click.echo(f"{name} has no admin yet, set one with --admin-username", err=True)
+
+
+def tenant_admin(doc):
+    """Admin login of a tenant document, for the listings
+
+    Args:
+        doc (dict): tenant document
+
+    Returns:
+        string: admin username, ADMIN_USERNAME for the default tenant without one, none for the others
+    """
+
+    return doc.get('admin_username') or ('ADMIN_USERNAME' if doc['_id'] == DEFAULT_TENANT else 'none')
+
+
+@app.cli.command('tenant-list')
+def tenant_list():
+    """Lists the sites served by the deployment"""
+
+    tenants_required()
+    for doc in tenants_collection.find().sort('_id', pymongo.ASCENDING):
+        click.echo(f"{doc['_id']}: {', '.join(doc.get('hosts') or [])} (database {tenant_database(doc['_id'])}, "
+                   f"S3 prefix '{s3_prefix(doc['_id'], doc)}', admin {tenant_admin(doc)})")
+
+
+@app.cli.command('tenant-remove')
+@click.argument('name')
+@click.option('--drop', is_flag=True, help='Also drop the database of the site.')
+def tenant_remove(name, drop):
+    """Stops serving the site NAME (workers forget its hosts within a minute)"""
+
+    tenants_required()
+    if not tenants_collection.delete_one({'_id': name}).deleted_count:
+        raise click.ClickException(f"Unknown tenant: {name}")
+    click.echo(f"{name} removed")
+
+    if drop and name != DEFAULT_TENANT:
+        click.confirm(f"Drop the database {tenant_database(name)}?", abort=True)
+        mongo.cx.drop_database(tenant_database(name))
+        click.echo(f"{tenant_database(name)} dropped")
+
+
 @app.route('/admin/delete_s3')
 @login_required()
 def delete_s3():
     """Route to be called (API call) for deleting photo from S3"""
 
-    file_name = request.args.get('file_name')
+    file_name = request.args.get('file_name') or ''
+
+    # Keys of other tenants cannot be reached through the prefix of the current one
+    if not re.match(r'^[\w\-.]+$', file_name):
+        return make_response(jsonify({'message': 'Invalid file name'}), 400)
 
     return s3_delete_call(file_name)
 
 
+def parse_bool(value):
+    """Converts a query string value to boolean
+
+    Args:
+        value (string): query string value
+
+    Returns:
+        bool: True for '1', 'true', 'yes' or 'on' (case insensitive)
+    """
+
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# Admin list API settings per collection:
+# fields - default (and allowed) projection, sort - fields allowed for keyset sorting, filters - field: value parser,
+# keys - sort fields ordered by several fields (then _id)
+ADMIN_LIST_API = {
+    'blogs': {
+        'fields': ['title', 'slug', 'added_on', 'photos', 'excerpt'],
+        'sort': ['_id', 'title', 'slug'],
+        'filters': {}
+    },
+    'projects': {
+        'fields': ['title', 'slug', 'year', 'tech', 'brief', 'repo', 'live_url', 'photos', 'featured'],
+        'sort': ['_id', 'title', 'year', 'featured'],
+        'filters': {'featured': parse_bool},
+        # Featured projects first, newest first within them (order of the public portfolio)
+        'keys': {'featured': ['featured', 'year']}
+    },
+    'testimonials': {
+        'fields': ['author', 'role', 'text', 'approved'],
+        'sort': ['_id', 'author'],
+        'filters': {'approved': parse_bool}
+    },
+    'links': {
+        'fields': ['name', 'icon', 'url'],
+        'sort': ['_id', 'name'],
+        'filters': {}
+    },
+    'settings': {
+        'fields': ['name', 'title', 'email', 'status', 'availability'],
+        'sort': ['_id'],
+        'filters': {}
+    },
+    'experience': {
+        'fields': ['company', 'period', 'role', 'order'],
+        'sort': ['_id', 'order'],
+        'filters': {}
+    },
+    'education': {
+        'fields': ['school', 'period', 'title', 'department', 'order'],
+        'sort': ['_id', 'order'],
+        'filters': {}
+    },
+    'skills': {
+        'fields': ['name', 'percentage'],
+        'sort': ['_id', 'name', 'percentage'],
+        'filters': {}
+    }
+}
+
+
+def encode_cursor(values):
+    """Encodes the keyset pagination cursor
+
+    Args:
+        values (list): sort field values of the last returned document, its _id last
+
+    Returns:
+        string: url safe cursor
+    """
+
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decodes a cursor made by encode_cursor
+
+    Args:
+        cursor (string): url safe cursor
+
+    Returns:
+        list: sort field values of the last returned document, its _id last
+    """
+
+    return json_util.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+
+@app.route('/admin/api/<collection>')
+@login_required()
+def admin_list(collection):
+    """Route to be called (API call) for listing a collection page by page (keyset pagination)
+
+    Query string: fields (comma separated), sort, order (asc/desc), limit, after (cursor) and collection filters
+    """
+
+    api = ADMIN_LIST_API.get(collection)
+    if collection not in app.config.get('DB_COLLECTIONS') or not api:
+        return make_response(jsonify({'message': 'Unknown collection'}), 404)
+
+    fields = [field for field in request.args.get('fields', ','.join(api['fields'])).split(',')
+              if field in api['fields']]
+    sort_field = request.args.get('sort', '_id')
+    if sort_field not in api['sort']:
+        return make_response(jsonify({'message': 'Invalid sort field'}), 400)
+    sort_fields = [field for field in api.get('keys', {}).get(sort_field, [sort_field]) if field != '_id'] + ['_id']
+    direction = pymongo.DESCENDING if request.args.get(
+        'order') == 'desc' else pymongo.ASCENDING
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+
+    query = {field: parser(request.args[field])
+             for field, parser in api['filters'].items() if field in request.args}
+
+    after = request.args.get('after')
+    if after:
+        try:
+            values = decode_cursor(after)
+        except Exception:
+            return make_response(jsonify({'message': 'Invalid cursor'}), 400)
+        if not isinstance(values, list) or len(values) != len(sort_fields):
+            return make_response(jsonify({'message': 'Invalid cursor'}), 400)
+        operator = '$lt' if direction == pymongo.DESCENDING else '$gt'
+        # After the last document: same values up to one field, which is past its value
+        query['$or'] = [dict(zip(sort_fields[:i], values[:i]), **{field: {operator: values[i]}})
+                        for i, field in enumerate(sort_fields)]
+
+    projection = {field: 1 for field in fields}
+    if 'photos' in projection and collection == 'blogs':
+        projection['photos'] = {'$slice': 1}
+    projection.update({field: 1 for field in sort_fields})
+
+    # One extra document tells if there is a next page
+    docs = list(mongo.db[collection].find(query, projection).sort(
+        [(field, direction) for field in sort_fields]).limit(limit + 1))
+    has_next = len(docs) > limit
+    docs = docs[:limit]
+
+    next_cursor = encode_cursor([docs[-1].get(field) for field in sort_fields]) if has_next else None
+
+    if 'excerpt' in fields:
+        add_excerpts(docs)
+    for doc in docs:
+        doc['_id'] = str(doc['_id'])
+
+    return jsonify({'items': docs, 'next': next_cursor})
+
+
 @app.route('/admin/')
 @app.route('/admin')
 @login_required()
@@ -523,7 +2315,14 @@ def admin():
     unapproved_testimonials = mongo.db.testimonials.count_documents({
                                                                     'approved': False})
 
-    return render_template('admin/dashboard.html', blogs=blogs, projects=projects, skills=skills, education=education, experience=experience, testimonials=testimonials, unapproved_testimonials=unapproved_testimonials)
+    fragments = app.jinja_env.fragment_cache.report()
+    # Cache partitions of the tenant and caches of this worker (all tenants)
+    cache_memory = {'content': content_cache.size, 'content_total': content_memory.size,
+                    'content_budget': content_memory.budget,
+                    'fragments': app.jinja_env.fragment_cache.size, 'fragments_total': fragment_memory.size,
+                    'fragments_budget': fragment_memory.budget}
+
+    return render_template('admin/dashboard.html', blogs=blogs, projects=projects, skills=skills, education=education, experience=experience, testimonials=testimonials, unapproved_testimonials=unapproved_testimonials, fragments=fragments, cache_memory=cache_memory)
 
 
 @app.route('/admin/testimonials', methods=['GET', 'POST'])
@@ -534,14 +2333,15 @@ def get_testimonials():
     form = UpdateForm()
     if request.method == 'POST':
         if form.validate_on_submit():
-            testimonials = list(mongo.db.testimonials.find())
-
-            for testimonial in testimonials:
-                if request.form.get(f"approved[{testimonial['_id']}]"):
+            # Only the rows loaded on the page are submitted
+            for testimonial_id in request.form.getlist('testimonials'):
+                if not ObjectId.is_valid(testimonial_id):
+                    continue
+                if request.form.get(f"approved[{testimonial_id}]"):
                     is_approved = True
                 else:
                     is_approved = False
-                mongo.db.testimonials.update({'_id': ObjectId(testimonial['_id'])}, {
+                mongo.db.testimonials.update({'_id': ObjectId(testimonial_id)}, {
                     '$set': {'approved': is_approved}})
             flash('Testimonials were successfully updated!', 'success')
 
@@ -550,10 +2350,10 @@ def get_testimonials():
         else:
             flash('Error submitting the changes!', 'danger')
 
-    approved = list(mongo.db.testimonials.find({'approved': True}))
-    unapproved = list(mongo.db.testimonials.find({'approved': False}))
+    # Rows are loaded incrementally from the admin list API
+    total = mongo.db.testimonials.estimated_document_count()
 
-    return render_template('admin/testimonials.html', approved=approved, unapproved=unapproved, form=form)
+    return render_template('admin/testimonials.html', total=total, form=form)
 
 
 @app.route('/admin/delete_testimonial/<id>')
@@ -572,14 +2372,10 @@ def delete_testimonial(id):
 def get_blogs():
     """ADMIN Blogs page route"""
 
-    blogs = list(mongo.db.blogs.find())
-
-    for i, blog in enumerate(blogs):
-        blog['body'] = truncate_html(
-            blog['body'], 200, end=' [...] ', break_words=True)
-        blogs[i] = blog
+    # Rows are loaded incrementally from the admin list API
+    total = mongo.db.blogs.estimated_document_count()
 
-    return render_template('admin/blogs.html', blogs=blogs)
+    return render_template('admin/blogs.html', total=total)
 
 
 @app.route('/admin/add_blog', methods=['GET', 'POST'])
@@ -601,7 +2397,10 @@ def add_blog():
                 'body': form.body.data,
                 'added_on': date.today().strftime('%B %d, %Y')
             }
+            blog.update(render_fields(blog['body'], 'body'))
+            blog['updated_on'] = datetime.utcnow()
             mongo.db.blogs.insert_one(blog)
+            queue_photo_descriptions(photos)
             flash(Markup(
                 f"Blog <strong>{blog['title']}</strong> was successfully Added!"), 'success')
 
@@ -635,6 +2434,8 @@ def edit_blog(id):
                 'slug': form.slug.data,
                 'body': form.body.data
             }
+            updated.update(render_fields(updated['body'], 'body'))
+            updated['updated_on'] = datetime.utcnow()
             flash(Markup(
                 f"Blog <strong>{updated['title']}</strong> was successfully edited!"), 'success')
 
@@ -743,6 +2544,126 @@ def add_skill():
     return render_template('admin/add_skill.html', form=form)
 
 
+def allocate_order(collection):
+    """Atomically allocates the next order (rank) of a collection, one gap after the last one
+
+    Args:
+        collection (string): ordered collection name
+
+    Returns:
+        int: allocated order
+    """
+
+    counters = mongo.db.settings.find_one_and_update(
+        {'_id': "1"},
+        {'$inc': {f"order_counters.{collection}": app.config.get('ORDER_GAP')}},
+        projection={'order_counters': 1},
+        return_document=pymongo.ReturnDocument.AFTER)
+
+    return counters['order_counters'][collection]
+
+
+def reserve_order(collection, order):
+    """Keeps the order counter of a collection above an order set by hand
+
+    Args:
+        collection (string): ordered collection name
+        order (int): order in use
+    """
+
+    mongo.db.settings.update_one(
+        {'_id': "1"}, {'$max': {f"order_counters.{collection}": order}})
+
+
+def rebalance_order(collection):
+    """Spreads the orders of a collection evenly, one gap apart (only needed when two neighbours have no gap left)
+
+    Args:
+        collection (string): ordered collection name
+
+    Returns:
+        dict: new order of each document id
+    """
+
+    gap = app.config.get('ORDER_GAP')
+    docs = mongo.db[collection].find({}, {'order': 1}).sort(
+        [('order', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)])
+    orders = {str(doc['_id']): (i + 1) * gap for i, doc in enumerate(docs)}
+
+    if orders:
+        mongo.db[collection].bulk_write([
+            pymongo.UpdateOne({'_id': ObjectId(id)}, {'$set': {'order': order}})
+            for id, order in orders.items()])
+        reserve_order(collection, max(orders.values()))
+
+    return orders
+
+
+def order_between(previous, next):
+    """Computes an order between two neighbours
+
+    Args:
+        previous (int): order of the previous neighbour or None if first
+        next (int): order of the next neighbour or None if last
+
+    Returns:
+        int: new order or None if there is no gap left between the neighbours
+    """
+
+    gap = app.config.get('ORDER_GAP')
+    if previous is None:
+        return next - gap
+    if next is None:
+        return previous + gap
+    if next - previous > 1:
+        return (previous + next) // 2
+
+    return None
+
+
+@app.route('/admin/reorder/<collection>', methods=["PUT"])
+@login_required()
+def reorder(collection):
+    """Route to be called (API call with PUT method) for moving one document between two neighbours
+
+    JSON body: id (moved document), previous and next (ids of the new neighbours, empty if first/last).
+    Only the moved document is updated, unless its neighbours have no gap left and the collection is rebalanced.
+    """
+
+    data = request.get_json(silent=True) or {}
+    ids = [data.get('id'), data.get('previous'), data.get('next')]
+
+    if collection not in ORDERED_COLLECTIONS:
+        return make_response(jsonify({'message': 'Invalid collection'}), 400)
+    if not ObjectId.is_valid(ids[0]) or not (ids[1] or ids[2]) or \
+            not all(ObjectId.is_valid(id) for id in ids[1:] if id):
+        return make_response(jsonify({'message': 'Invalid document id'}), 400)
+
+    def neighbours():
+        docs = mongo.db[collection].find(
+            {'_id': {'$in': [ObjectId(id) for id in ids[1:] if id]}}, {'order': 1})
+        orders = {str(doc['_id']): doc['order'] for doc in docs}
+        return orders.get(ids[1]), orders.get(ids[2])
+
+    previous, next = neighbours()
+    if previous is None and next is None:
+        return make_response(jsonify({'message': 'Neighbours not found, please reload the page'}), 409)
+
+    rebalanced = {}
+    order = order_between(previous, next)
+    if order is None:
+        rebalanced = rebalance_order(collection)
+        order = order_between(*neighbours())
+
+    mongo.db[collection].update_one(
+        {'_id': ObjectId(ids[0])}, {'$set': {'order': order}})
+    if next is None:
+        reserve_order(collection, order)
+    rebalanced.pop(ids[0], None)
+
+    return make_response(jsonify({'message': 'Order was successfully updated', 'order': order, 'orders': rebalanced}), 200)
+
+
 @ app.route('/admin/education', methods=['GET', 'POST'])
 @ login_required("You don't have the user privileges to access this section.")
 def get_education():
@@ -755,9 +2676,12 @@ def get_education():
         if form.validate_on_submit():
             for school in education:
                 order = request.form.get(f"order[{school['_id']}]")
-                if order and (isinstance(order, int) or order.isdigit()):
-                    mongo.db.education.update({'_id': ObjectId(school['_id'])}, {
-                        '$set': {'order': int(order)}})
+                if order and re.match(r'^-?\d+$', order):
+                    # Only the documents whose order was changed are updated
+                    if int(order) != school.get('order'):
+                        mongo.db.education.update_one({'_id': ObjectId(school['_id'])}, {
+                            '$set': {'order': int(order)}})
+                        reserve_order('education', int(order))
                 else:
                     flash(Markup(
                         f"School <strong>{school['school']}</strong>: Invalid Order!"), 'danger')
@@ -785,9 +2709,13 @@ def add_education():
                 'period': form.period.data,
                 'title': form.title.data,
                 'department': form.department.data,
-                'description': form.description.data,
-                'order': int(form.order.data)
+                'description': form.description.data
             }
+            if form.order.data is None:
+                school['order'] = allocate_order('education')
+            else:
+                school['order'] = int(form.order.data)
+                reserve_order('education', school['order'])
             mongo.db.education.insert_one(school)
             flash(Markup(
                 f"School <strong>{school['school']}</strong> was successfully Added!"), 'success')
@@ -798,9 +2726,6 @@ def add_education():
                 for err in errorMessages:
                     flash(err, 'danger')
 
-    if mongo.db.education.find_one(sort=[('order', pymongo.DESCENDING)]):
-        form.order.data = str(
-            mongo.db.education.find_one(sort=[('order', pymongo.DESCENDING)])['order'] + 1)
     form.submit.label.text = 'Add'
 
     return render_template('admin/add_education.html', form=form)
@@ -824,9 +2749,12 @@ def edit_education(id):
                 'period': form.period.data,
                 'title': form.title.data,
                 'department': form.department.data,
-                'description': form.description.data,
-                'order': int(form.order.data)
+                'description': form.description.data
             }
+            # Empty order keeps the current one
+            if form.order.data is not None:
+                updated['order'] = int(form.order.data)
+                reserve_order('education', updated['order'])
             mongo.db.education.update({'_id': ObjectId(id)}, {
                 '$set': updated})
             flash(Markup(
@@ -868,9 +2796,12 @@ def get_experience():
         if form.validate_on_submit():
             for job in experience:
                 order = request.form.get(f"order[{job['_id']}]")
-                if order and (isinstance(order, int) or order.isdigit()):
-                    mongo.db.experience.update({'_id': ObjectId(job['_id'])}, {
-                        '$set': {'order': int(order)}})
+                if order and re.match(r'^-?\d+$', order):
+                    # Only the documents whose order was changed are updated
+                    if int(order) != job.get('order'):
+                        mongo.db.experience.update_one({'_id': ObjectId(job['_id'])}, {
+                            '$set': {'order': int(order)}})
+                        reserve_order('experience', int(order))
                 else:
                     flash(Markup(
                         f"Job at <strong>{job['company']}</strong>: Invalid Order"), 'danger')
@@ -898,9 +2829,13 @@ def add_experience():
                 'company': form.company.data,
                 'period': form.period.data,
                 'role': form.role.data,
-                'description': form.description.data,
-                'order': int(form.order.data)
+                'description': form.description.data
             }
+            if form.order.data is None:
+                job['order'] = allocate_order('experience')
+            else:
+                job['order'] = int(form.order.data)
+                reserve_order('experience', job['order'])
             mongo.db.experience.insert_one(job)
             flash(Markup(
                 f"Job at <strong>{job['company']}</strong> was successfully Added!"), 'success')
@@ -911,9 +2846,6 @@ def add_experience():
                 for err in errorMessages:
                     flash(err, 'danger')
 
-    if mongo.db.experience.find_one(sort=[('order', pymongo.DESCENDING)]):
-        form.order.data = str(
-            mongo.db.experience.find_one(sort=[('order', pymongo.DESCENDING)])['order'] + 1)
     form.submit.label.text = 'Add'
 
     return render_template('admin/add_experience.html', form=form)
@@ -936,9 +2868,12 @@ def edit_experience(id):
                 'company': form.company.data,
                 'period': form.period.data,
                 'role': form.role.data,
-                'description': form.description.data,
-                'order': int(form.order.data)
+                'description': form.description.data
             }
+            # Empty order keeps the current one
+            if form.order.data is not None:
+                updated['order'] = int(form.order.data)
+                reserve_order('experience', updated['order'])
             mongo.db.experience.update({'_id': ObjectId(id)}, {
                 '$set': updated})
             flash(Markup(
@@ -973,30 +2908,10 @@ def delete_experience(id):
 def get_projects():
     """ADMIN Projects page route"""
 
-    projects = list(mongo.db.projects.aggregate(
-        [
-            {"$project": {
-                "title": 1,
-                "slug": 1,
-                "year": 1,
-                "tech": 1,
-                "brief": 1,
-                "repo": 1,
-                "live_url": 1,
-                "photos": 1,
-                "featured": 1,
-                "tech_length": {"$strLenCP": "$tech"}
-            }},
-            {"$sort": {
-                "featured": -1,
-                "year": -1,
-                "tech_length": -1
-            }},
-            {"$project": {"tech_length": 0}}
-        ]
-    ))
-
-    return render_template('admin/projects.html', projects=projects)
+    # Rows are loaded incrementally from the admin list API
+    total = mongo.db.projects.estimated_document_count()
+
+    return render_template('admin/projects.html', total=total)
 
 
 @ app.route('/admin/add_project', methods=['GET', 'POST'])
@@ -1023,7 +2938,13 @@ def add_project():
                 'photos': photos,
                 'featured': form.featured.data
             }
+            project.update(render_fields(
+                project['description'], 'description'))
+            project['tech_tags'] = tech_tags(project['tech'])
+            project['updated_on'] = datetime.utcnow()
             mongo.db.projects.insert_one(project)
+            update_tech_counts([], project['tech_tags'])
+            queue_photo_descriptions(photos)
             flash(Markup(
                 f"Project <strong>{project['title']}</strong> was successfully Added!"), 'success')
 
@@ -1062,8 +2983,14 @@ def edit_project(id):
                 'live_url': form.live_url.data,
                 'featured': form.featured.data
             }
-            mongo.db.projects.update({'_id': ObjectId(id)}, {
-                '$set': updated})
+            updated.update(render_fields(
+                updated['description'], 'description'))
+            updated['tech_tags'] = tech_tags(updated['tech'])
+            updated['updated_on'] = datetime.utcnow()
+            previous = mongo.db.projects.find_one_and_update(
+                {'_id': ObjectId(id)}, {'$set': updated}, projection={'tech_tags': 1})
+            if previous:
+                update_tech_counts(previous.get('tech_tags'), updated['tech_tags'])
             flash(Markup(
                 f"Project <strong>{updated['title']}</strong> was successfully edited!"), 'success')
 
@@ -1098,7 +3025,9 @@ def delete_project(id):
         else:
             flash(f"Photo {file_name} was successfully deleted from server!")
 
-    mongo.db.projects.remove({'_id': ObjectId(id)})
+    removed = mongo.db.projects.find_one_and_delete({'_id': ObjectId(id)}, projection={'tech_tags': 1})
+    if removed:
+        update_tech_counts(removed.get('tech_tags'), [])
     flash('Project was successfully deleted', 'warning')
 
     return redirect(url_for('get_projects'))
@@ -1222,9 +3151,6 @@ def get_settings():
                 '$set': updated})
             flash('Settings were successfully updated!', 'success')
 
-            global settings
-            settings = mongo.db.settings.find_one({'_id': "1"})
-
             # Redirect to avoid re-submission
             return redirect(url_for('get_settings'))
         else:
@@ -1232,6 +3158,7 @@ def get_settings():
                 for err in errorMessages:
                     flash(err, 'danger')
 
+    settings = get_site_settings()
     form.bio.data = settings.get('bio')
     form.cover.data = settings.get('cover')
     form.availability.data = settings.get('availability')
@@ -1240,6 +3167,134 @@ def get_settings():
     return render_template('admin/settings.html', form=form)
 
 
+@ app.route('/admin/profiler', methods=['GET', 'POST'])
+@ login_required("You don't have the user privileges to access this section.")
+@ default_tenant_required
+def get_profiler():
+    """ADMIN Sampling Profiler page route: switch and stored profiles"""
+
+    form = ProfilerForm()
+    form.endpoints.choices = [(endpoint, endpoint) for endpoint in sorted(app.view_functions)
+                              if endpoint != 'static']
+
+    if request.method == 'POST':
+        if form.enabled.data and cooperative():
+            flash('The profiler samples one thread per request, it is not available under serve_async.py (gevent).',
+                  'danger')
+        elif form.validate_on_submit():
+            profiler.configure(form.enabled.data, form.endpoints.data, form.percentage.data, form.minutes.data)
+            flash(f"Profiler switched {'on' if form.enabled.data else 'off'}!", 'success')
+
+            # Redirect to avoid re-submission
+            return redirect(url_for('get_profiler'))
+        else:
+            for fieldName, errorMessages in form.errors.items():
+                for err in errorMessages:
+                    flash(err, 'danger')
+
+    switch = profiler.settings()
+    active = bool(switch.get('enabled')) and time.time() < switch.get('until', 0)
+    if request.method == 'GET' and switch:
+        form.enabled.data = active
+        form.endpoints.data = switch.get('endpoints')
+        form.percentage.data = switch.get('percentage')
+    until = datetime.fromtimestamp(switch['until']) if active else None
+
+    return render_template('admin/profiler.html', form=form, profiles=profiler.profiles(), active=active,
+                           until=until, available=not cooperative(), show_hosts=tenants.enabled)
+
+
+@ app.route('/admin/profiler/<name>')
+@ login_required("You don't have the user privileges to access this section.")
+@ default_tenant_required
+def get_profile(name):
+    """ADMIN Profile page route: flame graph and hottest frames of a profiled request"""
+
+    profile = profiler.load(name)
+    if not profile:
+        flash('Profile not found!', 'danger')
+        return redirect(url_for('get_profiler'))
+
+    return render_template('admin/profile.html', profile=profile, rows=flame_graph(profile),
+                           frames=hottest_frames(profile), show_hosts=tenants.enabled)
+
+
+@ app.route('/admin/profiler/<name>/collapsed')
+@ login_required()
+@ default_tenant_required
+def get_collapsed_profile(name):
+    """Downloads a profile as collapsed stacks (flamegraph.pl, speedscope...)"""
+
+    profile = profiler.load(name)
+    if not profile:
+        return make_response(jsonify({'message': 'Profile not found'}), 404)
+
+    response = make_response(collapsed_text(profile))
+    response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    response.headers['Content-Disposition'] = f"attachment; filename=profile-{name}.txt"
+
+    return response
+
+
+@ app.route('/admin/delete_profiles')
+@ login_required("You don't have the user privileges to access this section.")
+@ default_tenant_required
+def delete_profiles():
+    """ADMIN Delete stored profiles route"""
+
+    profiler.clear()
+    flash('Profiles were successfully deleted!', 'success')
+
+    return redirect(url_for('get_profiler'))
+
+
+@ app.route('/admin/slow_queries')
+@ login_required("You don't have the user privileges to access this section.")
+def get_slow_queries():
+    """ADMIN Slow Queries page route: slow database commands grouped by query shape"""
+
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'max_ms', 'count', 'last_seen'):
+        sort = 'total_ms'
+    queries = list(mongo.db.slow_queries.find().sort(sort, pymongo.DESCENDING).limit(200))
+
+    return render_template('admin/slow_queries.html', queries=queries, sort=sort,
+                           threshold=app.config.get('SLOW_QUERY_MS'))
+
+
+@ app.route('/admin/delete_slow_queries')
+@ login_required("You don't have the user privileges to access this section.")
+def delete_slow_queries():
+    """ADMIN Delete slow query log route"""
+
+    mongo.db.slow_queries.delete_many({})
+    flash('Slow query log was successfully cleared!', 'success')
+
+    return redirect(url_for('get_slow_queries'))
+
+
+def check_admin(username, password):
+    """Checks the admin credentials of the current tenant
+
+    Args:
+        username (string): submitted username
+        password (string): submitted password
+
+    Returns:
+        bool: True if they match
+    """
+
+    tenant = tenants.current()
+    if tenant.admin_username:
+        return username.lower() == tenant.admin_username.lower() and \
+            check_password_hash(tenant.admin_password or '', password)
+    # The admin of the environment only manages the main site, the other sites need their own admin
+    if not tenant.is_default:
+        return False
+
+    return username.lower() == os.environ.get('ADMIN_USERNAME').lower() and password == os.environ.get('ADMIN_PASSWORD')
+
+
 @ app.route('/admin/login', defaults={'path': None}, methods=['GET', 'POST'])
 @ app.route('/<path:path>/login', methods=['GET', 'POST'])
 def login(path):
@@ -1249,8 +3304,9 @@ def login(path):
 
     if request.method == 'POST':
         if form.validate_on_submit():
-            if form.username.data.lower() == os.environ.get('ADMIN_USERNAME').lower() and form.password.data == os.environ.get('ADMIN_PASSWORD'):
+            if check_admin(form.username.data, form.password.data):
                 session['user'] = form.username.data.lower()
+                session['tenant'] = tenants.current().name
                 flash(f"Welcome, {form.username.data}")
 
                 if path:
@@ -1282,6 +3338,32 @@ def logout():
     return redirect(url_for('home'))
 
 
+def warm_up():
+    """Compiles every template (loading them from the bytecode cache when another worker already did)
+    and primes the content caches, so the first visitors of a new worker are not slowed down"""
+
+    start = time.perf_counter()
+    compiled = 0
+    for name in app.jinja_env.list_templates(extensions=['html', 'xml']):
+        try:
+            app.jinja_env.get_template(name)
+            compiled += 1
+        except TemplateError as e:
+            app.logger.warning(f"Warm-up: {name} could not be compiled: {e}")
+    templates_time = time.perf_counter() - start
+
+    get_site_settings()
+    get_site_links()
+    total_time = time.perf_counter() - start
+
+    app.logger.info(f"Warm-up: {compiled} templates in {templates_time * 1000:.0f} ms, "
+                    f"content caches in {(total_time - templates_time) * 1000:.0f} ms")
+
+
+if app.config.get('WARM_UP'):
+    warm_up()
+
+
 if __name__ == '__main__':
     app.run(host=os.environ.get('IP'),
             port=int(os.environ.get('PORT')),
@@ -0,0 +1,177 @@
+from bson import json_util, decode, encode
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import gzip
+import os
+import struct
+import time
+
+FORMATS = {'ndjson': '.ndjson.gz', 'bson': '.bson.gz'}
+# Canonical extended json keeps the bson types (ObjectId, dates, int64...) through a restore
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+
+class Progress:
+    """Counts the processed documents and bytes and reports them at most once a second"""
+
+    def __init__(self, collection, report):
+        """
+        Args:
+            collection (string): collection name
+            report (function): called with collection, documents, bytes, seconds and a final flag
+        """
+
+        self.collection = collection
+        self.report = report
+        self.documents = 0
+        self.bytes = 0
+        self.start = self.reported = time.perf_counter()
+
+    def add(self, documents, size):
+        """Adds processed documents
+
+        Args:
+            documents (int): documents count
+            size (int): uncompressed bytes
+        """
+
+        self.documents += documents
+        self.bytes += size
+        now = time.perf_counter()
+        if now - self.reported >= 1:
+            self.reported = now
+            self.report(self.collection, self.documents, self.bytes, now - self.start, False)
+
+    def done(self):
+        """Reports the totals
+
+        Returns:
+            int: documents count
+        """
+
+        self.report(self.collection, self.documents, self.bytes, time.perf_counter() - self.start, True)
+        return self.documents
+
+
+def backup_path(directory, collection, fmt):
+    """Path of the backup file of a collection
+
+    Args:
+        directory (string): backup directory
+        collection (string): collection name
+        fmt (string): ndjson or bson
+
+    Returns:
+        string: file path
+    """
+
+    return os.path.join(directory, collection + FORMATS[fmt])
+
+
+def dump_collection(collection, path, batch_size, report, ignored=()):
+    """Streams a collection to a gzip compressed file, one document at a time
+
+    Args:
+        collection (obj): pymongo collection
+        path (string): file path, the format is taken from its extension
+        batch_size (int): documents per cursor batch
+        report (function): progress callback
+        ignored (tuple, optional): fields left out of the backup. Defaults to ().
+
+    Returns:
+        int: documents written
+    """
+
+    progress = Progress(collection.name, report)
+    is_bson = path.endswith(FORMATS['bson'])
+    tmp = path + '.tmp'
+
+    with gzip.open(tmp, 'wb') as file:
+        for doc in collection.find({}, {field: 0 for field in ignored} or None, batch_size=batch_size):
+            data = encode(doc) if is_bson else (json_util.dumps(doc, json_options=JSON_OPTIONS) + '\n').encode()
+            file.write(data)
+            progress.add(1, len(data))
+    # A failed dump never replaces the previous backup
+    os.replace(tmp, path)
+
+    return progress.done()
+
+
+def read_documents(path):
+    """Streams the documents of a backup file
+
+    Args:
+        path (string): file path, the format is taken from its extension
+
+    Yields:
+        tuple: (document, uncompressed size)
+    """
+
+    with gzip.open(path, 'rb') as file:
+        if path.endswith(FORMATS['bson']):
+            # Each bson document starts with its int32 size
+            while True:
+                head = file.read(4)
+                if not head:
+                    break
+                data = head + file.read(struct.unpack('<i', head)[0] - 4)
+                yield decode(data), len(data)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json_util.loads(line, json_options=JSON_OPTIONS), len(line)
+
+
+def restore_collection(collection, path, batch_size, report, overwrite=False, ignored=()):
+    """Inserts the documents of a backup file into a collection with unordered batches.
+    Documents whose _id already exists are skipped, or updated with the backed up fields.
+
+    Args:
+        collection (obj): pymongo collection
+        path (string): file path
+        batch_size (int): documents per insert_many
+        report (function): progress callback
+        overwrite (bool, optional): update the existing documents instead of skipping them. Defaults to False.
+        ignored (tuple, optional): fields left out of the restored documents. Defaults to ().
+
+    Returns:
+        tuple: (documents written, documents skipped)
+    """
+
+    progress = Progress(collection.name, report)
+    skipped = 0
+    batch = []
+    size = 0
+
+    def insert(batch):
+        if overwrite:
+            # Fields of the existing documents missing from the backup are kept
+            collection.bulk_write([UpdateOne({'_id': doc['_id']}, {'$set': {
+                field: value for field, value in doc.items() if field != '_id'}}, upsert=True)
+                for doc in batch if len(doc) > 1], ordered=False)
+            return len(batch)
+        try:
+            return len(collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            # Duplicate keys only, anything else is raised again
+            if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                raise
+            return e.details['nInserted']
+
+    for doc, doc_size in read_documents(path):
+        for field in ignored:
+            doc.pop(field, None)
+        batch.append(doc)
+        size += doc_size
+        if len(batch) == batch_size:
+            inserted = insert(batch)
+            skipped += len(batch) - inserted
+            progress.add(inserted, size)
+            batch, size = [], 0
+
+    if batch:
+        inserted = insert(batch)
+        skipped += len(batch) - inserted
+        progress.add(inserted, size)
+
+    return progress.done(), skipped
@@ -0,0 +1,193 @@
+from collections import deque
+import hashlib
+import json
+import os
+import threading
+import time
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+# Metric value of each state
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+# Response headers kept with the snapshots
+SNAPSHOT_HEADERS = ('Content-Type', 'Content-Disposition')
+
+
+class CircuitBreaker:
+    """Stops waiting for a failing database. After `threshold` failures within `window` seconds the circuit
+    opens and requests are answered without the database; once `reset` seconds are over, a single probe
+    closes it again or keeps it open for another `reset` seconds. Each worker process has its own circuit."""
+
+    def __init__(self, threshold=3, window=30, reset=15):
+        """
+        Args:
+            threshold (int, optional): failures opening the circuit. Defaults to 3.
+            window (int, optional): seconds the failures are counted over. Defaults to 30.
+            reset (int, optional): seconds before the database is probed again. Defaults to 15.
+        """
+
+        self.threshold = threshold
+        self.window = window
+        self.reset = reset
+        self.state = CLOSED
+        self.failures = deque()
+        self.opened_at = 0
+        self.failures_total = 0
+        self.opened_total = 0
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """Whether requests must be answered without the database (a probe may be in progress)"""
+
+        return self.state != CLOSED
+
+    def failure(self):
+        """Records a failed database access"""
+
+        now = time.monotonic()
+        with self.lock:
+            self.failures_total += 1
+            if self.state == HALF_OPEN:
+                self.open(now)
+                return
+            self.failures.append(now)
+            while now - self.failures[0] > self.window:
+                self.failures.popleft()
+            if self.state == CLOSED and len(self.failures) >= self.threshold:
+                self.open(now)
+
+    def open(self, now):
+        """Opens the circuit (the lock is held by the caller)
+
+        Args:
+            now (float): monotonic time
+        """
+
+        self.state = OPEN
+        self.opened_at = now
+        self.failures.clear()
+        self.opened_total += 1
+
+    def probe(self):
+        """Tells the caller to probe the database when the reset time of the open circuit is over.
+        Only one caller is told so, the circuit is half open until it reports the result.
+
+        Returns:
+            bool: probe the database, then call success() or failure()
+        """
+
+        if self.state != OPEN:
+            return False
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset:
+                self.state = HALF_OPEN
+                return True
+
+        return False
+
+    def success(self):
+        """Closes the circuit after a successful probe"""
+
+        with self.lock:
+            self.state = CLOSED
+            self.failures.clear()
+
+    def retry_after(self):
+        """Seconds until the database is probed again
+
+        Returns:
+            float: seconds, 0 if the circuit is closed
+        """
+
+        if self.state == CLOSED:
+            return 0
+
+        return max(self.reset - (time.monotonic() - self.opened_at), 1)
+
+    def metrics(self):
+        """State of the circuit
+
+        Returns:
+            dict: state, state code (0 closed, 1 half open, 2 open), failures and times opened since the start
+        """
+
+        return {'state': self.state, 'code': STATE_CODES[self.state],
+                'failures': self.failures_total, 'opened': self.opened_total}
+
+
+class PageSnapshots:
+    """Last good copy of the public pages on local disk (one directory per tenant), served while the
+    database is unavailable. A page is saved again at most every `interval` seconds by each worker."""
+
+    def __init__(self, directory, interval=60):
+        """
+        Args:
+            directory (string): snapshots directory
+            interval (int, optional): seconds before a page is saved again. Defaults to 60.
+        """
+
+        self.directory = directory
+        self.interval = interval
+        self.saved = {}
+        self.served = 0
+
+    def path(self, tenant, page):
+        """File of a page snapshot
+
+        Args:
+            tenant (string): tenant name
+            page (string): page path
+
+        Returns:
+            string: file path
+        """
+
+        return os.path.join(self.directory, tenant, hashlib.sha1(page.encode()).hexdigest())
+
+    def save(self, tenant, page, response):
+        """Saves the body and content headers of a page response (unless saved recently)
+
+        Args:
+            tenant (string): tenant name
+            page (string): page path
+            response (obj): flask response
+        """
+
+        key = (tenant, page)
+        now = time.monotonic()
+        if now - self.saved.get(key, -self.interval) < self.interval:
+            return
+        self.saved[key] = now
+
+        meta = {'page': page, 'time': time.time(),
+                'headers': {name: response.headers[name] for name in SNAPSHOT_HEADERS if name in response.headers}}
+        path = self.path(tenant, page)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic replace, a worker never reads a half written snapshot
+        with open(path + f".{os.getpid()}.tmp", 'wb') as file:
+            file.write(json.dumps(meta).encode() + b'\n')
+            file.write(response.get_data())
+        os.replace(path + f".{os.getpid()}.tmp", path)
+
+    def load(self, tenant, page):
+        """Reads a page snapshot
+
+        Args:
+            tenant (string): tenant name
+            page (string): page path
+
+        Returns:
+            tuple: (body, headers, saving time), None if the page was never saved
+        """
+
+        try:
+            with open(self.path(tenant, page), 'rb') as file:
+                meta = json.loads(file.readline())
+                body = file.read()
+        except (OSError, ValueError):
+            return None
+
+        self.served += 1
+        return body, meta['headers'], meta['time']
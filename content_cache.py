@@ -0,0 +1,369 @@
+from collections import OrderedDict
+from pymongo import monitoring, ReturnDocument
+from pymongo.errors import OperationFailure, PyMongoError
+import os
+import sys
+import threading
+import time
+
+# Commands that modify a collection (the collection name is the command value)
+WRITE_COMMANDS = {'insert', 'update', 'delete', 'findAndModify'}
+# Field of the settings document holding the collection versions
+VERSIONS_FIELD = 'versions'
+
+
+class WriteTracker(monitoring.CommandListener):
+    """Records the collections written by the current thread (request or cli command).
+    Listeners are called in the thread that runs the command."""
+
+    def __init__(self, ignored=()):
+        self.local = threading.local()
+        self.pending = {}
+        # Collections that are not cached content (e.g. rate limit buckets)
+        self.ignored = set(ignored)
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS and event.command.get(event.command_name) not in self.ignored:
+            self.pending[event.request_id] = event.command.get(event.command_name)
+
+    def succeeded(self, event):
+        collection = self.pending.pop(event.request_id, None)
+        if collection and not getattr(self.local, 'paused', False):
+            if not hasattr(self.local, 'collections'):
+                self.local.collections = set()
+            self.local.collections.add(collection)
+
+    def failed(self, event):
+        self.pending.pop(event.request_id, None)
+
+    def pop(self):
+        """Returns and forgets the collections written by the current thread
+
+        Returns:
+            set: collection names
+        """
+
+        collections = getattr(self.local, 'collections', set())
+        self.local.collections = set()
+        return collections
+
+
+class ContentVersions:
+    """Keeps every worker process in sync with the collection versions stored in the settings document.
+
+    Writes increase the versions of the written collections. The VersionWatcher thread follows the
+    settings document, so the per process caches are dropped as soon as any worker changes their collections.
+    A restore or a reinstall may store lower versions: any difference drops the caches, and the epoch
+    increased by versions going back keeps them from matching the fragments rendered before.
+    """
+
+    def __init__(self, db, tracker, watcher):
+        self.db = db
+        self.tracker = tracker
+        self.watcher = watcher
+        self.versions = {}
+        self.epoch = 0
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def on_change(self, listener):
+        """Registers a function called with the set of changed collections
+
+        Args:
+            listener (function): callback
+        """
+
+        self.listeners.append(listener)
+
+    def get(self, collection):
+        """Current version of a collection
+
+        Args:
+            collection (string): collection name
+
+        Returns:
+            tuple: (epoch, version)
+        """
+
+        return self.epoch, self.versions.get(collection, 0)
+
+    def apply(self, versions):
+        """Stores the versions read from the database and notifies the listeners of the changed collections
+
+        Args:
+            versions (dict): collection: version
+        """
+
+        with self.lock:
+            # Collections missing from the document (settings recreated) are back to version 0
+            changed = {collection for collection in set(versions) | set(self.versions)
+                       if versions.get(collection, 0) != self.versions.get(collection, 0)}
+            if any(versions.get(collection, 0) < self.versions.get(collection, 0) for collection in changed):
+                self.epoch += 1
+            self.versions = dict(versions)
+        if changed:
+            for listener in self.listeners:
+                listener(changed)
+
+    def load(self):
+        """Reads the versions from the settings document"""
+
+        doc = self.db.settings.find_one({'_id': "1"}, {VERSIONS_FIELD: 1}) or {}
+        self.apply(doc.get(VERSIONS_FIELD) or {})
+
+    def bump(self, collections):
+        """Increases the versions of the written collections
+
+        Args:
+            collections (set): collection names
+        """
+
+        if not collections:
+            return
+
+        # The version update is not a content change itself
+        self.tracker.local.paused = True
+        try:
+            doc = self.db.settings.find_one_and_update(
+                {'_id': "1"},
+                {'$inc': {f"{VERSIONS_FIELD}.{collection}": 1 for collection in collections}},
+                projection={VERSIONS_FIELD: 1},
+                return_document=ReturnDocument.AFTER)
+        finally:
+            self.tracker.local.paused = False
+        if doc:
+            self.apply(doc.get(VERSIONS_FIELD) or {})
+
+    def flush(self):
+        """Bumps the versions of the collections written by the current thread"""
+
+        self.bump(self.tracker.pop())
+
+    def start(self):
+        """Follows the versions from the watcher thread of the process"""
+
+        self.watcher.add(self)
+
+
+class VersionWatcher:
+    """Follows the settings documents of the watched databases from one thread per process, with a change
+    stream (replica sets) or by polling them, so many databases do not cost a thread or a connection each."""
+
+    def __init__(self, target, poll_interval=5):
+        """
+        Args:
+            target (obj): pymongo database, or client to follow every database of the deployment
+            poll_interval (int, optional): seconds between polls without change streams. Defaults to 5.
+        """
+
+        self.target = target
+        self.poll_interval = poll_interval
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def add(self, versions):
+        """Follows the versions of a database, starts the watcher thread once per process
+        (worker processes may be forked after import)
+
+        Args:
+            versions (obj): ContentVersions
+        """
+
+        if self.pid == os.getpid() and self.versions.get(versions.db.name) is versions:
+            return
+        with self.lock:
+            if self.versions.get(versions.db.name) is not versions:
+                self.versions[versions.db.name] = versions
+                versions.load()
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        threading.Thread(target=self.watch, daemon=True).start()
+
+    def load(self):
+        """Reads the versions of every followed database"""
+
+        for versions in list(self.versions.values()):
+            versions.load()
+
+    def watch(self):
+        """Follows the settings documents with a change stream, falls back to polling if they are not supported"""
+
+        while True:
+            try:
+                with self.target.watch([{'$match': {'ns.coll': 'settings', 'documentKey._id': "1"}}],
+                                       full_document='updateLookup') as stream:
+                    # Changes made between load() and the stream start
+                    self.load()
+                    for change in stream:
+                        versions = self.versions.get(change['ns']['db'])
+                        if versions:
+                            versions.apply((change.get('fullDocument') or {}).get(VERSIONS_FIELD) or {})
+            except OperationFailure:
+                # Standalone servers have no change streams
+                break
+            except PyMongoError:
+                time.sleep(self.poll_interval)
+
+        while True:
+            time.sleep(self.poll_interval)
+            for versions in list(self.versions.values()):
+                try:
+                    versions.load()
+                except PyMongoError:
+                    pass
+
+
+def value_size(value):
+    """Approximate memory held by a value (containers are walked, shared objects are counted every time)
+
+    Args:
+        value (any): cached value
+
+    Returns:
+        int: bytes
+    """
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(value_size(key) + value_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(value_size(item) for item in value)
+
+    return size
+
+
+class ContentCache:
+    """Per process cache of values loaded from the database, dropped when their collections change.
+    Each database (tenant) has its own partition, all of them share the memory budget of the process:
+    the least recently used values of any partition are dropped first."""
+
+    def __init__(self, budget=0):
+        """
+        Args:
+            budget (int, optional): bytes kept at most, 0 for no limit. Defaults to 0.
+        """
+
+        self.values = OrderedDict()
+        self.dependencies = {}
+        self.sizes = {}
+        self.size = 0
+        self.budget = budget
+        # Bytes and invalidations of each partition
+        self.used = {}
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def partition(self, name, versions):
+        """Cache of the values of one database
+
+        Args:
+            name (string): partition name
+            versions (obj): ContentVersions of the database the values are loaded from
+
+        Returns:
+            obj: CachePartition
+        """
+
+        partition = CachePartition(self, name)
+        versions.on_change(partition.invalidate)
+        return partition
+
+    def get(self, name, key, loader, collections):
+        """Returns the cached value or loads it
+
+        Args:
+            name (string): partition name
+            key (string): cache key
+            loader (function): loads the value from the database
+            collections (list): collections the value is loaded from
+
+        Returns:
+            any: value
+        """
+
+        key = (name, key)
+        with self.lock:
+            if key in self.values:
+                self.values.move_to_end(key)
+                return self.values[key]
+            generation = self.generations.get(name, 0)
+
+        value = loader()
+        size = value_size(value)
+        with self.lock:
+            # Not cached if a change arrived while loading
+            if generation == self.generations.get(name, 0):
+                self.drop(key)
+                self.values[key] = value
+                self.dependencies[key] = set(collections)
+                self.sizes[key] = size
+                self.size += size
+                self.used[name] = self.used.get(name, 0) + size
+                # The value just loaded is kept even if it is larger than the budget
+                while self.budget and self.size > self.budget and len(self.values) > 1:
+                    self.drop(next(iter(self.values)))
+        return value
+
+    def drop(self, key):
+        """Forgets a value (the lock is held by the caller)
+
+        Args:
+            key (tuple): partition name and cache key
+        """
+
+        if key in self.values:
+            del self.values[key]
+            del self.dependencies[key]
+            size = self.sizes.pop(key)
+            self.size -= size
+            self.used[key[0]] -= size
+
+    def invalidate(self, name, collections):
+        """Drops the values of a partition loaded from any of the changed collections
+
+        Args:
+            name (string): partition name
+            collections (set): changed collection names
+        """
+
+        with self.lock:
+            self.generations[name] = self.generations.get(name, 0) + 1
+            for key, dependencies in list(self.dependencies.items()):
+                if key[0] == name and dependencies & collections:
+                    self.drop(key)
+
+
+class CachePartition:
+    """Values of one database in the ContentCache of the process"""
+
+    def __init__(self, cache, name):
+        """
+        Args:
+            cache (obj): ContentCache
+            name (string): partition name
+        """
+
+        self.cache = cache
+        self.name = name
+
+    @property
+    def size(self):
+        """Bytes held by the partition"""
+
+        return self.cache.used.get(self.name, 0)
+
+    def get(self, key, loader, collections):
+        """Returns the cached value or loads it (see ContentCache.get)"""
+
+        return self.cache.get(self.name, key, loader, collections)
+
+    def invalidate(self, collections):
+        """Drops the values loaded from any of the changed collections
+
+        Args:
+            collections (set): changed collection names
+        """
+
+        self.cache.invalidate(self.name, collections)
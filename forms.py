@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm, RecaptchaField
 from flask_wtf.recaptcha.validators import Recaptcha
-from wtforms import StringField, TextAreaField, SubmitField, HiddenField, IntegerField, SelectField, PasswordField, BooleanField
+from wtforms import StringField, TextAreaField, SubmitField, HiddenField, IntegerField, SelectField, SelectMultipleField, PasswordField, BooleanField
 from wtforms.fields.html5 import EmailField, IntegerRangeField, IntegerField, TelField
 from wtforms.validators import DataRequired, Email, NumberRange, Regexp, URL, Optional, InputRequired, AnyOf, Length
 
@@ -53,7 +53,8 @@ class AddBlogForm(FlaskForm):
     title = StringField('Title', validators=[
         DataRequired(message='Please fill in Title field!')])
     slug = StringField('Slug', validators=[
-                       DataRequired(message='Slug is required!')])
+                       DataRequired(message='Slug is required!'),
+                       Regexp(r'^(?!.*\.\.)[^/\\]+$', message='Slug can not contain slashes or ".."!')])
     url_for_sign_s3 = HiddenField(id='url-for-signs3')
     url_for_delete_s3 = HiddenField(id='url-for-deletes3')
     collection = HiddenField()
@@ -67,7 +68,8 @@ class EditBlogForm(FlaskForm):
     title = StringField('Title', validators=[
         DataRequired(message='Please fill in Title field!')])
     slug = StringField('Slug', validators=[
-                       DataRequired(message='Slug is required!')])
+                       DataRequired(message='Slug is required!'),
+                       Regexp(r'^(?!.*\.\.)[^/\\]+$', message='Slug can not contain slashes or ".."!')])
     body = TextAreaField('Text')
     submit = SubmitField('Update')
 
@@ -77,7 +79,8 @@ class AddProjectForm(FlaskForm):
     title = StringField('Title', validators=[
         DataRequired(message='Please fill in Title field!')])
     slug = StringField('Slug', validators=[
-                       DataRequired(message='Slug is required!')])
+                       DataRequired(message='Slug is required!'),
+                       Regexp(r'^(?!.*\.\.)[^/\\]+$', message='Slug can not contain slashes or ".."!')])
     year = IntegerField('Year', validators=[
         NumberRange(message='Year should be a number!'),
         InputRequired(message='Please enter Year!')])
@@ -102,7 +105,8 @@ class EditProjectForm(FlaskForm):
     title = StringField('Title', validators=[
         DataRequired(message='Please fill in Title field!')])
     slug = StringField('Slug', validators=[
-                       DataRequired(message='Slug is required!')])
+                       DataRequired(message='Slug is required!'),
+                       Regexp(r'^(?!.*\.\.)[^/\\]+$', message='Slug can not contain slashes or ".."!')])
     year = IntegerField('Year', validators=[
         NumberRange(message='Year should be a number!'),
         InputRequired(message='Please enter Year!')])
@@ -138,9 +142,9 @@ class EducationForm(FlaskForm):
     department = StringField('Department', validators=[
         DataRequired(message='Please fill in the Department!')])
     description = TextAreaField('Description')
-    order = IntegerField('Sort Order', validators=[
-                         NumberRange(message='Order should be a number!'),
-                         InputRequired(message='Please enter Order!')])
+    order = IntegerField('Sort Order (empty = last)', validators=[
+                         Optional(),
+                         NumberRange(message='Order should be a number!')])
     submit = SubmitField('Submit')
 
 
@@ -153,9 +157,9 @@ class ExperienceForm(FlaskForm):
     role = StringField('Role/Title', validators=[
         DataRequired(message='Please fill in youre Role at this company!')])
     description = TextAreaField('Description')
-    order = IntegerField('Sort Order', validators=[
-                         NumberRange(message='Order should be a number!'),
-                         InputRequired(message='Please enter Order!')])
+    order = IntegerField('Sort Order (empty = last)', validators=[
+                         Optional(),
+                         NumberRange(message='Order should be a number!')])
     submit = SubmitField('Submit')
 
 
@@ -201,3 +205,16 @@ class SettingsForm(FlaskForm):
         DataRequired(message='Please fill in the META Description!'),
         Length(max=160, message='META Description is %(max)d characters max!')])
     submit = SubmitField('Update')
+
+
+class ProfilerForm(FlaskForm):
+    """Sampling Profiler Form"""
+    enabled = BooleanField('Profile requests')
+    endpoints = SelectMultipleField('Routes (none selected: all routes)')
+    percentage = IntegerField('Sampled requests (%)', default=10, validators=[
+        InputRequired(message='Please fill in the sampled requests percentage!'),
+        NumberRange(min=1, max=100, message='Sampled requests must be between 1 and 100%!')])
+    minutes = IntegerField('Turn off after (minutes)', default=15, validators=[
+        InputRequired(message='Please fill in the profiling time!'),
+        NumberRange(min=1, max=1440, message='Profiling time must be between 1 and 1440 minutes!')])
+    submit = SubmitField('Update')
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+import threading
+
+
+class FragmentCache:
+    """Rendered template fragments, valid as long as the versions of the collections they show.
+    Each database (tenant) has its own partition, all of them share the memory budget of the process:
+    the least recently used fragments of any partition are dropped first."""
+
+    def __init__(self, budget=0):
+        """
+        Args:
+            budget (int, optional): characters of html kept at most, 0 for no limit. Defaults to 0.
+        """
+
+        self.budget = budget
+        self.fragments = OrderedDict()
+        self.size = 0
+        # Characters held and hit / miss counts of each partition
+        self.used = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def partition(self, name, get_version):
+        """Fragments of one database
+
+        Args:
+            name (string): partition name
+            get_version (function): returns the current version of a collection of the database
+
+        Returns:
+            obj: FragmentPartition
+        """
+
+        return FragmentPartition(self, name, get_version)
+
+    def get(self, partition, name, collections, vary, render):
+        """Returns the cached fragment or renders it
+
+        Args:
+            partition (obj): FragmentPartition
+            name (string): fragment name
+            collections (list): collections the fragment is rendered from
+            vary (tuple): other values the fragment depends on (e.g. logged in user)
+            render (function): renders the fragment
+
+        Returns:
+            string: html
+        """
+
+        versions = tuple(partition.get_version(collection) for collection in collections)
+        key = (partition.name, name, vary)
+
+        with self.lock:
+            cached = self.fragments.get(key)
+            hit = cached is not None and cached[0] == versions
+            if hit:
+                self.fragments.move_to_end(key)
+            stats = self.stats.setdefault((partition.name, name), {'hits': 0, 'misses': 0})
+            stats['hits' if hit else 'misses'] += 1
+        if hit:
+            return cached[1]
+
+        html = render()
+        with self.lock:
+            previous = self.fragments.pop(key, None)
+            if previous:
+                self.forget(key, previous)
+            self.fragments[key] = (versions, html)
+            self.size += len(html)
+            self.used[partition.name] = self.used.get(partition.name, 0) + len(html)
+            while self.budget and self.size > self.budget and len(self.fragments) > 1:
+                self.forget(*self.fragments.popitem(last=False))
+
+        return html
+
+    def forget(self, key, fragment):
+        """Releases the memory of a dropped fragment (the lock is held by the caller)
+
+        Args:
+            key (tuple): partition name, fragment name and vary values
+            fragment (tuple): versions and html
+        """
+
+        self.size -= len(fragment[1])
+        self.used[key[0]] -= len(fragment[1])
+
+    def report(self, partition):
+        """Hit and miss counts of the fragments of a partition
+
+        Args:
+            partition (string): partition name
+
+        Returns:
+            list: dicts of name, hits, misses and ratio (hits / requests)
+        """
+
+        with self.lock:
+            return [{'name': name, 'hits': stats['hits'], 'misses': stats['misses'],
+                     'ratio': stats['hits'] / (stats['hits'] + stats['misses'])}
+                    for (owner, name), stats in sorted(self.stats.items()) if owner == partition]
+
+
+class FragmentPartition:
+    """Fragments of one database in the FragmentCache of the process"""
+
+    def __init__(self, cache, name, get_version):
+        """
+        Args:
+            cache (obj): FragmentCache
+            name (string): partition name
+            get_version (function): returns the current version of a collection of the database
+        """
+
+        self.cache = cache
+        self.name = name
+        self.get_version = get_version
+
+    @property
+    def size(self):
+        """Characters of html held by the partition"""
+
+        return self.cache.used.get(self.name, 0)
+
+    def get(self, name, collections, vary, render):
+        """Returns the cached fragment or renders it (see FragmentCache.get)"""
+
+        return self.cache.get(self, name, collections, vary, render)
+
+    def report(self):
+        """Hit and miss counts of the fragments of the partition (see FragmentCache.report)"""
+
+        return self.cache.report(self.name)
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja tag caching the html of a template section:
+
+        {% cache "skills", ["skills"], session['user'] %}...{% endcache %}
+
+    Arguments are the fragment name, the collections it is rendered from and, optionally, any other
+    values the section depends on. The cache is set on the environment (fragment_cache); without it
+    the section is rendered every time.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, args, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+
+        name, collections, *vary = args
+        return cache.get(name, collections, tuple(str(value) for value in vary), caller)
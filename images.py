@@ -0,0 +1,64 @@
+from base64 import b64encode
+from importlib.util import find_spec
+from io import BytesIO
+from render import image_size
+
+# Pillow decodes the photos for the placeholders, dimensions and size are read without it
+if find_spec('PIL'):
+    from PIL import Image, ImageOps
+else:
+    Image = None
+
+# Longest side of the placeholders, in pixels (scaled up and smoothed by the browser)
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 50
+EXIF_ORIENTATION = 0x0112
+
+
+def placeholder(image):
+    """Builds a tiny jpeg data uri of an image, shown while the image loads
+
+    Args:
+        image (obj): Pillow image
+
+    Returns:
+        string: data uri
+    """
+
+    # Jpeg images are decoded straight at a reduced scale
+    image.draft('RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+
+    return 'data:image/jpeg;base64,' + b64encode(output.getvalue()).decode()
+
+
+def describe_image(data):
+    """Displayed dimensions, byte size and placeholder of an image
+
+    Args:
+        data (bytes): image file
+
+    Returns:
+        dict: width, height, size and placeholder (None without Pillow), None if the format is unknown
+    """
+
+    dimensions = image_size(data)
+    if not dimensions:
+        return None
+
+    width, height = dimensions
+    preview = None
+    if Image is not None:
+        try:
+            with Image.open(BytesIO(data)) as image:
+                # Browsers display photos turned by their exif orientation
+                if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                    width, height = height, width
+                preview = placeholder(image)
+        except Exception:
+            pass
+
+    return {'width': width, 'height': height, 'size': len(data), 'placeholder': preview}
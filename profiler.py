@@ -0,0 +1,336 @@
+from collections import Counter
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+# Profile names are made by the profiler (timestamp, process and random suffix)
+PROFILE_NAME = re.compile(r'^[0-9a-f-]+$')
+SWITCH_FILE = 'switch.json'
+
+
+def frame_label(frame):
+    """Flame graph label of a stack frame
+
+    Args:
+        frame (obj): python frame
+
+    Returns:
+        string: function (file:line)
+    """
+
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """Collapsed stack of a frame, outermost call first
+
+    Args:
+        frame (obj): innermost python frame
+
+    Returns:
+        string: frame labels joined by ;
+    """
+
+    labels = []
+    while frame:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+
+    return ';'.join(reversed(labels))
+
+
+def cooperative():
+    """Whether the threads are gevent greenlets (serve_async.py): every request then runs on the same
+    OS thread, whose stack sys._current_frames() cannot tell apart
+
+    Returns:
+        bool: threading is patched by gevent
+    """
+
+    monkey = sys.modules.get('gevent.monkey')
+    return bool(monkey and monkey.is_module_patched('threading'))
+
+
+class SamplingProfiler:
+    """Statistical profiler of live requests. A background thread reads the stack of every profiled
+    request thread at a fixed interval; the other requests only check the switch, which is read
+    from the profiles directory at most once a second, so every worker of the machine follows it."""
+
+    def __init__(self, directory, interval=0.005, max_profiles=200):
+        """
+        Args:
+            directory (string): directory of the switch and of the profiles
+            interval (float, optional): seconds between samples. Defaults to 0.005.
+            max_profiles (int, optional): profiles kept, the oldest are deleted. Defaults to 200.
+        """
+
+        self.directory = directory
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pid = None
+        self.switch = {}
+        self.switch_mtime = None
+        self.checked = 0
+
+    def settings(self):
+        """Current switch of the profiler
+
+        Returns:
+            dict: enabled, endpoints, percentage and until (timestamp), empty if never set
+        """
+
+        now = time.monotonic()
+        if now - self.checked >= 1:
+            self.checked = now
+            path = os.path.join(self.directory, SWITCH_FILE)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime != self.switch_mtime:
+                self.switch_mtime = mtime
+                try:
+                    with open(path) as file:
+                        self.switch = json.load(file)
+                except (OSError, ValueError):
+                    self.switch = {}
+
+        return self.switch
+
+    def configure(self, enabled, endpoints, percentage, minutes):
+        """Turns the profiler on or off for every worker
+
+        Args:
+            enabled (bool): profile requests
+            endpoints (list): profiled endpoints, all of them if empty
+            percentage (int): share of the matching requests that are profiled
+            minutes (int): the profiler turns itself off after this time
+        """
+
+        switch = {'enabled': enabled, 'endpoints': endpoints, 'percentage': percentage,
+                  'until': time.time() + minutes * 60}
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, SWITCH_FILE)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(switch, file)
+        os.replace(path + '.tmp', path)
+        self.checked = 0
+
+    def should_profile(self, endpoint):
+        """Draws whether a request is profiled
+
+        Args:
+            endpoint (string): flask endpoint of the request
+
+        Returns:
+            bool: profile the request
+        """
+
+        if cooperative():
+            return False
+        switch = self.settings()
+        if not switch.get('enabled') or time.time() > switch.get('until', 0):
+            return False
+        if switch.get('endpoints') and endpoint not in switch['endpoints']:
+            return False
+
+        return random.random() * 100 < switch.get('percentage', 0)
+
+    def start(self):
+        """Starts sampling the current thread"""
+
+        with self.lock:
+            self.active[threading.get_ident()] = {'stacks': Counter(), 'start': time.perf_counter()}
+            # Worker processes may be forked after import
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self.run, daemon=True).start()
+        self.wake.set()
+
+    def stop(self, meta):
+        """Stops sampling the current thread and saves its profile
+
+        Args:
+            meta (dict): request details stored with the profile (method, path, endpoint, status)
+
+        Returns:
+            string: profile name, None if the thread was not profiled
+        """
+
+        with self.lock:
+            profile = self.active.pop(threading.get_ident(), None)
+            if not self.active:
+                self.wake.clear()
+        if profile is None:
+            return None
+
+        name = f"{int(time.time() * 1000):x}-{os.getpid():x}-{random.getrandbits(32):08x}"
+        profile = dict(meta, name=name, time=time.time(), interval=self.interval,
+                       duration=(time.perf_counter() - profile['start']) * 1000,
+                       samples=sum(profile['stacks'].values()), stacks=dict(profile['stacks']))
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name + '.json'), 'w') as file:
+            json.dump(profile, file)
+        self.prune()
+
+        return name
+
+    def run(self):
+        """Sampling loop, idle while no request is profiled"""
+
+        while True:
+            self.wake.wait()
+            time.sleep(self.interval)
+            with self.lock:
+                idents = list(self.active)
+            frames = sys._current_frames()
+            stacks = {ident: collapse(frames[ident]) for ident in idents if ident in frames}
+            # Counted under the lock, stop() reads the counters of a profile once it is no longer active
+            with self.lock:
+                for ident, stack in stacks.items():
+                    if ident in self.active:
+                        self.active[ident]['stacks'][stack] += 1
+
+    def names(self):
+        """Stored profile names, newest first
+
+        Returns:
+            list: profile names
+        """
+
+        try:
+            files = os.listdir(self.directory)
+        except OSError:
+            return []
+
+        return sorted((file[:-5] for file in files if file.endswith('.json') and file != SWITCH_FILE), reverse=True)
+
+    def prune(self):
+        """Deletes the oldest profiles above max_profiles"""
+
+        for name in self.names()[self.max_profiles:]:
+            try:
+                os.remove(os.path.join(self.directory, name + '.json'))
+            except OSError:
+                pass
+
+    def load(self, name):
+        """Reads a stored profile
+
+        Args:
+            name (string): profile name
+
+        Returns:
+            dict: profile, None if it does not exist
+        """
+
+        if not PROFILE_NAME.match(name):
+            return None
+        try:
+            with open(os.path.join(self.directory, name + '.json')) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def profiles(self):
+        """Details of the stored profiles, newest first
+
+        Returns:
+            list: profiles without their stacks
+        """
+
+        profiles = []
+        for name in self.names():
+            profile = self.load(name)
+            if profile:
+                profile.pop('stacks')
+                profiles.append(profile)
+
+        return profiles
+
+    def clear(self):
+        """Deletes every stored profile"""
+
+        for name in self.names():
+            try:
+                os.remove(os.path.join(self.directory, name + '.json'))
+            except OSError:
+                pass
+
+
+def collapsed_text(profile):
+    """Collapsed stacks format (flamegraph.pl, speedscope...)
+
+    Args:
+        profile (dict): stored profile
+
+    Returns:
+        string: one "frame;frame;frame count" line per stack
+    """
+
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(profile['stacks'].items()))
+
+
+def flame_graph(profile, min_width=0.2):
+    """Lays out the stacks of a profile as an icicle graph (callers above their callees)
+
+    Args:
+        profile (dict): stored profile
+        min_width (float, optional): narrower frames (percentage of the samples) are left out. Defaults to 0.2.
+
+    Returns:
+        list: rows (one per stack depth) of frames with label, samples, left and width (percentages)
+    """
+
+    root = {'children': {}, 'samples': 0}
+    for stack, count in profile['stacks'].items():
+        node = root
+        node['samples'] += count
+        for label in stack.split(';'):
+            node = node['children'].setdefault(label, {'children': {}, 'samples': 0})
+            node['samples'] += count
+
+    rows = []
+    total = root['samples'] or 1
+    level = [(root, 0)]
+    while level:
+        next_level = []
+        row = []
+        for node, left in level:
+            for label, child in sorted(node['children'].items()):
+                width = child['samples'] * 100 / total
+                if width >= min_width:
+                    row.append({'label': label, 'samples': child['samples'], 'left': left, 'width': width})
+                    next_level.append((child, left))
+                left += width
+        if row:
+            rows.append(row)
+        level = next_level
+
+    return rows
+
+
+def hottest_frames(profile, limit=20):
+    """Frames where the samples were taken (self time)
+
+    Args:
+        profile (dict): stored profile
+        limit (int, optional): frames returned. Defaults to 20.
+
+    Returns:
+        list: (label, samples) tuples, most sampled first
+    """
+
+    frames = Counter()
+    for stack, count in profile['stacks'].items():
+        frames[stack.rsplit(';', 1)[-1]] += count
+
+    return frames.most_common(limit)
@@ -0,0 +1,136 @@
+from pymongo import ReturnDocument
+import threading
+import time
+
+
+class MemoryRateLimiter:
+    """Token bucket rate limiter kept in the memory of the worker process"""
+
+    def __init__(self, rate, burst):
+        """
+        Args:
+            rate (float): tokens added per second
+            burst (int): bucket capacity
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        """Takes a token from the bucket of a key
+
+        Args:
+            key (string): bucket key (e.g. route and client ip)
+
+        Returns:
+            tuple: (allowed, seconds until a token is available)
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > 10000:
+                self.prune(now)
+
+        return allowed, 0 if allowed else (1 - tokens) / self.rate
+
+    def prune(self, now):
+        """Forgets the buckets that are full again
+
+        Args:
+            now (float): monotonic time
+        """
+
+        full = self.burst / self.rate
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if now - bucket[1] < full}
+
+
+class MongoRateLimiter:
+    """Token bucket rate limiter shared by every worker, one document per bucket.
+    The bucket is refilled and a token taken by a single atomic update."""
+
+    def __init__(self, collection, rate, burst):
+        """
+        Args:
+            collection (obj): pymongo collection (with a TTL index on expires)
+            rate (float): tokens added per second
+            burst (int): bucket capacity
+        """
+
+        self.collection = collection
+        self.rate = rate
+        self.burst = burst
+
+    def allow(self, key):
+        """Takes a token from the bucket of a key
+
+        Args:
+            key (string): bucket key (e.g. route and client ip)
+
+        Returns:
+            tuple: (allowed, seconds until a token is available)
+        """
+
+        # The clock of the database is the only one used, the clocks of the worker machines may differ
+        now = '$$NOW'
+        elapsed = {'$divide': [{'$subtract': [now, {'$ifNull': ['$updated', now]}]}, 1000]}
+        bucket = self.collection.find_one_and_update(
+            {'_id': key},
+            [
+                {'$set': {'tokens': {'$min': [
+                    self.burst,
+                    {'$add': [{'$ifNull': ['$tokens', self.burst]}, {'$multiply': [elapsed, self.rate]}]}
+                ]}}},
+                {'$set': {'allowed': {'$gte': ['$tokens', 1]}}},
+                {'$set': {
+                    'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', 1]}, '$tokens']},
+                    'updated': now,
+                    # Full buckets are removed by the TTL index
+                    'expires': {'$add': [now, self.burst / self.rate * 1000]}
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER)
+
+        return bucket['allowed'], 0 if bucket['allowed'] else (1 - bucket['tokens']) / self.rate
+
+
+class ConcurrencyLimiter:
+    """Counts the requests in progress and refuses new ones above a limit, without waiting.
+    Each worker process has its own counter: a deployment accepts up to limit x workers requests."""
+
+    def __init__(self, limit):
+        """
+        Args:
+            limit (int): maximum concurrent requests of the worker process
+        """
+
+        self.limit = limit
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Starts a request if the limit is not reached
+
+        Returns:
+            bool: True if the request can proceed (release must be called when it ends)
+        """
+
+        with self.lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        """Ends a request"""
+
+        with self.lock:
+            self.active -= 1
@@ -0,0 +1,304 @@
+from html import escape
+from html.parser import HTMLParser
+import math
+import re
+import struct
+
+# Tags and attributes allowed in rich text fields (TinyMCE output)
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'del', 'div', 'em', 'figcaption', 'figure',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'ins', 'kbd', 'li', 'ol', 'p', 'pre',
+    's', 'small', 'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead',
+    'tr', 'u', 'ul'
+}
+# Elements without content or end tag
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+             'track', 'wbr'}
+# Tags removed together with their content
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript'}
+ALLOWED_ATTRIBUTES = {
+    '*': {'class', 'title', 'style'},
+    'a': {'href', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height', 'loading'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+    'ol': {'start'}
+}
+# Open tags implicitly closed by a new start tag (e.g. <li>one<li>two)
+IMPLIED_END = {
+    'li': {'li'}, 'td': {'td', 'th'}, 'th': {'td', 'th'}, 'tr': {'tr', 'td', 'th'},
+    'p': {'p'}, 'div': {'p'}, 'ul': {'p'}, 'ol': {'p'}, 'table': {'p'}, 'blockquote': {'p'},
+    'pre': {'p'}, 'figure': {'p'}, 'hr': {'p'}, 'h1': {'p'}, 'h2': {'p'}, 'h3': {'p'},
+    'h4': {'p'}, 'h5': {'p'}, 'h6': {'p'}
+}
+URL_ATTRIBUTES = {'href', 'src'}
+URL_SCHEMES = ('http:', 'https:', 'mailto:', 'tel:')
+TOC_TAGS = {'h2', 'h3'}
+WORDS_PER_MINUTE = 200
+
+
+def safe_url(url):
+    """Checks an url attribute value against the allowed schemes
+
+    Args:
+        url (string): attribute value
+
+    Returns:
+        bool: True for relative urls and allowed schemes
+    """
+
+    url = re.sub(r'[\s\x00-\x1f]', '', url).lower()
+    scheme = re.match(r'^[a-z][a-z0-9+.-]*:', url)
+
+    return not scheme or url.startswith(URL_SCHEMES)
+
+
+def safe_style(style):
+    """Checks an inline style against script injection
+
+    Args:
+        style (string): style attribute value
+
+    Returns:
+        bool: False if the style contains expressions or urls
+    """
+
+    return not re.search(r'expression|url\s*\(|javascript:|@import', style, re.IGNORECASE)
+
+
+def image_size(data):
+    """Reads the dimensions of a png, gif or jpeg image from its first bytes
+
+    Args:
+        data (bytes): beginning of the image file
+
+    Returns:
+        tuple: (width, height) or None if the format is unknown or the data is too short
+    """
+
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            # Start of frame markers hold the dimensions
+            if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+
+    return None
+
+
+def slugify(text):
+    """Makes an html id out of a heading text
+
+    Args:
+        text (string): heading text
+
+    Returns:
+        string: lowercase, dash separated id
+    """
+
+    return re.sub(r'[^\w]+', '-', text.lower()).strip('-') or 'section'
+
+
+class ContentRenderer(HTMLParser):
+    """Single pass html sanitizer that also adds lazy loading and dimensions to images,
+    ids to headings and collects the table of contents and the word count"""
+
+    def __init__(self, get_image_size=None):
+        super().__init__(convert_charrefs=True)
+        self.get_image_size = get_image_size
+        self.output = []
+        self.open_tags = []
+        self.dropped = 0
+        self.words = 0
+        self.toc = []
+        self.ids = set()
+        self.heading = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            # Void tags (embed) have no content to drop, nor an end tag to stop dropping
+            if tag not in VOID_TAGS:
+                self.dropped += 1
+            return
+        if self.dropped or tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRIBUTES['*'] | ALLOWED_ATTRIBUTES.get(tag, set())
+        clean = {}
+        for name, value in attrs:
+            value = value or ''
+            if name not in allowed or name in URL_ATTRIBUTES and not safe_url(value) or \
+                    name == 'style' and not safe_style(value):
+                continue
+            clean[name] = value
+
+        if tag == 'img':
+            if not clean.get('src'):
+                return
+            clean['loading'] = 'lazy'
+            if self.get_image_size and not (clean.get('width') and clean.get('height')):
+                size = self.get_image_size(clean['src'])
+                if size:
+                    clean['width'], clean['height'] = (str(value) for value in size)
+        if tag == 'a' and clean.get('target') == '_blank':
+            clean['rel'] = 'noopener noreferrer'
+        while self.open_tags and self.open_tags[-1] in IMPLIED_END.get(tag, ()):
+            self.close_tag()
+        if tag in TOC_TAGS:
+            self.heading = {'level': int(tag[1]), 'text': '', 'index': len(self.output)}
+
+        self.output.append(self.format_tag(tag, clean))
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # A self closed tag has no content: a dropped one (<iframe src="x"/>) is left out alone
+        if tag in DROPPED_TAGS:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and tag in self.open_tags:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            if tag not in VOID_TAGS and self.dropped:
+                self.dropped -= 1
+            return
+        if self.dropped or tag not in self.open_tags:
+            return
+
+        # Close any tags left open inside this one
+        while self.close_tag() != tag:
+            pass
+
+    def handle_data(self, data):
+        if self.dropped:
+            return
+        self.words += len(data.split())
+        if self.heading:
+            self.heading['text'] += data
+        self.output.append(escape(data, quote=False))
+
+    def close_tag(self):
+        """Closes the last open tag
+
+        Returns:
+            string: closed tag name
+        """
+
+        tag = self.open_tags.pop()
+        self.output.append(f"</{tag}>")
+        if tag in TOC_TAGS and self.heading:
+            self.add_heading()
+
+        return tag
+
+    def add_heading(self):
+        """Gives the current heading an unique id and adds it to the table of contents"""
+
+        text = ' '.join(self.heading['text'].split())
+        if text:
+            id = base = slugify(text)
+            i = 2
+            while id in self.ids:
+                id = f"{base}-{i}"
+                i += 1
+            self.ids.add(id)
+            index = self.heading['index']
+            self.output[index] = self.output[index].replace(
+                f"<h{self.heading['level']}", f"<h{self.heading['level']} id=\"{id}\"", 1)
+            self.toc.append({'level': self.heading['level'], 'id': id, 'text': text})
+        self.heading = None
+
+    @staticmethod
+    def format_tag(tag, attrs):
+        """Serializes a start tag
+
+        Args:
+            tag (string): tag name
+            attrs (dict): attributes
+
+        Returns:
+            string: html start tag
+        """
+
+        attributes = ''.join(f" {name}=\"{escape(value)}\"" for name, value in attrs.items())
+        return f"<{tag}{attributes}>"
+
+    def result(self):
+        """Closes the tags left open and returns the rendered html
+
+        Returns:
+            string: sanitized html
+        """
+
+        self.close()
+        while self.open_tags:
+            self.close_tag()
+
+        return ''.join(self.output)
+
+
+def tech_tag(name):
+    """Normalizes a technology name into a tag
+
+    Args:
+        name (string): technology name, e.g. " Node.JS "
+
+    Returns:
+        string: lowercase tag with collapsed whitespace, e.g. "node.js"
+    """
+
+    return ' '.join(name.split()).lower()
+
+
+def tech_tags(tech):
+    """Normalizes the comma separated technologies of a project into tags
+
+    Args:
+        tech (string): technologies, e.g. "Python, Flask,MongoDB"
+
+    Returns:
+        list: unique tags in their original order
+    """
+
+    tags = (tech_tag(name) for name in (tech or '').split(','))
+
+    return list(dict.fromkeys(tag for tag in tags if tag))
+
+
+def render_content(html, get_image_size=None):
+    """Renders a rich text field once, at save time
+
+    Args:
+        html (string): raw html from the rich text editor
+        get_image_size (function, optional): returns (width, height) of an image src or None.
+            Used for images without dimensions. Defaults to None.
+
+    Returns:
+        dict: html (sanitized), toc (list of level, id and text of h2/h3 headings)
+            and reading_time (minutes)
+    """
+
+    renderer = ContentRenderer(get_image_size)
+    renderer.feed(html or '')
+    rendered = renderer.result()
+
+    return {
+        'html': rendered,
+        'toc': renderer.toc,
+        'reading_time': max(1, math.ceil(renderer.words / WORDS_PER_MINUTE))
+    }
@@ -0,0 +1,41 @@
+"""Correctness cases of the save time html renderer (sanitizer, lazy images, heading ids)"""
+from render import render_content
+
+# Raw html from the rich text editor: expected sanitized html
+CASES = {
+    'allowed': ('<p>Some <strong>bold</strong> and <a href="/x">link</a></p>',
+                '<p>Some <strong>bold</strong> and <a href="/x">link</a></p>'),
+    'script': ('<p>a</p><script>alert(1)</script><p>b</p>', '<p>a</p><p>b</p>'),
+    'event handler': ('<p onclick="alert(1)">a</p><img src="x.png" onerror="alert(1)">',
+                      '<p>a</p><img src="x.png" loading="lazy">'),
+    'javascript url': ('<a href="javascript:alert(1)">a</a><a href=" JaVa\tscript:alert(1)">b</a>',
+                       '<a>a</a><a>b</a>'),
+    'unsafe style': ('<p style="background: url(x)">a</p>', '<p>a</p>'),
+    'nested dropped': ('<p>a</p><object><embed src="x.swf"><p>inside</p></object><p>b</p>', '<p>a</p><p>b</p>'),
+    # Void and self closed dropped tags have no end tag: the content after them is kept
+    'embed': ('<p>a</p><embed src="x.swf"><p>rest of post</p>', '<p>a</p><p>rest of post</p>'),
+    'self closed embed': ('<p>a</p><embed src="x.swf"/><p>rest of post</p>', '<p>a</p><p>rest of post</p>'),
+    'self closed iframe': ('<p>a</p><iframe src="x"/><p>rest of post</p>', '<p>a</p><p>rest of post</p>'),
+    'implied end': ('<ul><li>one<li>two</ul>', '<ul><li>one</li><li>two</li></ul>'),
+    'unclosed': ('<div><p>a <b>b', '<div><p>a <b>b</b></p></div>'),
+    'headings': ('<h2>Intro</h2><h3>Intro</h3><h2>Intro</h2>',
+                 '<h2 id="intro">Intro</h2><h3 id="intro-2">Intro</h3><h2 id="intro-3">Intro</h2>'),
+    'blank target': ('<a href="https://x.com" target="_blank">x</a>',
+                     '<a href="https://x.com" target="_blank" rel="noopener noreferrer">x</a>')
+}
+
+
+def check_cases():
+    """Renders every case
+
+    Returns:
+        list: failures (case name, expected html, actual html)
+    """
+
+    failures = []
+    for name, (html, expected) in CASES.items():
+        actual = render_content(html)['html']
+        if actual != expected:
+            failures.append((name, expected, actual))
+
+    return failures
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+import re
+
+# S3 delete_objects accepts at most 1000 keys per call
+DELETE_BATCH_SIZE = 1000
+
+
+def referenced_keys(db, bucket):
+    """Mark phase: builds the set of S3 keys referenced by the database
+
+    Photos arrays of settings, blogs and projects are read, as well as the images
+    inserted into blog bodies and project descriptions from the rich text editor.
+
+    Args:
+        db (obj): pymongo database
+        bucket (string): S3 bucket name
+
+    Returns:
+        set: referenced object keys
+    """
+
+    url_regex = re.compile(
+        r'https?://' + re.escape(bucket) + r'\.s3[\w.-]*\.amazonaws\.com/([^"\'\s<>?#]+)')
+    keys = set()
+    sources = {'settings': None, 'blogs': 'body', 'projects': 'description'}
+
+    for collection, html_field in sources.items():
+        projection = {'photos': 1}
+        if html_field:
+            projection[html_field] = 1
+        for doc in db[collection].find({}, projection):
+            for photo in doc.get('photos') or []:
+                if photo:
+                    match = url_regex.match(photo)
+                    keys.add(match.group(1) if match else photo.split('/').pop())
+            if html_field:
+                keys.update(url_regex.findall(doc.get(html_field) or ''))
+
+    return keys
+
+
+def orphaned_objects(s3, bucket, keys, grace, prefix=''):
+    """Streams the bucket objects that are not referenced and are older than the grace period
+
+    Args:
+        s3 (obj): boto3 S3 client
+        bucket (string): S3 bucket name
+        keys (set): referenced object keys
+        grace (timedelta): minimum age of an object to be considered orphaned
+        prefix (string, optional): key prefix of the swept objects. Defaults to ''.
+
+    Yields:
+        dict: list_objects_v2 object (Key, Size, LastModified)
+
+    Raises:
+        ValueError: the prefix does not end with a slash
+    """
+
+    # 'acme' would also sweep 'acme-photo.jpg' of the tenant without prefix
+    if prefix and not prefix.endswith('/'):
+        raise ValueError(f"S3 prefix must end with a slash: {prefix}")
+
+    cutoff = datetime.now(timezone.utc) - grace
+    paginator = s3.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            # Uploaded file names have no slash, deeper keys belong to other prefixes (tenants)
+            if '/' in obj['Key'][len(prefix):]:
+                continue
+            if obj['Key'] not in keys and obj['LastModified'] < cutoff:
+                yield obj
+
+
+def collect_garbage(s3, db, bucket, prefix='', grace=timedelta(days=1), dry_run=True):
+    """Deletes the S3 objects that are not referenced by any document (mark and sweep)
+
+    Args:
+        s3 (obj): boto3 S3 client (any S3 compatible endpoint, e.g. a local stand-in)
+        db (obj): pymongo database
+        bucket (string): S3 bucket name
+        prefix (string, optional): key prefix of the objects of the database (tenant). Defaults to ''.
+        grace (timedelta, optional): minimum age of deleted objects, so uploads of forms
+            that are still being filled are kept. Defaults to 1 day.
+        dry_run (bool, optional): only report what would be deleted. Defaults to True.
+
+    Returns:
+        dict: report with referenced, orphaned and deleted counts, orphaned bytes, orphaned keys (dry run only) and errors
+    """
+
+    keys = referenced_keys(db, bucket)
+    report = {'referenced': len(keys), 'orphaned': 0, 'deleted': 0,
+              'bytes': 0, 'keys': [], 'errors': []}
+    batch = []
+
+    def sweep(batch):
+        response = s3.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+        errors = response.get('Errors', [])
+        report['errors'].extend(
+            f"{error.get('Key')}: {error.get('Message')}" for error in errors)
+        report['deleted'] += len(batch) - len(errors)
+
+    for obj in orphaned_objects(s3, bucket, keys, grace, prefix):
+        report['orphaned'] += 1
+        report['bytes'] += obj.get('Size', 0)
+        if dry_run:
+            report['keys'].append(obj['Key'])
+        else:
+            batch.append(obj['Key'])
+            if len(batch) == DELETE_BATCH_SIZE:
+                sweep(batch)
+                batch = []
+
+    if batch:
+        sweep(batch)
+
+    return report
@@ -0,0 +1,259 @@
+"""Synthetic content generator and per route scaling report"""
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from pymongo import monitoring
+from render import render_content, tech_tags
+from truncate import truncate_html
+import itertools
+import random
+import statistics
+import time
+import tracemalloc
+
+# Documents per collection at scale 1 (roughly a real portfolio)
+BASE_VOLUMES = {'blogs': 20, 'projects': 15, 'testimonials': 30, 'skills': 15,
+                'education': 4, 'experience': 6, 'links': 5}
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+         'et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip '
+         'ex ea commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum eu fugiat '
+         'nulla pariatur excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt '
+         'mollit anim id est laborum').split()
+TECH = ['Python', 'Flask', 'MongoDB', 'JavaScript', 'HTML5', 'CSS3', 'Bootstrap', 'jQuery', 'Django',
+        'PostgreSQL', 'AWS S3', 'Heroku', 'Docker', 'React', 'Node.js', 'Jinja', 'Git', 'REST']
+ICONS = ['github', 'linkedin', 'twitter', 'facebook', 'instagram', 'youtube', 'stack-overflow']
+INSERT_BATCH_SIZE = 1000
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the database commands run in the current context, including the queries the request
+    runs on pool threads with copy_context().run (listeners are called in the thread running the command)"""
+
+    def __init__(self):
+        self.counter = ContextVar('command_counter', default=None)
+
+    def started(self, event):
+        counter = self.counter.get()
+        if counter is not None:
+            # next() of a count is atomic, the pool threads of a request share its counter
+            next(counter)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        """Starts counting from zero (commands are only counted once a counter is started)
+
+        Returns:
+            int: commands counted until now
+        """
+
+        counter = self.counter.get()
+        self.counter.set(itertools.count())
+        # A count returns the number of previous calls
+        return next(counter) if counter is not None else 0
+
+
+class ContentGenerator:
+    """Builds realistic documents for every content collection"""
+
+    def __init__(self, bucket, seed=0):
+        """
+        Args:
+            bucket (string): S3 bucket of the photo urls
+            seed (int, optional): random seed, the same seed gives the same content. Defaults to 0.
+        """
+
+        self.random = random.Random(seed)
+        self.bucket = bucket
+
+    def sentence(self, min_words=6, max_words=18):
+        """Random sentence"""
+
+        words = self.random.choices(WORDS, k=self.random.randint(min_words, max_words))
+        return ' '.join(words).capitalize() + '.'
+
+    def paragraph(self):
+        """Random paragraph of 3 to 8 sentences"""
+
+        return ' '.join(self.sentence() for i in range(self.random.randint(3, 8)))
+
+    def photo(self):
+        """Url of a photo in the S3 bucket"""
+
+        return f"https://{self.bucket}.s3.amazonaws.com/synthetic-{self.random.getrandbits(64):016x}.jpg"
+
+    def photos(self, max_photos):
+        """Photos array of up to max_photos urls"""
+
+        return [self.photo() for i in range(self.random.randint(0, max_photos))]
+
+    def rich_text(self, min_sections, max_sections):
+        """Html like the rich text editor output: headings, paragraphs, lists, links and images"""
+
+        html = []
+        for i in range(self.random.randint(min_sections, max_sections)):
+            html.append(f"<h2>{self.sentence(2, 5)}</h2>")
+            for j in range(self.random.randint(1, 4)):
+                html.append(f"<p>{self.paragraph()} <a href=\"https://example.com\" target=\"_blank\">"
+                            f"{self.sentence(1, 3)}</a></p>")
+            if self.random.random() < 0.4:
+                html.append('<ul>' + ''.join(f"<li>{self.sentence(3, 8)}</li>"
+                                             for k in range(self.random.randint(2, 6))) + '</ul>')
+            if self.random.random() < 0.3:
+                html.append(f"<p><img src=\"{self.photo()}\" "
+                            f"alt=\"{self.sentence(2, 4)}\" width=\"800\" height=\"450\"></p>")
+        return '\n'.join(html)
+
+    def rendered(self, html, field):
+        """Fields of the render stage (images already have dimensions, nothing is fetched)"""
+
+        rendered = render_content(html)
+        fields = {f"{field}_html": rendered['html'], 'toc': rendered['toc'], 'reading_time': rendered['reading_time']}
+        if field == 'body':
+            fields['excerpt'] = truncate_html(rendered['html'], 200, end=' ...', break_words=True)
+        return fields
+
+    def blog(self, i):
+        title = self.sentence(3, 8).rstrip('.')
+        body = self.rich_text(2, 12)
+        added = datetime.utcnow() - timedelta(days=self.random.randint(0, 2000))
+        blog = {'title': title, 'slug': f"synthetic-blog-{i}", 'photos': self.photos(6), 'body': body,
+                'added_on': added.strftime('%B %d, %Y'), 'updated_on': added}
+        blog.update(self.rendered(body, 'body'))
+        return blog
+
+    def project(self, i):
+        description = self.rich_text(1, 6)
+        project = {'title': self.sentence(2, 5).rstrip('.'), 'slug': f"synthetic-project-{i}",
+                   'year': self.random.randint(2010, datetime.utcnow().year),
+                   'tech': ','.join(self.random.sample(TECH, self.random.randint(2, 8))),
+                   'brief': self.sentence(10, 30), 'description': description,
+                   'repo': f"https://github.com/synthetic/project-{i}", 'live_url': f"https://project-{i}.example.com",
+                   'photos': self.photos(8), 'featured': self.random.random() < 0.2,
+                   'updated_on': datetime.utcnow()}
+        project.update(self.rendered(description, 'description'))
+        project['tech_tags'] = tech_tags(project['tech'])
+        return project
+
+    def testimonial(self, i):
+        return {'author': f"{self.random.choice(WORDS).capitalize()} {self.random.choice(WORDS).capitalize()}",
+                'role': self.sentence(2, 4).rstrip('.'), 'text': self.paragraph(),
+                'approved': self.random.random() < 0.7}
+
+    def skill(self, i):
+        return {'name': f"{self.random.choice(TECH)} {i}", 'percentage': self.random.randint(30, 100)}
+
+    def school(self, i):
+        return {'school': self.sentence(2, 4).rstrip('.'), 'period': f"{2000 + i % 20} - {2004 + i % 20}",
+                'title': self.sentence(2, 5).rstrip('.'), 'department': self.sentence(1, 3).rstrip('.'),
+                'description': self.paragraph()}
+
+    def job(self, i):
+        return {'company': self.sentence(1, 3).rstrip('.'), 'period': f"{2005 + i % 15} - {2007 + i % 15}",
+                'role': self.sentence(2, 4).rstrip('.'), 'description': self.paragraph()}
+
+    def link(self, i):
+        icon = ICONS[i % len(ICONS)]
+        return {'name': icon.capitalize(), 'icon': icon, 'url': f"https://{icon}.example.com/synthetic-{i}"}
+
+
+def generate(db, scale, bucket, order_gap, seed=0):
+    """Inserts synthetic documents (flagged with synthetic: True) into every content collection
+
+    Args:
+        db (obj): pymongo database
+        scale (float): multiplier of BASE_VOLUMES
+        bucket (string): S3 bucket of the photo urls
+        order_gap (int): gap between the orders of education and experience
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        dict: collection: inserted documents
+    """
+
+    generator = ContentGenerator(bucket, seed)
+    builders = {'blogs': generator.blog, 'projects': generator.project, 'testimonials': generator.testimonial,
+                'skills': generator.skill, 'education': generator.school, 'experience': generator.job,
+                'links': generator.link}
+    counts = {}
+
+    for collection, base in BASE_VOLUMES.items():
+        count = max(1, round(base * scale))
+        last = db[collection].find_one({}, {'order': 1}, sort=[('order', -1)]) or {}
+        batch = []
+        for i in range(count):
+            doc = builders[collection](i)
+            doc['synthetic'] = True
+            if collection in ('education', 'experience'):
+                doc['order'] = (last.get('order') or 0) + (i + 1) * order_gap
+            batch.append(doc)
+            if len(batch) == INSERT_BATCH_SIZE:
+                db[collection].insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            db[collection].insert_many(batch, ordered=False)
+        counts[collection] = count
+
+    return counts
+
+
+def clear(db):
+    """Removes the synthetic documents
+
+    Args:
+        db (obj): pymongo database
+
+    Returns:
+        int: removed documents
+    """
+
+    return sum(db[collection].delete_many({'synthetic': True}).deleted_count for collection in BASE_VOLUMES)
+
+
+def real_collections(db):
+    """Content collections holding documents that are not synthetic
+
+    Args:
+        db (obj): pymongo database
+
+    Returns:
+        list: collection names
+    """
+
+    return [collection for collection in BASE_VOLUMES
+            if db[collection].find_one({'synthetic': {'$ne': True}}, {'_id': 1})]
+
+
+def measure(client, path, runs, counter):
+    """Requests a route several times and measures it
+
+    Args:
+        client (obj): flask test client
+        path (string): route path
+        runs (int): requests
+        counter (obj): CommandCounter of the app database client
+
+    Returns:
+        dict: status, median and p95 latency (ms), peak memory allocated by a request (KB) and database commands per request
+    """
+
+    # Memory is traced on a separate request, tracing slows the requests down
+    tracemalloc.start()
+    client.get(path)
+    memory = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    timings, queries = [], []
+    for i in range(runs):
+        counter.reset()
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.reset())
+
+    timings.sort()
+    return {'status': response.status_code, 'median': statistics.median(timings),
+            'p95': timings[int(len(timings) * 0.95)], 'memory': memory, 'queries': statistics.median(queries)}
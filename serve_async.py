@@ -0,0 +1,29 @@
+"""Cooperative serving mode: one process serves many concurrent clients with gevent.
+
+The standard library is patched before the app is imported, so the waits on
+MongoDB (pymongo), S3 (boto3), SMTP (contact form) and wkhtmltopdf (cv) yield
+to the other requests instead of blocking a worker thread.
+
+Run with:
+    python serve_async.py
+"""
+from gevent import monkey
+monkey.patch_all()
+
+from gevent.pool import Pool  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+from app import app  # noqa: E402
+import os  # noqa: E402
+
+
+def serve():
+    """Serves the app until interrupted, with at most ASYNC_MAX_CONNECTIONS concurrent connections"""
+
+    pool = Pool(app.config.get('ASYNC_MAX_CONNECTIONS'))
+    server = WSGIServer((os.environ.get('IP', '0.0.0.0'), int(os.environ.get('PORT', 5000))),
+                        app, spawn=pool)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    serve()
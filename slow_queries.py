@@ -0,0 +1,269 @@
+from datetime import datetime
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+# Commands logged when slow: name of the field holding their filter (or pipeline)
+FILTER_FIELDS = {'find': 'filter', 'aggregate': 'pipeline', 'count': 'query', 'distinct': 'query',
+                 'findAndModify': 'query', 'update': 'updates', 'delete': 'deletes'}
+# Command fields that explain does not accept
+SESSION_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern'}
+# Values kept in query shapes (sort directions)
+SORT_KEYS = {'sort', '$sort'}
+COLLECTION = 'slow_queries'
+QUEUE_SIZE = 1000
+
+
+def query_shape(value, key=None):
+    """Replaces the values of a filter or pipeline by ? (field paths, operators and sort directions are kept)
+
+    Args:
+        value (any): filter, pipeline or value
+        key (string, optional): key of the value in its parent document. Defaults to None.
+
+    Returns:
+        any: shape
+    """
+
+    if key in SORT_KEYS:
+        return value
+    if isinstance(value, dict):
+        return {item_key: query_shape(item, item_key) for item_key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Clauses and pipeline stages are kept, lists of values ($in, $all...) are not
+        shapes = [query_shape(item) for item in value]
+        return shapes if any(isinstance(shape, (dict, list)) for shape in shapes) else '?'
+    if isinstance(value, str) and value.startswith('$'):
+        return value
+
+    return '?'
+
+
+def command_shape(command_name, command):
+    """Shape of a command: what identifies a query whatever the values it looks for
+
+    Args:
+        command_name (string): find, aggregate, update...
+        command (dict): command document
+
+    Returns:
+        dict: filter (or pipeline) and sort shapes
+    """
+
+    query = command.get(FILTER_FIELDS[command_name]) or {}
+    if command_name in ('update', 'delete'):
+        query = query[0].get('q', {}) if query else {}
+
+    return {'filter': query_shape(query), 'sort': command.get('sort')}
+
+
+def find_key(doc, key):
+    """First value of a key in nested explain output
+
+    Args:
+        doc (any): explain output
+        key (string): key looked for
+
+    Returns:
+        any: value, None if not found
+    """
+
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+
+    for child in children:
+        value = find_key(child, key)
+        if value is not None:
+            return value
+
+    return None
+
+
+def plan_stages(plan):
+    """Stages and indexes of a query plan, outermost stage first
+
+    Args:
+        plan (dict): winning plan
+
+    Returns:
+        tuple: (stage names, index names)
+    """
+
+    stages, indexes = [], []
+    plans = [plan]
+    while plans:
+        plan = plans.pop(0)
+        if not isinstance(plan, dict):
+            continue
+        if plan.get('stage'):
+            stages.append(plan['stage'])
+        if plan.get('indexName'):
+            indexes.append(plan['indexName'])
+        # Slot based engine plans are nested into queryPlan
+        plans.extend([plan.get('queryPlan'), plan.get('inputStage')] + (plan.get('inputStages') or []))
+
+    return stages, indexes
+
+
+def explain_summary(explain):
+    """Summarizes an explain output (executionStats verbosity)
+
+    Args:
+        explain (dict): explain command result
+
+    Returns:
+        dict: stages, indexes, collscan, in_memory_sort, docs_examined, keys_examined, returned and time_ms
+    """
+
+    stages, indexes = plan_stages(find_key(explain, 'winningPlan') or {})
+    stats = find_key(explain, 'executionStats') or {}
+    # Pipeline stages not pushed down to the query ($sort after $project...) run in memory
+    pipeline = [name for stage in explain.get('stages') or [] for name in stage if name != '$cursor']
+
+    return {'stages': pipeline[::-1] + stages, 'indexes': indexes, 'collscan': 'COLLSCAN' in stages,
+            'in_memory_sort': 'SORT' in stages or '$sort' in pipeline,
+            'docs_examined': stats.get('totalDocsExamined'), 'keys_examined': stats.get('totalKeysExamined'),
+            'returned': stats.get('nReturned'), 'time_ms': stats.get('executionTimeMillis')}
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Logs the commands slower than a threshold, grouped by query shape into the slow_queries collection
+    of the database they ran on.
+    A background thread explains each shape (at most once per explain interval) and saves the summary,
+    so requests are not slowed down by the log."""
+
+    def __init__(self, threshold_ms, explain_interval=600, logger=None):
+        """
+        Args:
+            threshold_ms (float): duration above which a command is logged, 0 turns the log off
+            explain_interval (int, optional): seconds before a shape is explained again. Defaults to 600.
+            logger (obj, optional): logger warned of every slow command. Defaults to None.
+        """
+
+        self.threshold = threshold_ms * 1000
+        self.explain_interval = explain_interval
+        self.logger = logger
+        self.db = None
+        self.pending = {}
+        self.explained = {}
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def attach(self, db):
+        """Sets the database whose client explains and saves the log (the client is built after its listeners)
+
+        Args:
+            db (obj): pymongo database
+        """
+
+        self.db = db
+
+    def started(self, event):
+        if (self.threshold and event.command_name in FILTER_FIELDS
+                and event.command.get(event.command_name) != COLLECTION):
+            self.pending[event.request_id] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        command = self.pending.pop(event.request_id, None)
+        if command and event.duration_micros >= self.threshold and self.db is not None:
+            self.start()
+            try:
+                self.queue.put_nowait((event.command_name, *command, event.duration_micros / 1000))
+            except queue.Full:
+                pass
+
+    def failed(self, event):
+        self.pending.pop(event.request_id, None)
+
+    def start(self):
+        """Starts the explain thread once per process (worker processes may be forked after import)"""
+
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        """Records the queued slow commands"""
+
+        while True:
+            try:
+                self.record(*self.queue.get())
+            except PyMongoError:
+                pass
+            except Exception:
+                # Any other error (e.g. an unexpected plan shape) must not stop the thread
+                if self.logger:
+                    self.logger.exception('Slow query could not be recorded')
+
+    def explain(self, database, command_name, command):
+        """Explains a command without running it
+
+        Args:
+            database (string): database name
+            command_name (string): command name
+            command (dict): command document
+
+        Returns:
+            dict: explain summary, None if the command could not be explained
+        """
+
+        explained = {key: value for key, value in command.items()
+                     if not key.startswith('$') and key not in SESSION_FIELDS}
+        # Explain takes a single statement
+        if command_name in ('update', 'delete'):
+            explained[FILTER_FIELDS[command_name]] = explained[FILTER_FIELDS[command_name]][:1]
+        try:
+            return explain_summary(self.db.client[database].command(
+                'explain', explained, verbosity='executionStats'))
+        except PyMongoError:
+            return None
+
+    def record(self, command_name, database, command, duration):
+        """Adds a slow command to its query shape
+
+        Args:
+            command_name (string): command name
+            database (string): database name
+            command (dict): command document
+            duration (float): duration in ms
+        """
+
+        collection = command.get(command_name)
+        shape = json.dumps(command_shape(command_name, command), sort_keys=True, default=str)
+        key = hashlib.sha1(f"{database}.{collection}.{command_name}.{shape}".encode()).hexdigest()
+
+        update = {
+            '$inc': {'count': 1, 'total_ms': duration},
+            '$max': {'max_ms': duration},
+            '$set': {'last_seen': datetime.utcnow(), 'last_ms': duration},
+            '$setOnInsert': {'collection': collection, 'operation': command_name, 'shape': shape,
+                             'first_seen': datetime.utcnow()}
+        }
+        plan = None
+        if time.monotonic() - self.explained.get(key, -self.explain_interval) >= self.explain_interval:
+            self.explained[key] = time.monotonic()
+            plan = self.explain(database, command_name, command)
+            if plan:
+                update['$set'].update(plan=plan, explained_at=datetime.utcnow())
+        self.db.client[database][COLLECTION].update_one({'_id': key}, update, upsert=True)
+
+        if self.logger:
+            details = (f" - {', '.join(plan['stages'])}, {plan['docs_examined']} docs examined, "
+                       f"{plan['returned']} returned") if plan else ''
+            self.logger.warning(f"Slow {command_name} on {collection} ({duration:.0f} ms): {shape}{details}")
@@ -0,0 +1,124 @@
+/**
+* Gets a nested value out of an object by a dotted path (e.g. "photos.0").
+* @param {obj} item - Object to read from
+* @param {string} path - Dotted path of the value
+* @return {any} Found value or undefined
+*/
+const getValue = (item, path) => {
+    return path.split('.').reduce((value, key) => {
+        return (value === undefined || value === null) ? undefined : value[key];
+    }, item);
+}
+
+/**
+* Replaces the __field__ placeholders of a string with the item values.
+* @param {string} str - String containing placeholders (e.g. "/admin/edit_blog/___id__")
+* @param {obj} item - Object to read the values from
+* @param {boolean} encode - Whether the values should be url encoded
+* @return {string} Filled string
+*/
+const fillPlaceholders = (str, item, encode = true) => {
+    return str.replace(/__([\w.]+?)__(?!_)/g, (match, path) => {
+        const value = getValue(item, path);
+        const text = (value === undefined || value === null) ? '' : String(value);
+        return encode ? encodeURIComponent(text) : text;
+    });
+}
+
+/**
+* Builds a list row out of a <template> element and an API item.
+* Supported attributes: data-field (text), data-html-field (html), data-href, data-src,
+* data-alt, data-name, data-value, data-checked, data-show-if and data-hide-if.
+* Rendered .confirm elements get the confirmation click listener.
+* @param {obj} template - <template> DOM element
+* @param {obj} item - API item
+* @return {obj} Row DOM element
+*/
+const renderRow = (template, item) => {
+    const row = template.content.firstElementChild.cloneNode(true);
+
+    row.querySelectorAll('[data-show-if]').forEach(el => {
+        if (!getValue(item, el.dataset.showIf)) el.remove();
+    });
+    row.querySelectorAll('[data-hide-if]').forEach(el => {
+        if (getValue(item, el.dataset.hideIf)) el.remove();
+    });
+    row.querySelectorAll('[data-field]').forEach(el => {
+        const value = getValue(item, el.dataset.field);
+        el.textContent = (value === undefined || value === null) ? '' : value;
+    });
+    row.querySelectorAll('[data-html-field]').forEach(el => {
+        el.innerHTML = getValue(item, el.dataset.htmlField) || '';
+    });
+    row.querySelectorAll('[data-href]').forEach(el => {
+        el.href = fillPlaceholders(el.dataset.href, item);
+    });
+    row.querySelectorAll('[data-src]').forEach(el => {
+        el.src = getValue(item, el.dataset.src);
+    });
+    row.querySelectorAll('[data-alt]').forEach(el => {
+        el.alt = getValue(item, el.dataset.alt) || el.alt;
+    });
+    row.querySelectorAll('[data-name]').forEach(el => {
+        el.name = fillPlaceholders(el.dataset.name, item, false);
+        el.id = el.name;
+    });
+    row.querySelectorAll('label[data-for]').forEach(el => {
+        el.htmlFor = fillPlaceholders(el.dataset.for, item, false);
+    });
+    row.querySelectorAll('[data-value]').forEach(el => {
+        el.value = fillPlaceholders(el.dataset.value, item, false);
+    });
+    row.querySelectorAll('[data-checked]').forEach(el => {
+        el.checked = Boolean(getValue(item, el.dataset.checked));
+    });
+    row.querySelectorAll('.confirm').forEach(el => {
+        el.addEventListener('click', confirmIt, false);
+    });
+
+    return row;
+}
+
+/**
+* Loads the next page of rows of a list from the admin list API and appends them.
+* The API url is read from data-list-api and the cursor of the next page is kept in data-next.
+* @param {obj} list - List DOM element
+*/
+const loadRows = (list) => {
+    const more = document.querySelector(`[data-list-more="${list.id}"]`);
+    const template = document.getElementById(list.dataset.template);
+    const url = new URL(list.dataset.listApi, window.location.origin);
+
+    if (list.dataset.loading === 'true' || list.dataset.next === '') return;
+    if (list.dataset.next) url.searchParams.set('after', list.dataset.next);
+    list.dataset.loading = 'true';
+
+    fetch(url, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(data => {
+            data.items.forEach(item => list.appendChild(renderRow(template, item)));
+            list.dataset.next = data.next || '';
+            if (more && !data.next) more.remove();
+        })
+        .catch(() => {
+            alertToast("Could not load the list.");
+        })
+        .finally(() => {
+            list.dataset.loading = 'false';
+        });
+}
+
+// Load the first page of every list and the next ones when the "Load more" button is reached
+document.querySelectorAll('[data-list-api]').forEach(list => {
+    const more = document.querySelector(`[data-list-more="${list.id}"]`);
+
+    loadRows(list);
+    if (more) {
+        more.addEventListener('click', () => loadRows(list));
+        if ('IntersectionObserver' in window) {
+            new IntersectionObserver(entries => {
+                if (entries[0].isIntersecting && list.dataset.next) loadRows(list);
+            }).observe(more);
+        }
+    }
+});
@@ -5,8 +5,13 @@ const dropArea = document.getElementById('drop-area');
 const fileElem = document.getElementById('drop-file-elem');
 const collection = document.getElementById('collection').value;
 const docId = document.getElementById('doc-id') ? document.getElementById('doc-id').value : 0;
-const maxFileSize = 1024 * 1024;
-const allowedFileExtensions = ['jpg', 'jpeg', 'png', 'gif'];
+const maxFileSize = uploadMaxSize;
+const allowedFileExtensions = uploadExtensions;
+const photoOperations = { add: [], remove: [] };
+let photoOperationsTimer;
+// Photo database requests are sent one after the other, each one sees the photos left by the previous one
+let photoRequests = Promise.resolve();
+let draggedPhoto;
 
 /** 
 * Converts bytes to readable format.
@@ -51,6 +56,7 @@ const apiRequest = (method, url, cb, data = undefined) => {
     };
 
     xhr.open(method, url);
+    if (typeof data === 'string') xhr.setRequestHeader('Content-Type', 'application/json');
     xhr.send(data);
 }
 
@@ -103,46 +109,50 @@ const handleDrop = (e) => {
 }
 
 /**
-* Handles a set of files by calling Upload function for each.
+* Checks a file against the allowed size and extensions and alerts the user if it is not allowed.
+* @param {obj} file - file to be checked.
+* @return {boolean} Whether the file is allowed.
+*/
+const isFileAllowed = (file) => {
+    const fileExtension = file.name.split(".").pop().toLowerCase();
+    if (file.size > maxFileSize) {
+        alertToast("File <strong>" + file.name + "</strong> is too large. Maximum allowed is <strong> " + formatBytes(maxFileSize) + " </strong>");
+        return false;
+    } else if ((!allowedFileExtensions.includes(fileExtension)) || (file.type.split("/")[0] != "image")) {
+        alertToast("File <strong>" + file.name + "</strong> type (" + fileExtension + ") is not allowed!");
+        return false;
+    }
+    return true;
+}
+
+/**
+* Handles a set of files by getting the signed requests for all the allowed ones at once.
 * If the drag&drop area is not set to multiple, then an ajax DELETE request is sent to delete the current file.
 * @param {obj} files - files object.
 */
 const handleFiles = (files) => {
     if (dropArea.dataset.multiple == "true") {
-        ([...files]).forEach((file) => {
-            const fileExtension = file.name.split(".").pop().toLowerCase();
-            if (file.size > maxFileSize) {
-                alertToast("File <strong>" + file.name + "</strong> is too large. Maximum allowed is <strong> " + formatBytes(maxFileSize) + " </strong>");
-            } else if ((!allowedFileExtensions.includes(fileExtension)) || (file.type.split("/")[0] != "image")) {
-                alertToast("File <strong>" + file.name + "</strong> type (" + fileExtension + ") is not allowed!");
+        const allowedFiles = ([...files]).filter(isFileAllowed);
+        if (allowedFiles.length) {
+            getSignedRequests(allowedFiles);
+        }
+    } else if (files[0] && isFileAllowed(files[0])) {
+        // check if there is a current file
+        if (document.querySelectorAll('.photo-container')[0]) {
+            if (confirm('Are you sure?\r\n This will replace the current file!')) {
+                const el = document.querySelectorAll('.photo-container')[0];
+                deleteFile(el);
             } else {
-                getSignedRequest(file);
+                return;
             }
-        });
-    } else {
-        const fileExtension = files[0].name.split(".").pop().toLowerCase();
-        if (files[0].size > maxFileSize) {
-            alertToast("File <strong>" + files[0].name + "</strong> is too large. Maximum allowed is <strong> " + formatBytes(maxFileSize) + " </strong>");
-        } else if ((!allowedFileExtensions.includes(fileExtension)) || (file.type.split("/")[0] != "image")) {
-            alertToast("File <strong>" + files[0].name + "</strong> type (" + fileExtension + ") is not allowed!");
-        } else {
-            // check if there is a current file
-            if (document.querySelectorAll('.photo-container')[0]) {
-                if (confirm('Are you sure?\r\n This will replace the current file!')) {
-                    const el = document.querySelectorAll('.photo-container')[0];
-                    deleteFile(el);
-                } else {
-                    return;
-                }
-            }
-            getSignedRequest(files[0]);
         }
+        getSignedRequests([files[0]]);
     }
 }
 
 /** 
 * Sends request to AWS S3 server delete url to delete file from cloud
-* and calls function to delete file metadata from database deleteFileFromDb
+* and queues the removal of file metadata from database (queuePhotoOperation)
 * and removes the image element from DOM
 * @param {obj} el - DOM el that contains file metadata and that has to be removed.
 */
@@ -153,7 +163,7 @@ const deleteFile = (el) => {
     apiRequest("GET", url, (response, status) => {
         if (status === 200) {
             if (docId) {
-                deleteFileFromDb(el.dataset.src);
+                queuePhotoOperation('remove', el.dataset.src);
             }
             el.remove();
             fileListUpdate();
@@ -166,29 +176,39 @@ const deleteFile = (el) => {
 }
 
 /** 
-* Sends request to python route to get signed request that is then passed through upladFile function
-* @param {obj} file - file to be uploaded
+* Sends one request to python route to get the signed requests of all files, that are then passed through uploadFile function
+* @param {array} files - files to be uploaded
 */
-const getSignedRequest = (file) => {
-    const fileExt = file.name.split('.').pop().toLowerCase();
+const getSignedRequests = (files) => {
     const date = new Date();
-    const newFileName = collection + String(date.getDate()) + String(date.getMonth() + 1) + Math.floor(Math.random() * 999) + '.' + fileExt;
-    const renamedFile = new File([file], newFileName, { type: file.type });
-    const url = urlForSignS3 + "?file_name=" + renamedFile.name + "&file_type=" + renamedFile.type;
+    const renamedFiles = files.map(file => {
+        const fileExt = file.name.split('.').pop().toLowerCase();
+        const newFileName = collection + String(date.getDate()) + String(date.getMonth() + 1) + Math.floor(Math.random() * 999999) + '.' + fileExt;
+        return new File([file], newFileName, { type: file.type });
+    });
+    const data = {
+        files: renamedFiles.map(file => ({ file_name: file.name, file_type: file.type, file_size: file.size }))
+    };
 
-    apiRequest("GET", url, (response, status) => {
+    apiRequest("POST", urlForSignS3, (response, status) => {
         if (status === 200) {
-            uploadFile(renamedFile, response.data, response.url);
+            response.files.forEach((signed, i) => {
+                if (signed.error) {
+                    alertToast("File <strong>" + files[i].name + "</strong>: " + signed.error);
+                } else {
+                    uploadFile(renamedFiles[i], signed.data, signed.url);
+                }
+            });
         }
         else {
             alertToast("Could not get signed URL.");
         }
-    });
+    }, JSON.stringify(data));
 }
 
 /** 
 * Send request to AWS S3 server to upload file
-* Calls function to add file to database addFileToDb(url)
+* Queues the addition of file to database (queuePhotoOperation)
 * Adds new image element to DOM
 * @param {obj} file - File to be uploaded
 * @param {array} s3Data - Data from signed request
@@ -205,7 +225,7 @@ const uploadFile = (file, s3Data, url) => {
     apiRequest("POST", s3Data.url, (response, status) => {
         if (status === 200 || status === 204) {
             if (docId) {
-                addFileToDb(url);
+                queuePhotoOperation('add', url);
             }
             if (document.getElementById('gallery')) {
                 const containerEl = document.getElementById('gallery');
@@ -221,6 +241,7 @@ const uploadFile = (file, s3Data, url) => {
                                     </a>`
                 });
                 newEl.dataset.src = url;
+                newEl.draggable = true;
                 containerEl.appendChild(newEl);
                 alertToast("Image '" + file.name + "' was successfully uploaded!");
             }
@@ -232,32 +253,80 @@ const uploadFile = (file, s3Data, url) => {
     }, postData);
 }
 
-/** 
-* Sends request to python route to add file to db into specified collection and document
+/**
+* Queues a photo database operation. Queued operations are sent together
+* shortly after the last one was queued (one request for a whole multi-file upload).
+* @param {string} operation - "add" or "remove"
 * @param {string} photo - Full url of the photo
 */
-const addFileToDb = (photo) => {
-    const url = urlForAddPhoto + "?coll=" + collection + "&docid=" + docId + "&photo=" + photo;
-
-    apiRequest("PUT", url, (response, status) => {
-        alertToast(response.message)
-    });
+const queuePhotoOperation = (operation, photo) => {
+    photoOperations[operation].push(photo);
+    clearTimeout(photoOperationsTimer);
+    photoOperationsTimer = setTimeout(flushPhotoOperations, 500);
 }
 
 /**
-* Sends request to python route to delete file from database
-* @param {string} photo - Full url of the photo
+* Sends the queued photo operations to the python batch route, which applies them in one database update
+* @param {boolean} leaving - The page is being left: the request must outlive it (fetch keepalive)
+* @return {Promise} resolved once every photo request sent so far is answered
 */
-const deleteFileFromDb = (photo) => {
-    const url = urlForDeletePhoto + "?coll=" + collection + "&docid=" + docId + "&photo=" + photo;
+const flushPhotoOperations = (leaving = false) => {
+    clearTimeout(photoOperationsTimer);
+    const data = {
+        coll: collection,
+        docid: docId,
+        add: photoOperations.add.splice(0),
+        remove: photoOperations.remove.splice(0)
+    };
 
-    apiRequest("GET", url, (response, status) => {
-        if (status === 500) {
-            alertToast("Error updating database");
-        } else {
-            alertToast(response.message)
-        }
+    if (!data.add.length && !data.remove.length) {
+        return photoRequests;
+    }
+    if (leaving) {
+        return fetch(urlForPhotos, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(data),
+            keepalive: true
+        }).catch(() => {});
+    }
+    return updatePhotosInDb(data);
+}
+
+/**
+* Sends the new photos order (as displayed) to the python batch route,
+* after the queued additions and removals so the server has the same photos
+*/
+const reorderPhotos = () => {
+    const order = [];
+    document.querySelectorAll('.photo-container').forEach(el => {
+        order.push(el.dataset.src);
     });
+    fileListUpdate();
+    if (docId) {
+        flushPhotoOperations();
+        updatePhotosInDb({ coll: collection, docid: docId, order: order });
+    }
+}
+
+/**
+* Sends request to python batch route to update document photos into specified collection and document,
+* once the previous photo requests are answered
+* @param {obj} data - coll, docid and add/remove lists or the new order
+* @return {Promise} resolved once the request is answered
+*/
+const updatePhotosInDb = (data) => {
+    photoRequests = photoRequests.then(() => new Promise(resolve => {
+        apiRequest("PUT", urlForPhotos, (response, status) => {
+            if (status === 500 || status === 0) {
+                alertToast("Error updating database");
+            } else {
+                alertToast(response.message || "Could not update photos.");
+            }
+            resolve();
+        }, JSON.stringify(data));
+    }));
+    return photoRequests;
 }
 
 /** 
@@ -299,15 +368,48 @@ document.getElementById('gallery').addEventListener('click', (e) => {
     }
 });
 
+// Drag&Drop reordering of the gallery photos
+document.querySelectorAll('#gallery .photo-container').forEach(el => {
+    el.draggable = true;
+});
+document.getElementById('gallery').addEventListener('dragstart', (e) => {
+    draggedPhoto = e.target.closest('.photo-container');
+});
+document.getElementById('gallery').addEventListener('dragover', (e) => {
+    if (draggedPhoto) preventDefaults(e);
+});
+document.getElementById('gallery').addEventListener('drop', (e) => {
+    const target = e.target.closest('.photo-container');
+    if (draggedPhoto && target && target !== draggedPhoto) {
+        preventDefaults(e);
+        const photos = [...document.querySelectorAll('.photo-container')];
+        if (photos.indexOf(draggedPhoto) < photos.indexOf(target)) {
+            target.after(draggedPhoto);
+        } else {
+            target.before(draggedPhoto);
+        }
+        reorderPhotos();
+    }
+    draggedPhoto = undefined;
+});
+
 // Event listener for form submission
 if (formElement) {
-    formElement.addEventListener('submit', () => {
+    formElement.addEventListener('submit', (e) => {
         formSubmitted = true;
+        // Queued and pending photo requests are answered before the form is sent
+        if (docId) {
+            preventDefaults(e);
+            flushPhotoOperations().finally(() => formElement.submit());
+        }
     });
 }
 
 // Check if db doc id is set (if is set then page is on an edit form)
-if (!docId) {
+if (docId) {
+    // Send any queued photo operations before leaving the page
+    window.addEventListener('pagehide', () => flushPhotoOperations(true));
+} else {
     // Prevent leaving page if any existing uploads (except for submit)
     window.onbeforeunload = () => {
         showSpinner();
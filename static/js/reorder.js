@@ -0,0 +1,69 @@
+let draggedItem;
+
+/**
+* Sets the value of the order input of a list item.
+* @param {string} id - Document id
+* @param {number} order - New order
+*/
+const setOrderInput = (id, order) => {
+    const input = document.getElementById(`order[${id}]`);
+    if (input) input.value = order;
+}
+
+/**
+* Sends the moved item and its new neighbours to the python reorder route, which updates only the moved document.
+* @param {obj} list - List DOM element
+* @param {obj} item - Moved list item DOM element
+*/
+const saveItemOrder = (list, item) => {
+    const previous = item.previousElementSibling;
+    const next = item.nextElementSibling;
+    const data = {
+        id: item.dataset.id,
+        previous: previous ? previous.dataset.id : '',
+        next: next ? next.dataset.id : ''
+    };
+
+    fetch(list.dataset.reorderUrl, {
+        method: 'PUT',
+        credentials: 'same-origin',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(data)
+    })
+        .then(response => response.json().then(body => ({ ok: response.ok, body: body })))
+        .then(({ ok, body }) => {
+            if (ok) {
+                setOrderInput(data.id, body.order);
+                // The whole list is renumbered when two neighbours have no gap left
+                Object.entries(body.orders).forEach(([id, order]) => setOrderInput(id, order));
+            }
+            alertToast(body.message);
+        })
+        .catch(() => {
+            alertToast("Could not update the order.");
+        });
+}
+
+// Drag&Drop reordering of list items
+document.querySelectorAll('[data-reorder-url]').forEach(list => {
+    list.addEventListener('dragstart', (e) => {
+        draggedItem = e.target.closest('[data-id]');
+    });
+    list.addEventListener('dragover', (e) => {
+        if (draggedItem) preventDefaults(e);
+    });
+    list.addEventListener('drop', (e) => {
+        const target = e.target.closest('[data-id]');
+        if (draggedItem && target && target !== draggedItem) {
+            preventDefaults(e);
+            const items = [...list.querySelectorAll('[data-id]')];
+            if (items.indexOf(draggedItem) < items.indexOf(target)) {
+                target.after(draggedItem);
+            } else {
+                target.before(draggedItem);
+            }
+            saveItemOrder(list, draggedItem);
+        }
+        draggedItem = undefined;
+    });
+});
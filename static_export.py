@@ -0,0 +1,211 @@
+from bson import json_util
+from contextlib import contextmanager
+import fcntl
+import functools
+import gzip
+import hashlib
+import json
+import os
+
+MANIFEST = '.manifest.json'
+# Held during an export, by any process of the machine
+LOCK_FILE = '.export.lock'
+
+
+def fingerprint(*parts):
+    """Hashes the data a page is rendered from
+
+    Args:
+        parts (any): documents or lists of documents
+
+    Returns:
+        string: sha1 hex digest
+    """
+
+    return hashlib.sha1(json_util.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+@functools.lru_cache()
+def files_fingerprint(*directories):
+    """Hashes the files of directories (once per process, they only change with a deploy)
+
+    Args:
+        directories (string): directory paths
+
+    Returns:
+        string: sha1 hex digest of the relative paths and contents
+    """
+
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, dirs, files in sorted(os.walk(directory)):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, directory).encode() + b'\0')
+                with open(path, 'rb') as file:
+                    digest.update(file.read())
+
+    return digest.hexdigest()
+
+
+def safe_slug(slug):
+    """Whether a slug can be used as a directory name of the export
+
+    Args:
+        slug (string): blog or project slug
+
+    Returns:
+        bool: False for empty slugs and slugs with a slash or a '..'
+    """
+
+    return isinstance(slug, str) and bool(slug.strip()) and not any(part in slug for part in ('/', '\\', '..'))
+
+
+@contextmanager
+def export_lock(output):
+    """Waits until no other export (thread or worker process) writes into the directory
+
+    Args:
+        output (string): export directory
+    """
+
+    os.makedirs(output, exist_ok=True)
+    with open(os.path.join(output, LOCK_FILE), 'w') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def page_file(path):
+    """Maps a route path to the exported file path
+
+    Args:
+        path (string): route path (e.g. /blog/my-post)
+
+    Returns:
+        string: relative file path (e.g. blog/my-post/index.html)
+    """
+
+    if path == '/':
+        return 'index.html'
+    if path == '/cv':
+        return 'cv.pdf'
+
+    return os.path.join(path.strip('/'), 'index.html')
+
+
+def site_pages(db):
+    """Lists the public pages together with the fingerprint of their inputs
+
+    Args:
+        db (obj): pymongo database
+
+    Returns:
+        dict: route path: fingerprint
+    """
+
+    data = {collection: list(db[collection].find())
+            for collection in ['links', 'skills', 'education', 'experience', 'blogs', 'projects']}
+    # Counters kept in the settings document are not rendered
+    settings = db.settings.find_one({'_id': "1"}, {'versions': 0, 'order_counters': 0})
+    testimonials = list(db.testimonials.find({'approved': True}))
+    # Dimensions and placeholders of the photos
+    images = list(db.images.find({}, {'updated_on': 0}))
+    # settings and links are rendered by the base template of every page
+    common = [settings, data['links'], images]
+
+    pages = {
+        '/': fingerprint(common, data['skills'], data['education'], data['experience'], testimonials),
+        '/portfolio': fingerprint(common, data['projects']),
+        '/blog': fingerprint(common, data['blogs']),
+        '/cv': fingerprint(settings, data['skills'], data['education'], data['experience'],
+                           data['projects'], testimonials)
+    }
+    # Slugs are directory names of the export, one with a slash or '..' would be written outside its folder
+    for project in data['projects']:
+        if safe_slug(project.get('slug')):
+            pages[f"/portfolio/{project['slug']}"] = fingerprint(common, project)
+    for blog in data['blogs']:
+        if safe_slug(blog.get('slug')):
+            pages[f"/blog/{blog['slug']}"] = fingerprint(common, blog)
+
+    return pages
+
+
+def write_file(path, content):
+    """Writes a file atomically, creating the missing directories
+
+    Args:
+        path (string): file path
+        content (bytes): file content
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(content)
+    os.replace(tmp, path)
+
+
+def export_site(app, db, output, base_url='http://localhost/', force=False):
+    """Freezes the public pages into a directory of html files (plus precompressed .gz copies) and cv.pdf.
+    Only the pages whose inputs changed since the last export are rendered again, one export at a time.
+
+    Args:
+        app (obj): flask app
+        db (obj): pymongo database
+        output (string): export directory
+        base_url (string, optional): public url of the site, used for absolute urls. Defaults to 'http://localhost/'.
+        force (bool, optional): render every page. Defaults to False.
+
+    Returns:
+        dict: written, removed and failed page paths and skipped pages count
+    """
+
+    with export_lock(output):
+        manifest_path = os.path.join(output, MANIFEST)
+        manifest = {}
+        if os.path.exists(manifest_path) and not force:
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+
+        # Pages are rendered again after a deploy changing the templates or the static files they link to
+        assets = files_fingerprint(os.path.join(app.root_path, app.template_folder), app.static_folder)
+        pages = {path: fingerprint(page_fingerprint, assets) for path, page_fingerprint in site_pages(db).items()}
+        report = {'written': [], 'removed': [], 'failed': [], 'skipped': 0}
+        client = app.test_client()
+
+        for path, page_fingerprint in pages.items():
+            if manifest.get(path) == page_fingerprint:
+                report['skipped'] += 1
+                continue
+
+            response = client.get(path, base_url=base_url)
+            # Stale copies, served while the database is unavailable, are not current pages
+            if response.status_code != 200 or 'Warning' in response.headers:
+                report['failed'].append(path)
+                continue
+
+            file_path = os.path.join(output, page_file(path))
+            write_file(file_path, response.data)
+            if file_path.endswith('.html'):
+                write_file(file_path + '.gz', gzip.compress(response.data, 9))
+            manifest[path] = page_fingerprint
+            report['written'].append(path)
+
+        # Pages of deleted blogs and projects
+        for path in [path for path in manifest if path not in pages]:
+            file_path = os.path.join(output, page_file(path))
+            # Entries of unsafe slugs exported before they were skipped are only forgotten
+            for stale in (file_path, file_path + '.gz') if '..' not in path else ():
+                if os.path.exists(stale):
+                    os.remove(stale)
+            del manifest[path]
+            report['removed'].append(path)
+
+        write_file(manifest_path, json.dumps(manifest, indent=2).encode())
+
+    return report
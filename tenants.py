@@ -0,0 +1,312 @@
+from contextvars import ContextVar
+from pymongo.errors import ConnectionFailure, PyMongoError
+import re
+import threading
+import time
+
+# Tenant of the main database, the only one of single site deployments
+DEFAULT_TENANT = 'default'
+# Tenant of the request (or cli command) being served
+current_tenant = ContextVar('tenant', default=None)
+# Whether the current context serves a request: requests use the database client with the tight timeouts
+serving_request = ContextVar('serving_request', default=False)
+# Unknown hosts remembered at most, the lookups of random Host headers are not cached forever
+MAX_UNKNOWN_HOSTS = 10000
+# S3 key prefix of a tenant: one or more folders, each followed by a slash (uploaded file names have none)
+S3_PREFIX = re.compile(r'^([\w-][\w.-]*/)+$')
+
+
+def s3_prefix(name, doc):
+    """S3 key prefix of a tenant
+
+    Args:
+        name (string): tenant name
+        doc (dict): tenant document
+
+    Returns:
+        string: s3_prefix of the document, no prefix for the default tenant and NAME/ for the others otherwise
+    """
+
+    return doc.get('s3_prefix', '' if name == DEFAULT_TENANT else f"{name}/")
+
+
+def valid_s3_prefix(name, prefix):
+    """Whether a tenant may use an S3 key prefix: the photos of the other tenants must not match it
+
+    Args:
+        name (string): tenant name
+        prefix (string): S3 key prefix
+
+    Returns:
+        bool: only the default tenant may have no prefix, the others need folders ending with a slash
+    """
+
+    return bool(S3_PREFIX.match(prefix)) or (prefix == '' and name == DEFAULT_TENANT)
+
+
+def normalize_host(host):
+    """Host of a Host header, without port and lower case
+
+    Args:
+        host (string): Host header value
+
+    Returns:
+        string: host name
+    """
+
+    host = (host or '').strip().lower()
+    if ':' in host and not host.endswith(']'):
+        host = host.rsplit(':', 1)[0]
+
+    return host.rstrip('.')
+
+
+class Tenant:
+    """One site hosted by the deployment, with its own database, caches and S3 key prefix"""
+
+    def __init__(self, name, db, public_db, versions, cache, fragments, request_db=None, request_public_db=None):
+        """
+        Args:
+            name (string): tenant name
+            db (obj): pymongo database
+            public_db (obj): same database read with the public read preference
+            versions (obj): ContentVersions of the database
+            cache (obj): ContentCache partition
+            fragments (obj): FragmentCache partition
+            request_db (obj, optional): database of the requests client. Defaults to db.
+            request_public_db (obj, optional): request database read with the public read preference.
+                Defaults to public_db.
+        """
+
+        self.name = name
+        # Handles of the cli commands and background work, and of the requests
+        self.databases = {False: (db, public_db), True: (request_db or db, request_public_db or public_db)}
+        self.versions = versions
+        self.cache = cache
+        self.fragments = fragments
+        self.is_default = name == DEFAULT_TENANT
+        self.configure({})
+
+    @property
+    def db(self):
+        """pymongo database (requests client while serving a request)"""
+
+        return self.databases[serving_request.get()][0]
+
+    @property
+    def public_db(self):
+        """Database read with the public read preference (requests client while serving a request)"""
+
+        return self.databases[serving_request.get()][1]
+
+    def configure(self, doc):
+        """Reads the settings of the tenant document
+
+        Args:
+            doc (dict): tenant document (hosts, s3_prefix, admin_username and admin_password hash)
+        """
+
+        self.hosts = doc.get('hosts') or []
+        # First host of the list is the canonical one (static export, cli requests)
+        self.host = self.hosts[0] if self.hosts else None
+        self.s3_prefix = s3_prefix(self.name, doc)
+        # Without them the admin logs in with ADMIN_USERNAME and ADMIN_PASSWORD
+        self.admin_username = doc.get('admin_username')
+        self.admin_password = doc.get('admin_password')
+
+
+class TenantRegistry:
+    """Tenants of the deployment. Without a tenants collection every host is served by the default tenant;
+    with one, its documents map hosts to tenants, which are built on their first request in each worker."""
+
+    def __init__(self, build, collection=None, default_name=None, refresh=60, breaker=None):
+        """
+        Args:
+            build (function): builds the Tenant of a tenant name and prepares its database
+            collection (obj, optional): pymongo collection of the tenant documents. Defaults to None.
+            default_name (string, optional): tenant used outside requests (cli). Defaults to DEFAULT_TENANT.
+            refresh (int, optional): seconds a tenant document is kept before being read again. Defaults to 60.
+            breaker (obj, optional): CircuitBreaker of the database, hosts are not looked up while it is open.
+                Defaults to None.
+        """
+
+        self.build = build
+        self.collection = collection
+        self.default_name = default_name or DEFAULT_TENANT
+        self.refresh = refresh
+        self.breaker = breaker
+        self.tenants = {}
+        self.hosts = {}
+        # One lock per tenant being built
+        self.building = {}
+        self.lock = threading.Lock()
+        self._default = None
+
+    @property
+    def enabled(self):
+        """Whether hosts are mapped to several tenants"""
+
+        return self.collection is not None
+
+    def find(self, query):
+        """Reads a tenant document
+
+        Args:
+            query (dict): filter
+
+        Returns:
+            dict: tenant document, None if not found or without tenants collection
+        """
+
+        return self.collection.find_one(query) if self.enabled else None
+
+    @property
+    def default(self):
+        """Tenant used outside requests, built on first use
+
+        Returns:
+            obj: Tenant
+        """
+
+        return self._default or self.prepare()
+
+    def prepare(self):
+        """Builds the tenant used outside requests, so that its database is ready before the first request
+
+        Returns:
+            obj: Tenant
+
+        Raises:
+            ValueError: there is no tenant of that name
+        """
+
+        tenant = self.get(self.default_name)
+        if tenant is None:
+            raise ValueError(f"Unknown tenant: {self.default_name}")
+        self._default = tenant
+
+        return tenant
+
+    def current(self):
+        """Tenant of the request being served, the default tenant outside requests
+
+        Returns:
+            obj: Tenant
+        """
+
+        return current_tenant.get() or self.default
+
+    def add(self, doc):
+        """Builds the tenant of a document once per process, then updates its settings
+
+        Args:
+            doc (dict): tenant document
+
+        Returns:
+            obj: Tenant
+        """
+
+        name = doc['_id']
+        tenant = self.tenants.get(name)
+        if tenant is None:
+            with self.lock:
+                building = self.building.setdefault(name, threading.Lock())
+            # Built under its own lock: the first request of a tenant (index builds) does not hold up the
+            # requests of the other tenants, nor the host lookups
+            with building:
+                tenant = self.tenants.get(name)
+                if tenant is None:
+                    tenant = self.build(name)
+                    with self.lock:
+                        tenant = self.tenants.setdefault(name, tenant)
+        tenant.configure(doc)
+
+        return tenant
+
+    def get(self, name):
+        """Tenant by name
+
+        Args:
+            name (string): tenant name
+
+        Returns:
+            obj: Tenant, None if there is no such tenant
+        """
+
+        if name in self.tenants:
+            return self.tenants[name]
+        doc = self.find({'_id': name})
+        # The main database is served even if it has no tenant document
+        if doc is None and name == DEFAULT_TENANT:
+            doc = {'_id': DEFAULT_TENANT}
+
+        return self.add(doc) if doc else None
+
+    def resolve(self, host):
+        """Tenant serving a host
+
+        Args:
+            host (string): Host header value
+
+        Returns:
+            obj: Tenant, None if the host is not hosted here
+
+        Raises:
+            PyMongoError: the database is unavailable and the host was never looked up
+        """
+
+        if not self.enabled:
+            return self.default
+
+        host = normalize_host(host)
+        cached = self.hosts.get(host)
+        unavailable = self.breaker is not None and self.breaker.is_open
+        # The last known tenant of the host keeps being served while the database is unavailable
+        if cached and (unavailable or time.monotonic() - cached[1] < self.refresh):
+            return cached[0]
+        if unavailable:
+            raise ConnectionFailure('Database circuit is open')
+
+        try:
+            doc = self.find({'hosts': host})
+        except PyMongoError:
+            if self.breaker is not None:
+                self.breaker.failure()
+            if not cached:
+                raise
+            # Looked up again after the refresh time, not on every request
+            with self.lock:
+                self.hosts[host] = (cached[0], time.monotonic())
+            return cached[0]
+        tenant = self.add(doc) if doc else None
+        # Other request threads insert hosts too
+        with self.lock:
+            if tenant is None and len(self.hosts) >= MAX_UNKNOWN_HOSTS:
+                self.hosts = {key: value for key, value in self.hosts.items() if value[0] is not None}
+            self.hosts[host] = (tenant, time.monotonic())
+
+        return tenant
+
+
+class TenantProxy:
+    """Attribute of the current tenant (database, caches...), resolved on every access so that
+    the module level names of the app follow the tenant of each request"""
+
+    def __init__(self, registry, attribute):
+        """
+        Args:
+            registry (obj): TenantRegistry
+            attribute (string): Tenant attribute
+        """
+
+        self._registry = registry
+        self._attribute = attribute
+
+    def _target(self):
+        return getattr(self._registry.current(), self._attribute)
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __getitem__(self, name):
+        return self._target()[name]
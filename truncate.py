@@ -0,0 +1,124 @@
+from html import escape
+from html.parser import HTMLParser
+from render import IMPLIED_END
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+             'source', 'track', 'wbr'}
+# Leading and trailing whitespace of text nodes is not counted (html5lib space characters)
+SPACE_CHARACTERS = '\t\n\x0c\r '
+
+
+class Truncated(Exception):
+    """Stops the parsing once the character limit is reached"""
+
+
+def truncate_text(text, max_chars, break_words=False, padding=0):
+    """Truncates the text of the node that reaches the limit, the way html5lib_truncation does
+
+    Args:
+        text (string): text without leading and trailing whitespace
+        max_chars (int): characters of the text that fit into the limit
+        break_words (bool, optional): cut inside a word instead of dropping it. Defaults to False.
+        padding (int, optional): length of the end string. Defaults to 0.
+
+    Returns:
+        string: truncated text (may be empty)
+    """
+
+    if break_words:
+        return text[:-abs(max_chars - len(text)) - padding]
+
+    words = []
+    length = -1
+    for word in text.split():
+        if length + len(word) + padding >= max_chars:
+            break
+        words.append(word)
+        length += 1 + len(word)
+
+    return ' '.join(words)
+
+
+class HtmlTruncator(HTMLParser):
+    """Streaming html truncator: copies tags and text until the character limit is reached,
+    then stops tokenizing and closes the tags left open"""
+
+    def __init__(self, max_chars, break_words=False, end=''):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.break_words = break_words
+        self.end = end
+        self.chars = 0
+        self.output = []
+        self.open_tags = []
+
+    def handle_starttag(self, tag, attrs):
+        while self.open_tags and self.open_tags[-1] in IMPLIED_END.get(tag, ()):
+            self.output.append(f"</{self.open_tags.pop()}>")
+        self.output.append(self.get_starttag_text())
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.open_tags:
+            return
+
+        while True:
+            open_tag = self.open_tags.pop()
+            self.output.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_comment(self, data):
+        self.output.append(f"<!--{data}-->")
+
+    def handle_data(self, data):
+        text = data.strip(SPACE_CHARACTERS)
+        self.chars += len(text)
+
+        if not text or self.chars + len(self.end) <= self.max_chars:
+            self.output.append(escape(data, quote=False))
+            return
+
+        overflow = self.chars - self.max_chars + len(self.end)
+        text = truncate_text(text, len(text) - overflow, self.break_words, len(self.end))
+        if text:
+            leading = data[:len(data) - len(data.lstrip(SPACE_CHARACTERS))]
+            self.output.append(leading + escape(text, quote=False) + self.end)
+        raise Truncated
+
+    def result(self):
+        """Closes the tags left open and returns the truncated html
+
+        Returns:
+            string: html
+        """
+
+        while self.open_tags:
+            self.output.append(f"</{self.open_tags.pop()}>")
+
+        return ''.join(self.output).strip()
+
+
+def truncate_html(html, max_chars, break_words=False, end=''):
+    """Truncates html to a maximum number of displayed characters, a drop-in replacement of
+    html5lib_truncation.truncate_html that does not build a DOM and stops at the limit
+
+    Args:
+        html (string): html markup
+        max_chars (int): maximum displayed characters, end included
+        break_words (bool, optional): cut inside a word instead of dropping it. Defaults to False.
+        end (string, optional): appended to the truncated text (e.g. ' ...'). Defaults to ''.
+
+    Returns:
+        string: truncated html with every tag closed
+    """
+
+    truncator = HtmlTruncator(max_chars, break_words, end)
+    try:
+        truncator.feed(html or '')
+        truncator.close()
+    except Truncated:
+        pass
+
+    return truncator.result()
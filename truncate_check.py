@@ -0,0 +1,119 @@
+"""Correctness corpus and benchmark of the streaming truncator against html5lib_truncation"""
+from truncate import truncate_html
+import html5lib
+import html5lib_truncation
+import time
+
+CORPUS = {
+    'plain': "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut "
+             "labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco.",
+    'paragraphs': "<p>First paragraph with <strong>bold</strong> and <em>italic <a href=\"/x\">link</a></em>.</p>"
+                  "\n<p>Second paragraph, a little longer than the first one, to cross the limit.</p>\n"
+                  "<p>Third paragraph.</p>",
+    'entities': "<p>Fish &amp; chips &lt;3 caf&eacute; &nbsp; &#8212; &quot;quoted&quot; text that goes on "
+                "and on &gt; the limit &amp; beyond</p>",
+    'lists': "<ul>\n<li>one item<li>second item with more words<li>third item that is the longest "
+             "of all the items in the list</ul><ol start=\"3\"><li>ordered</li></ol>",
+    'images': "<p><img src=\"https://example.com/a.png\" alt=\"a\">Caption text under the image "
+              "<br>line two<br/>line three continues for a while</p><p><img src=\"b.png\"></p>",
+    'comments': "<p>Before<!-- a comment --> after the comment, then more text to truncate here</p>",
+    'headings': "<h2>Heading one</h2><p>Body of the section.</p><h3>Sub heading</h3><p>More body text "
+                "and even more body text.</p>",
+    'unclosed': "<div><p>Unclosed paragraph <b>bold <i>bold italic text that keeps going and going",
+    'long word': "<p>Supercalifragilisticexpialidociousandthensomemorelettersuntilthelimitisreached</p>",
+    'exact': "<p>12345678901234567890</p><p>next</p>",
+    'unicode': "<p>Ünïcödé tëxt — with “curly quotes” and emoji 🙂 that should count as characters</p>",
+    'tinymce': "<p style=\"text-align: center;\"><span style=\"color: #e03e2d;\">Colored</span> text</p>\n"
+               "<p>&nbsp;</p>\n<pre><code>code block with    spaces</code></pre>\n<blockquote><p>A "
+               "quote that is long enough to be cut somewhere in the middle of it.</p></blockquote>",
+    'table': "<table><tbody><tr><td>cell one</td><td>cell two</td></tr><tr><td>cell three is longer"
+             "</td><td>cell four</td></tr></tbody></table>",
+    'whitespace': "  \n <p>  spaced   out   words  </p> \n\n <p>\tand tabs\tinside text that continues</p>  "
+}
+OPTIONS = [{'max_chars': max_chars, 'end': end, 'break_words': break_words}
+           for max_chars in (0, 3, 10, 20, 50, 200) for end in ('', ' ...') for break_words in (False, True)]
+
+
+def text_and_tags(html):
+    """Parses html the way a browser does
+
+    Args:
+        html (string): html markup
+
+    Returns:
+        tuple: (text with collapsed whitespace, list of element names in document order)
+    """
+
+    def texts(element):
+        # Text of the elements and the text following each child (comments included), not comment text
+        if isinstance(element.tag, str):
+            yield element.text or ''
+            for child in element:
+                yield from texts(child)
+                yield child.tail or ''
+
+    body = html5lib.parse(html, namespaceHTMLElements=False).find('body')
+    text = ' '.join(''.join(texts(body)).split())
+    # Comments are not elements
+    tags = [element.tag for element in body.iter() if isinstance(element.tag, str)][1:]
+
+    return text, tags
+
+
+def check_corpus():
+    """Compares the truncated corpus with html5lib_truncation: same displayed text, and the
+    elements of the streaming output must be the first elements of the html5lib output
+    (html5lib_truncation keeps emitting the elements after the limit, empty).
+
+    Returns:
+        list: failures (case name, options, expected html, actual html)
+    """
+
+    failures = []
+    for name, html in CORPUS.items():
+        for options in OPTIONS:
+            expected = html5lib_truncation.truncate_html(html, **options)
+            actual = truncate_html(html, **options)
+            expected_text, expected_tags = text_and_tags(expected)
+            actual_text, actual_tags = text_and_tags(actual)
+            if actual_text != expected_text or actual_tags != expected_tags[:len(actual_tags)]:
+                failures.append((name, options, expected, actual))
+
+    return failures
+
+
+def large_post(size):
+    """Builds a blog body of about the given size from the corpus
+
+    Args:
+        size (int): characters
+
+    Returns:
+        string: html
+    """
+
+    chunk = ''.join(f"<div>{html}</div>" for html in CORPUS.values())
+
+    return chunk * (size // len(chunk) + 1)
+
+
+def benchmark(size=200000, runs=20):
+    """Times the truncation of a large post to 200 characters
+
+    Args:
+        size (int, optional): post size in characters. Defaults to 200000.
+        runs (int, optional): truncations per engine. Defaults to 20.
+
+    Returns:
+        dict: engine name: mean time in ms
+    """
+
+    html = large_post(size)
+    results = {}
+    for name, truncate in [('html5lib', html5lib_truncation.truncate_html), ('streaming', truncate_html)]:
+        start = time.perf_counter()
+        for i in range(runs):
+            truncate(html, 200, end=' ...', break_words=True)
+        results[name] = (time.perf_counter() - start) * 1000 / runs
+
+    return results